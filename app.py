@@ -6,72 +6,153 @@ import os
 # 'modules' 폴더 자체를 path에 추가
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'modules'))
 
-import gradio as gr
-print(f"DEBUG: Gradio version in use: {gr.__version__}") # ⭐️ 이 줄 추가 ⭐️
-
 from modules.pipeline import Face2ChatPipeline
 from modules.emotion_detector import EmotionDetector
 from modules.speech_to_text import SpeechToText
 from modules.chatbot_engine import ChatbotEngine
 from modules.text_to_speech import TextToSpeech
 from modules.vision_analyzer import VisionAnalyzer # ⭐️ VisionAnalyzer 임포트 ⭐️
+from modules.frame_gate import FrameGate
+from modules.frame_preprocess import FramePreprocessor
+from modules.perception import PerceptionStage
+from modules.batch_scheduler import BatchScheduler
+from modules.tts_cache import AudioCache
+from modules.tts_backends import create_backend
+from modules.llm_backends import create_llm_backend
+from modules.audio_store import AudioFileStore
+from modules.startup import Startup
+from modules.vad import VoiceActivityDetector
+from modules.session_store import Session, SessionStore
+from modules.admission import Admission
+from modules.metrics import REGISTRY, log, timed
 
 import numpy as np # numpy 임포트
-import soundfile as sf # soundfile 임포트 (오디오 저장용)
-import tempfile        # 임시 파일 생성용
-import shutil          # 임시 파일 디렉토리 관리용 (현재는 직접 사용 안 함)
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+
+# 추론 백엔드 선택: torch(기본, ultralytics / DeepFace Keras) 또는 onnx(ONNX Runtime, FACE2CHAT_ONNX_INT8=1이면 int8 모델)
+# ONNX 모델은 python -m modules.onnx_backend --export --quantize 로 미리 만들어 둡니다.
+INFERENCE_BACKEND = os.environ.get("FACE2CHAT_INFERENCE_BACKEND", "torch")
+# 모델 서버 모드: FACE2CHAT_MODEL_SERVER=소켓 경로(또는 host:port)를 지정하면 이 워커는 모델을 로드하지 않고
+# python -m modules.model_server 프로세스 하나에 추론을 맡김 (프레임 / PCM은 공유 메모리 링으로 전달)
+MODEL_SERVER = os.environ.get("FACE2CHAT_MODEL_SERVER")
+stt_factory, stt_imports = SpeechToText, ("vosk",)
+if MODEL_SERVER:
+    from modules.model_server import RemoteEmotionDetector, RemoteSpeechToText, RemoteVisionAnalyzer, connect
+
+    # 서버가 아직 모델을 로드 중이면 연결될 때까지 기다림 (세 프록시가 워커당 연결 / 링 하나를 공유)
+    model_client = partial(connect, MODEL_SERVER, ring_slots=int(os.environ.get("FACE2CHAT_MODEL_SERVER_RING_SLOTS", "4")),
+                           connect_timeout=float(os.environ.get("FACE2CHAT_MODEL_SERVER_WAIT", "120")))
+    vision_factory = lambda: RemoteVisionAnalyzer(model_client())
+    emotion_factory = lambda: RemoteEmotionDetector(model_client())
+    stt_factory = lambda: RemoteSpeechToText(model_client())
+    vision_imports = emotion_imports = stt_imports = ()
+elif INFERENCE_BACKEND == "onnx":
+    from modules.onnx_backend import onnx_paths
+
+    yolo_onnx_path, emotion_onnx_path = onnx_paths(int8=os.environ.get("FACE2CHAT_ONNX_INT8") == "1")
+    # 모델별 스레드 수 (두 모델이 같은 코어를 두고 경쟁하지 않도록 나눠 지정)
+    vision_factory = partial(VisionAnalyzer, backend="onnx", onnx_path=yolo_onnx_path,
+                             threads=os.environ.get("FACE2CHAT_YOLO_THREADS"))
+    emotion_factory = partial(EmotionDetector, backend="onnx", onnx_path=emotion_onnx_path,
+                              threads=os.environ.get("FACE2CHAT_EMOTION_THREADS"))
+    vision_imports, emotion_imports = ("onnxruntime",), ("deepface", "onnxruntime")
+else:
+    vision_factory, emotion_factory = VisionAnalyzer, EmotionDetector
+    vision_imports, emotion_imports = ("ultralytics",), ("deepface",)
 
+# 무거운 모델은 백그라운드 스레드에서 동시에 로드 (gradio import와도 겹쳐서 진행)
+startup = Startup()
+startup.add("emotion_detector", emotion_factory, imports=emotion_imports)
+startup.add("stt", stt_factory, imports=stt_imports)
+startup.add("vision_analyzer", vision_factory, imports=vision_imports)
+startup.start()
+
+import gradio as gr
+print(f"DEBUG: Gradio version in use: {gr.__version__}") # ⭐️ 이 줄 추가 ⭐️
 
 # 파이프라인 초기화
-detector = EmotionDetector()
-stt = SpeechToText()
-bot = ChatbotEngine()
-tts = TextToSpeech()
-vision_analyzer = VisionAnalyzer() # ⭐️ VisionAnalyzer 인스턴스 생성 ⭐️
-pipeline = Face2ChatPipeline(detector, stt, bot, tts, vision_analyzer) # ⭐️ pipeline에 전달 ⭐️
+# 챗봇 백엔드 선택: rule(기본, LLM 없이 규칙 기반) 또는 openai(OpenAI 호환 스트리밍 API)
+# FACE2CHAT_LLM_URL로 mock_llm_server 등 다른 서버를, FACE2CHAT_LLM_MODEL로 모델을 지정 (API 키는 OPENAI_API_KEY)
+llm_backend_name = os.environ.get("FACE2CHAT_LLM_BACKEND", "rule")
+llm_backend_options = {}
+if llm_backend_name == "openai":
+    llm_backend_options = {key: os.environ[env] for key, env in (("base_url", "FACE2CHAT_LLM_URL"), ("model", "FACE2CHAT_LLM_MODEL"))
+                           if env in os.environ}
+    llm_backend_options["total_timeout"] = float(os.environ.get("FACE2CHAT_LLM_TIMEOUT", "20"))
+bot = ChatbotEngine(backend=create_llm_backend(llm_backend_name, **llm_backend_options))
+# 같은 문장은 다시 합성하지 않도록 캐시 (FACE2CHAT_TTS_CACHE_DIR를 지정하면 디스크에도 저장, 상한은 FACE2CHAT_TTS_CACHE_DISK_MB)
+tts_cache = AudioCache(max_bytes=64 * 1024 * 1024, cache_dir=os.environ.get("FACE2CHAT_TTS_CACHE_DIR"),
+                       disk_max_bytes=int(os.environ.get("FACE2CHAT_TTS_CACHE_DISK_MB", "512")) * 1024 * 1024)
+# TTS 백엔드 선택: gtts(기본) 또는 gtts-http(연결 풀 세션, FACE2CHAT_TTS_URL로 mock 서버 지정 가능)
+tts_backend_name = os.environ.get("FACE2CHAT_TTS_BACKEND", "gtts")
+tts_backend_options = {"base_url": os.environ["FACE2CHAT_TTS_URL"]} if tts_backend_name == "gtts-http" and "FACE2CHAT_TTS_URL" in os.environ else {}
+tts = TextToSpeech(cache=tts_cache, backend=create_backend(tts_backend_name, **tts_backend_options))
+detector = startup.get("emotion_detector")
+stt = startup.get("stt")
+vision_analyzer = startup.get("vision_analyzer") # ⭐️ VisionAnalyzer 인스턴스 생성 ⭐️
+# 정지된 장면에서는 직전 감정/장면 분석 결과를 재사용 (표정은 장면보다 자주 바뀌므로 더 민감하게 설정)
+# 웹 세션마다 따로 만들고 (new_session), 여기의 게이트는 세션 없이 호출할 때만 사용
+def make_gates():
+    return FrameGate(diff_threshold=3.0, max_age=1.0), FrameGate(diff_threshold=6.0, max_age=3.0)
 
-# Gradio에서 호출할 함수
-def run_pipeline(image, audio):
-    # Gradio가 제공하는 임시 파일 경로를 사용하여 STT 수행
-    # audio는 (sample_rate, numpy_array) 튜플 형태 또는 파일 경로일 수 있음
-    # 현재 speech_to_text.py는 파일 경로를 기대하므로, 튜플이라면 임시 파일로 저장
-    audio_input_path = None
 
-    if isinstance(audio, tuple): # audio가 (sample_rate, numpy_array) 튜플로 들어올 경우
-        sr, audio_array = audio
-        if audio_array is not None and audio_array.size > 0:
-            try:
-                # 임시 파일 생성 시 tempfile.mkdtemp() 사용 (gr.make_temp_dir() 경고 해결)
-                # Gradio가 임시 디렉토리를 자동으로 관리하므로, 별도의 디렉토리를 만들 필요 없음
-                # Gradio 4.0+ 버전에서는 gr.make_temp_dir()이 없어졌으므로 tempfile을 직접 사용.
-                # 하지만 Gradio 내부적으로 임시파일을 생성하고 경로를 넘겨줄 가능성이 높으므로,
-                # 여기서는 받은 경로를 그대로 사용하는 것을 우선시하고,
-                # 튜플 형태의 오디오 입력만 파일로 변환합니다.
-                
-                # Gradio가 넘겨주는 오디오 튜플을 WAV 파일로 저장
-                with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as fp:
-                    temp_audio_file = fp.name
-                    sf.write(temp_audio_file, audio_array, sr)
-                audio_input_path = temp_audio_file
-                print(f"🎶 Gradio 튜플 오디오를 임시 WAV 파일로 저장: {audio_input_path}")
-            except Exception as e:
-                print(f"❗ Gradio 오디오 튜플을 파일로 저장 실패: {e}")
-                audio_input_path = None # 오류 시 음성 인식 건너뛰기
-        else:
-            print("❗ 오디오 입력 (튜플)이 비어있거나 유효하지 않습니다.")
-            audio_input_path = None
-    elif isinstance(audio, str) and os.path.exists(audio): # audio가 파일 경로로 들어올 경우
-        audio_input_path = audio
-        print(f"🎶 Gradio 파일 경로 오디오 입력: {audio_input_path}")
-    else:
-        print("❗ 오디오 입력이 유효하지 않습니다.")
-        audio_input_path = None
-
-    emotion, text, response, audio_out_tuple = pipeline.run(image, audio_input_path)
-
-    print("🚨 result from pipeline.run():", (emotion, text, response, "audio_out_tuple_exists")) # print audio_out as string to avoid large console output
-    print("🚨 types:", [type(x) for x in (emotion, text, response, audio_out_tuple)])
+emotion_gate, scene_gate = make_gates()
+# YOLO의 person 박스를 얼굴 영역으로 재사용하여 DeepFace 얼굴 검출을 생략
+# 동시 접속 세션들의 프레임 / 얼굴 crop을 모아 배치로 추론
+yolo_scheduler = BatchScheduler(vision_analyzer.detect_objects_batch, max_batch_size=8, max_wait_ms=15, name="yolo")
+emotion_scheduler = BatchScheduler(detector.classify_faces, max_batch_size=32, max_wait_ms=10, name="emotion")
+perception = PerceptionStage(detector, vision_analyzer, detection_scheduler=yolo_scheduler, emotion_scheduler=emotion_scheduler)
+# 인식 / 음성 인식 단계를 동시에 실행 (느린 단계는 제한 시간 후 대체 결과 사용)
+stage_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="face2chat-stage")
+# 프레임은 한 번만 검증 / 색 변환하고, 긴 변이 FACE2CHAT_MAX_FRAME_SIDE(px)를 넘으면 줄여서 사용
+preprocessor = FramePreprocessor(max_side=int(os.environ.get("FACE2CHAT_MAX_FRAME_SIDE", "1280")))
+pipeline = Face2ChatPipeline(detector, stt, bot, tts, vision_analyzer, emotion_gate=emotion_gate, scene_gate=scene_gate,
+                             perception=perception, executor=stage_executor, preprocessor=preprocessor) # ⭐️ pipeline에 전달 ⭐️
 
+# 음성 구간 검출 설정 (발화 끝 판정까지 기다릴 무음 길이 / 발화로 인정할 최소 음성 길이)
+VAD_HANGOVER_MS = int(os.environ.get("FACE2CHAT_VAD_HANGOVER_MS", "600"))
+VAD_MIN_SPEECH_MS = int(os.environ.get("FACE2CHAT_VAD_MIN_SPEECH_MS", "150"))
+# 세션이 응답을 만드는 동안 쌓아 둘 최대 오디오 길이(초). 넘으면 가장 오래된 청크부터 버림
+MAX_BUFFERED_AUDIO_S = float(os.environ.get("FACE2CHAT_MAX_BUFFERED_AUDIO_S", "5"))
+# 동시에 처리할 live 호출 수 (세션당 처리 중인 호출은 하나이므로 대략 동시에 응답을 만드는 세션 수)
+CONCURRENCY_LIMIT = int(os.environ.get("FACE2CHAT_CONCURRENCY", "16"))
+
+
+
+def new_session(session_id):
+    """세션당 KaldiRecognizer 1개 + VAD 1개 + 프레임 게이트 + 대화 기록 + 입력 슬롯 / 버퍼"""
+    vad = VoiceActivityDetector(hangover_ms=VAD_HANGOVER_MS, min_speech_ms=VAD_MIN_SPEECH_MS)
+    session_emotion_gate, session_scene_gate = make_gates()
+    return Session(session_id, stt_stream=stt.open_stream(vad=vad), emotion_gate=session_emotion_gate,
+                   scene_gate=session_scene_gate, history_size=int(os.environ.get("FACE2CHAT_HISTORY_SIZE", "20")),
+                   admission=Admission(max_audio_seconds=MAX_BUFFERED_AUDIO_S))
+
+
+# 세션 상태 보관소: 최대 세션 수 / 유휴 제거 시간(초) / 세션당 메모리 상한(MB)
+sessions = SessionStore(
+    new_session,
+    max_sessions=int(os.environ.get("FACE2CHAT_MAX_SESSIONS", "256")),
+    idle_timeout=float(os.environ.get("FACE2CHAT_SESSION_IDLE_TIMEOUT", "600")),
+    max_session_bytes=int(float(os.environ.get("FACE2CHAT_SESSION_MAX_MB", "8")) * 1024 * 1024),
+)
+
+# 응답 오디오 전달 방식: numpy(기본, 배열을 그대로 넘김) 또는 filepath(WAV 파일 경로를 넘김)
+# filepath 모드에서는 파일을 내용 해시 이름으로 FACE2CHAT_AUDIO_STORE_DIR에 저장하고, Gradio가 가져간 뒤
+# 전체 크기가 FACE2CHAT_AUDIO_STORE_MB를 넘으면 오래된 파일부터 삭제 (같은 응답은 파일 하나를 재사용)
+AUDIO_OUTPUT = os.environ.get("FACE2CHAT_AUDIO_OUTPUT", "numpy")
+audio_store = AudioFileStore(os.environ.get("FACE2CHAT_AUDIO_STORE_DIR"),
+                             max_bytes=int(float(os.environ.get("FACE2CHAT_AUDIO_STORE_MB", "64")) * 1024 * 1024)) if AUDIO_OUTPUT == "filepath" else None
+# Gradio도 출력 오디오를 자체 캐시 디렉토리에 파일로 남기므로, 이 시간(초)보다 오래된 파일은 주기적으로 삭제
+GRADIO_CACHE_TTL = int(os.environ.get("FACE2CHAT_GRADIO_CACHE_TTL", "3600"))
+
+# 고정 문구(대체 응답, 감정 접두어)는 서버 시작과 동시에 백그라운드에서 미리 합성
+threading.Thread(target=tts.prewarm, args=(pipeline.fixed_phrases(),), daemon=True, name="tts-prewarm").start()
+
+def to_gradio_audio(audio_out_tuple):
+    """pipeline의 (numpy_array, sample_rate)를 Gradio가 기대하는 (sample_rate, numpy_array)로 바꿉니다."""
     # pipeline.run에서 반환된 audio_out_tuple이 (np.ndarray, sample_rate) 형식인지 확인
     if not (isinstance(audio_out_tuple, tuple) and len(audio_out_tuple) == 2 and
             isinstance(audio_out_tuple[0], np.ndarray) and isinstance(audio_out_tuple[1], (int, float))):
@@ -80,33 +161,177 @@ def run_pipeline(image, audio):
         silence = np.zeros(int(sample_rate * 0.5), dtype=np.float32)
         audio_out_tuple = (silence, sample_rate) # (numpy_array, sample_rate) 형식으로 튜플 반환
 
-    # Gradio에 반환하기 위해 (numpy_array, sample_rate) 튜플을 임시 파일로 저장
-    final_audio_output_path = None
+    # 기본은 응답 오디오를 임시 파일로 저장하지 않고 Gradio Audio(type="numpy")에 바로 넘김
+    with timed("audio_write"):
+        audio_data, sample_rate = audio_out_tuple
+        if audio_store is not None:
+            return audio_store.put(audio_data, sample_rate) # Gradio가 가져간 뒤 run_pipeline에서 release
+        return int(sample_rate), audio_data
+
+
+def session_gate_hit_rate():
+    """현재 세션들의 프레임 게이트 적중률 (게이트 종류별 합산)"""
+    totals = {"emotion": [0, 0], "scene": [0, 0]}
+    for session in sessions.snapshot():
+        for name, gate in (("emotion", session.emotion_gate), ("scene", session.scene_gate)):
+            totals[name][0] += gate.hits
+            totals[name][1] += gate.hits + gate.misses
+    return {(("gate", name),): hits / total if total else 0.0 for name, (hits, total) in totals.items()}
+
+
+def register_gauges(registry):
+    """각 구성요소의 stats()를 /metrics에서 스크레이프할 때마다 읽어 가도록 게이지로 등록합니다."""
+    registry.gauge("face2chat_frame_gate_hit_rate", session_gate_hit_rate, "프레임 게이트 적중률 (현재 세션 기준)")
+    registry.gauge("face2chat_tts_cache_hit_rate", lambda: tts_cache.stats()["hit_rate"], "TTS 캐시 적중률")
+    registry.gauge("face2chat_tts_cache_bytes", lambda: tts_cache.stats()["bytes"], "TTS 캐시 메모리 사용량")
+    registry.gauge("face2chat_tts_cache_disk_bytes", lambda: tts_cache.stats()["disk_bytes"], "TTS 디스크 캐시 사용량")
+    registry.gauge("face2chat_batch_queue_depth",
+                   lambda: {(("scheduler", s.name),): s.queue_depth() for s in (yolo_scheduler, emotion_scheduler)},
+                   "배치 스케줄러 대기 요청 수")
+    registry.gauge("face2chat_batch_avg_size",
+                   lambda: {(("scheduler", s.name),): s.stats()["avg_batch_size"] for s in (yolo_scheduler, emotion_scheduler)},
+                   "배치 스케줄러 평균 배치 크기")
+    registry.gauge("face2chat_ready", lambda: startup.ready.is_set(), "모델 로드와 워밍업 완료 여부")
+    sessions.register_gauges(registry)
+    registry.gauge("face2chat_admission_buffered_audio_seconds",
+                   lambda: sum(s.admission.audio.seconds() for s in sessions.snapshot()), "세션 입력 버퍼에 대기 중인 오디오 길이 합계")
+    if audio_store is not None:
+        audio_store.register_gauges(registry)
+    if MODEL_SERVER:
+        registry.gauge("face2chat_model_server_up", lambda: model_client().connected, "모델 서버 연결 여부")
+        registry.gauge("face2chat_model_server_ring_slots_in_use", lambda: model_client().ring.in_use(),
+                       "사용 중인 공유 메모리 링 슬롯 수")
+
+
+register_gauges(REGISTRY)
+
+
+# Gradio에서 호출할 함수
+def run_pipeline(image, audio, request: gr.Request):
+    # audio는 (sample_rate, numpy_array) 튜플 형태 또는 파일 경로일 수 있음
+    # 스트리밍 입력(튜플, 또는 마이크가 쉬는 동안의 프레임만 있는 호출)은 세션의 입력 슬롯 / 버퍼(Admission)에 맡긴 뒤, 세션당 한 호출만 버퍼를 비우며 처리합니다.
+    # 같은 세션의 다른 호출이 처리 중이면 입력만 맡기고 바로 반환하므로 호출이 쌓이지 않습니다.
+    # 오디오 청크는 도착 순서대로 세션별 SpeechStream에 넣고, VAD가 발화 끝을 판정하면
+    # 그 시점의 최신 프레임으로 챗봇/TTS 단계를 실행합니다.
+    # 응답 음성은 문장 단위로 합성되는 대로 스트리밍 출력에 yield 합니다.
+    # 인식기 / 프레임 게이트 / 대화 기록은 Gradio 세션(session_hash)별로 SessionStore에 보관합니다.
+    session = sessions.get(request.session_hash if request is not None else "default")
+    pinned = None
     try:
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as fp:
-            final_audio_output_path = fp.name
-            sf.write(final_audio_output_path, audio_out_tuple[0], int(audio_out_tuple[1]))
-        print(f"🎶 응답 오디오 임시 파일 저장: {final_audio_output_path}")
-    except Exception as e:
-        print(f"❗ 응답 오디오 파일 저장 중 오류 발생: {e}. 무음 오디오로 대체합니다.")
-        sample_rate = 44100
-        silence = np.zeros(int(sample_rate * 0.5), dtype=np.float32)
-        
+        for outputs in _run_session(session, image, audio):
+            pinned = outputs[3] if audio_store is not None and isinstance(outputs[3], str) else None
+            yield outputs
+            # 다음 값을 요청받았다면 Gradio가 직전 출력을 처리(자체 캐시로 복사)한 뒤이므로 파일 고정을 풂
+            if pinned is not None:
+                audio_store.release(pinned)
+                pinned = None
+    finally:
+        if pinned is not None:
+            audio_store.release(pinned) # 마지막 출력 (또는 중간에 연결이 끊긴 경우)
+        sessions.enforce_limits(session)
+
+
+SKIP = (gr.skip(), gr.skip(), gr.skip(), gr.skip())
+
+
+def _run_session(session, image, audio):
+    if audio is None or isinstance(audio, tuple):
+        # 스트리밍 입력: 마이크가 쉬는 동안(audio=None)의 웹캠 프레임도 최신 프레임 슬롯만 갱신
+        # 응답 턴은 _drain_audio에서 발화가 끝났을 때만 시작
+        admission = session.admission
+        if audio is None:
+            admission.offer(image)
+            if not admission.has_pending():
+                yield SKIP
+                return
+        else: # audio가 (sample_rate, numpy_array) 튜플로 들어올 경우
+            if audio[1] is None or audio[1].size == 0:
+                log("❗ 오디오 입력 (튜플)이 비어있거나 유효하지 않습니다.")
+            admission.offer(image, audio if audio[1] is not None else None)
+        yielded = False
+        # 처리 권한을 놓은 직후에 다른 호출이 맡긴 입력이 남아 있으면 다시 처리
+        while admission.try_acquire():
+            try:
+                for outputs in _drain_audio(session):
+                    yielded = True
+                    yield outputs
+            finally:
+                admission.release()
+            if not admission.has_pending():
+                break
+        if not yielded:
+            # 무음 구간이거나 같은 세션의 다른 호출이 처리 중: 아무 출력도 갱신하지 않음
+            yield SKIP
+        return
+
+    if not (isinstance(audio, str) and os.path.exists(audio)):
+        log("❗ 오디오 입력이 유효하지 않습니다.")
+        yield SKIP
+        return
+    audio_input_path = audio # audio가 파일 경로로 들어올 경우
+    log(f"🎶 Gradio 파일 경로 오디오 입력: {audio_input_path}")
+    emotion, text, response, audio_out_tuple = pipeline.run(image, audio_input_path, session)
+
+    log("🚨 result from pipeline.run():", (emotion, text, response, "audio_out_tuple_exists")) # print audio_out as string to avoid large console output
+    log("🚨 types:", [type(x) for x in (emotion, text, response, audio_out_tuple)])
+    yield emotion, text, response, to_gradio_audio(audio_out_tuple)
+
+
+def _feed_buffered_audio(session):
+    """세션 버퍼의 오디오 청크를 순서대로 인식기에 넣고, 그 사이에 끝난 발화의 텍스트 목록을 반환합니다."""
+    stt_stream = session.stt_stream
+    texts = []
+    for audio_array, sr in session.admission.audio.drain():
+        with session.lock:
+            try:
+                utterance_ended = stt_stream.feed(audio_array, sr)
+            except Exception as e:
+                print(f"❗ 스트리밍 음성 인식 실패: {e}")
+                continue
+            text = stt_stream.finalize() if utterance_ended else None
+        # 발화로 판정됐지만 인식된 단어가 없으면 (기침, 잡음 등) 응답하지 않음
+        if text:
+            texts.append(text)
+    return texts
+
+
+def _drain_audio(session):
+    """세션 버퍼의 오디오 청크를 순서대로 인식기에 넣고, 발화가 끝날 때마다 응답을 yield합니다."""
+    admission = session.admission
+    utterances = _feed_buffered_audio(session)
+    while utterances:
+        # 응답하는 동안 끝난 발화가 여러 개면 하나로 합쳐 한 번만 응답 (이전 턴은 이미 대체됨)
+        text = " ".join(utterances)
+        # 발화가 끝난 시점의 최신 프레임으로 응답 (처리를 기다리는 동안 들어온 이전 프레임은 건너뜀)
+        image, frame_age = admission.frames.latest()
+        log(f"[수용] 발화 끝, 프레임 나이 {frame_age if frame_age is not None else -1:.2f}초, 대기 오디오 {admission.audio.seconds():.2f}초")
+        cancel = admission.begin_turn()
+        turn = pipeline.run_text_stream(image, text, session, cancel=cancel)
+        utterances = []
+        emotion = response = None
         try:
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as fp:
-                final_audio_output_path = fp.name
-                sf.write(final_audio_output_path, silence, sample_rate)
-            print(f"🎶 오류 대체용 무음 오디오 임시 파일 저장: {final_audio_output_path}")
-        except Exception as e_fallback:
-            print(f"❗ 대체 오디오 파일 저장마저 실패: {e_fallback}")
-            # 최후의 수단: 빈 오디오 파일 경로 반환 (UI에서 오디오 재생 안됨)
-            final_audio_output_path = None
-    
-    # 임시 파일로 저장한 경우, 해당 파일 경로를 Gradio에 반환.
-    # Gradio는 이 경로를 사용하여 웹 UI에서 오디오를 재생합니다.
-    # Gradio 4.0+ 버전은 `type="filepath"`일 경우 파일을 자동으로 관리하므로,
-    # 명시적인 `os.remove(temp_dir)`는 필요하지 않습니다.
-    return emotion, text, response, final_audio_output_path
+            for emotion, text, response, audio_chunk in turn:
+                yield emotion, text, response, to_gradio_audio(audio_chunk)
+                # 응답을 내보내는 동안 들어온 오디오도 계속 인식하고, 새 발화가 끝나면 지금 턴의 LLM 스트림을 멈춤 (latest-wins)
+                newer = _feed_buffered_audio(session)
+                if newer:
+                    utterances.extend(newer)
+                    admission.supersede_turn()
+        finally:
+            turn.close() # Gradio가 run_pipeline을 닫은 경우에도 LLM 스트림이 끝까지 돌지 않도록
+            admission.end_turn(cancel)
+        log("🚨 result from pipeline.run_text_stream():", (emotion, text, response))
+        utterances.extend(_feed_buffered_audio(session))
+
+    if session.stt_stream.in_speech:
+        # 발화가 아직 진행 중이면 부분 인식 결과만 갱신
+        yield gr.skip(), session.stt_stream.partial(), gr.skip(), gr.skip()
+
+
+def close_session(request: gr.Request):
+    """브라우저 탭을 닫거나 새로고침하면 세션 상태를 바로 정리합니다."""
+    if request is not None:
+        sessions.drop(request.session_hash)
 
 
 # 인터페이스 정의
@@ -114,19 +339,23 @@ interface = gr.Interface(
     fn=run_pipeline,
     inputs=[
         gr.Image(type="numpy", label="얼굴 이미지 (웹캠 입력)", streaming=True), # ⭐️ type을 "numpy"로 변경 ⭐️
-        gr.Audio(type="numpy", label="음성 입력", streaming=True) # ⭐️ type을 "numpy"로 변경 ⭐️
+        gr.Audio(type="numpy", label="음성 입력", streaming=True), # ⭐️ type을 "numpy"로 변경 ⭐️
     ],
     outputs=[
         gr.Textbox(label="감정"),
         gr.Textbox(label="음성 인식 결과"),
         gr.Textbox(label="챗봇 응답"),
-        gr.Audio(label="응답 음성", type="filepath", autoplay=True) # ⭐️ TTS 출력 type을 "filepath"로 변경 ⭐️
+        gr.Audio(label="응답 음성", type="numpy", autoplay=True, streaming=True), # 문장 단위 오디오 조각을 받는 대로 재생
     ],
     live=True, # ⭐️ live=True 추가 ⭐️
     allow_flagging="never", # ⭐️ 불필요한 플래그 방지 ⭐️
+    delete_cache=(GRADIO_CACHE_TTL, GRADIO_CACHE_TTL), # (검사 주기, 최대 보관 시간) 초
+    concurrency_limit=CONCURRENCY_LIMIT, # 기본값 1이면 모든 세션의 호출이 한 줄로 대기함
     title="Face2Chat: 감정 인식 음성 챗봇",
     description="웹캠과 마이크를 사용하여 감정을 인식하고 대화하는 챗봇입니다."
 )
+with interface:
+    interface.unload(close_session)
 
 if __name__ == "__main__":
     # 모델 다운로드 확인 및 안내
@@ -143,5 +372,31 @@ if __name__ == "__main__":
     # YOLOv8 모델 다운로드 확인 (vision_analyzer에서 처리되지만, 여기서도 안내 가능)
     # VisionAnalyzer 클래스 내에서 모델 다운로드를 처리하므로 여기서는 생략합니다.
 
+    # 더미 프레임 / 오디오로 모든 단계를 한 번씩 실행한 뒤에 서버를 띄움 (첫 요청의 콜드 스타트 방지)
+    dummy_frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    startup.warmup({
+        "emotion_detector": detector.warmup,
+        "stt": stt.warmup,
+        "vision_analyzer": vision_analyzer.warmup,
+        "perception": lambda: perception.warmup(dummy_frame),
+        # 첫 턴이 TTS 세션 / 디코더 준비와 LLM 연결 비용을 치르지 않도록 응답 쪽도 미리 한 번 실행
+        "tts": lambda: tts.warmup(pipeline.fixed_phrases()[0]),
+        "chatbot": bot.warmup,
+    })
+    # FACE2CHAT_STARTUP_REPORT=경로 를 지정하면 시작 시간표를 JSON으로도 저장
+    startup.report(os.environ.get("FACE2CHAT_STARTUP_REPORT"))
+
     # Gradio 앱 실행
-    interface.launch()
\ No newline at end of file
+    # Gradio UI는 "/"에, Prometheus 스크레이프용 지표는 "/metrics"에 함께 노출
+    import uvicorn
+    from fastapi import FastAPI
+    from fastapi.responses import PlainTextResponse
+
+    server = FastAPI()
+
+    @server.get("/metrics")
+    def metrics():
+        return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+    server = gr.mount_gradio_app(server, interface, path="/")
+    uvicorn.run(server, host=os.environ.get("FACE2CHAT_HOST", "127.0.0.1"), port=int(os.environ.get("FACE2CHAT_PORT", "7860")))
\ No newline at end of file
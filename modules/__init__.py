@@ -3,4 +3,11 @@ from .speech_to_text import SpeechToText
 from .chatbot_engine import ChatbotEngine
 from .text_to_speech import TextToSpeech
 from .pipeline import Face2ChatPipeline
-from .vision_analyzer import VisionAnalyzer # ⭐️ 새로 추가 ⭐️
\ No newline at end of file
+from .vision_analyzer import VisionAnalyzer # ⭐️ 새로 추가 ⭐️
+from .frame_gate import FrameGate
+from .perception import PerceptionStage
+from .tts_cache import AudioCache
+from .tts_backends import TTSBackend, GTTSBackend, GoogleTranslateHTTPBackend, create_backend
+from .batch_scheduler import BatchScheduler
+from .startup import Startup
+from .metrics import REGISTRY, timed
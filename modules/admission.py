@@ -0,0 +1,182 @@
+# modules/admission.py
+# live 모드 입력 수용(admission) 계층
+# live=True 스트리밍에서는 Gradio가 run_pipeline을 파이프라인이 끝나는 속도보다 빨리 호출하므로,
+# 호출마다 파이프라인을 돌리면 요청이 쌓이고 몇 초 전 프레임에 대한 응답이 뒤늦게 나옵니다.
+# 세션마다
+# - FrameSlot: 최신 프레임 하나만 보관 (latest-wins). 처리되기 전에 새 프레임이 오면 이전 프레임은 합쳐짐(coalesced)
+# - AudioBuffer: 오디오 청크를 순서대로 보관하되 max_seconds를 넘으면 가장 오래된 청크부터 버림
+# - 세션당 처리 중인 호출은 하나만: 다른 호출이 처리 중이면 입력만 맡기고 바로 반환하고, 처리 중인 호출이 이어서 처리
+# - 응답 턴도 latest-wins: 응답을 내보내는 중에 새 발화가 끝나면 진행 중인 턴의 cancel 이벤트를 설정 (LLM 스트림 중단)
+# 를 두어, 과부하에서도 대기 중인 입력의 양(=지연 시간)이 상한을 넘지 않게 합니다.
+
+import threading
+import time
+from collections import deque
+
+from .metrics import REGISTRY
+
+
+def _count(kind, result, amount=1):
+    REGISTRY.inc("face2chat_admission_inputs_total", amount, help_text="수용 계층에 들어온 입력 수 (처리 결과별)",
+                 kind=kind, result=result)
+
+
+class FrameSlot:
+    """최신 프레임 하나만 보관하는 슬롯"""
+    def __init__(self):
+        self._frame = None
+        self._received_at = None
+        self._fresh = False # 마지막으로 꺼낸 뒤 새 프레임이 들어왔는지
+        self.coalesced = 0
+        self._lock = threading.Lock()
+
+    def put(self, frame):
+        if frame is None:
+            return
+        with self._lock:
+            if self._fresh:
+                # 한 번도 처리되지 않은 프레임을 새 프레임이 대체
+                self.coalesced += 1
+                _count("frame", "coalesced")
+            self._frame = frame
+            self._received_at = time.monotonic()
+            self._fresh = True
+        _count("frame", "accepted")
+
+    def latest(self):
+        """(최신 프레임, 받은 뒤 지난 시간(초))을 반환합니다. 프레임은 다음 턴에도 쓸 수 있도록 남겨 둠"""
+        with self._lock:
+            self._fresh = False
+            if self._frame is None:
+                return None, None
+            return self._frame, time.monotonic() - self._received_at
+
+    def clear(self):
+        with self._lock:
+            self._frame = None
+            self._received_at = None
+            self._fresh = False
+
+    def nbytes(self):
+        frame = self._frame
+        return getattr(frame, "nbytes", 0) if frame is not None else 0
+
+
+class AudioBuffer:
+    """도착 순서를 유지하는 오디오 청크 버퍼. 보관 길이가 max_seconds를 넘으면 가장 오래된 청크부터 버림"""
+    def __init__(self, max_seconds=5.0):
+        self.max_seconds = max_seconds
+        self._chunks = deque() # (audio, sample_rate)
+        self._seconds = 0.0
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def put(self, audio, sample_rate):
+        if audio is None or audio.size == 0:
+            return
+        seconds = len(audio) / sample_rate
+        with self._lock:
+            self._chunks.append((audio, sample_rate))
+            self._seconds += seconds
+            while self._seconds > self.max_seconds and len(self._chunks) > 1:
+                old, old_sr = self._chunks.popleft()
+                self._seconds -= len(old) / old_sr
+                self.dropped += 1
+                _count("audio", "dropped")
+        _count("audio", "accepted")
+
+    def drain(self):
+        """보관 중인 청크를 도착 순서대로 모두 꺼냅니다."""
+        with self._lock:
+            chunks = list(self._chunks)
+            self._chunks.clear()
+            self._seconds = 0.0
+        return chunks
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def seconds(self):
+        return self._seconds
+
+    def clear(self):
+        self.drain()
+
+    def nbytes(self):
+        with self._lock:
+            return sum(audio.nbytes for audio, _ in self._chunks)
+
+
+class Admission:
+    """세션 하나의 입력 슬롯 / 버퍼와 '처리 중인 호출은 하나' 규칙"""
+    def __init__(self, max_audio_seconds=5.0):
+        self.frames = FrameSlot()
+        self.audio = AudioBuffer(max_audio_seconds)
+        self._owner = threading.Lock()
+        self.deferred_calls = 0
+        self.superseded_turns = 0
+        self._turn = None # 진행 중인 응답 턴의 cancel 이벤트
+
+    def offer(self, image, audio=None):
+        """호출로 들어온 입력을 맡깁니다. audio: (sample_rate, numpy_array) 스트리밍 청크"""
+        self.frames.put(image)
+        if audio is not None:
+            sample_rate, audio_array = audio
+            self.audio.put(audio_array, sample_rate)
+
+    def try_acquire(self):
+        """처리 권한을 얻으면 True. 같은 세션의 다른 호출이 처리 중이면 False (입력은 그 호출이 이어서 처리)"""
+        if self._owner.acquire(blocking=False):
+            return True
+        self.deferred_calls += 1
+        REGISTRY.inc("face2chat_admission_deferred_calls_total", help_text="처리 중인 호출에 입력을 넘기고 바로 반환한 호출 수")
+        return False
+
+    def release(self):
+        self._owner.release()
+
+    def begin_turn(self):
+        """새 응답 턴의 cancel 이벤트를 만듭니다. 아직 끝나지 않은 이전 턴이 있으면 대체된 것으로 보고 취소"""
+        turn = threading.Event()
+        previous, self._turn = self._turn, turn
+        if previous is not None and not previous.is_set():
+            self._supersede(previous)
+        return turn
+
+    def supersede_turn(self):
+        """응답을 내보내는 중에 새 발화가 끝났을 때 호출합니다. 진행 중인 턴을 취소"""
+        turn = self._turn
+        if turn is not None and not turn.is_set():
+            self._supersede(turn)
+
+    def _supersede(self, turn):
+        turn.set()
+        self.superseded_turns += 1
+        _count("turn", "superseded")
+
+    def end_turn(self, turn):
+        turn.set()
+        if self._turn is turn:
+            self._turn = None
+
+    def has_pending(self):
+        return len(self.audio) > 0
+
+    def nbytes(self):
+        return self.frames.nbytes() + self.audio.nbytes()
+
+    def clear(self):
+        turn = self._turn
+        if turn is not None:
+            turn.set() # 세션이 정리되면 진행 중인 응답도 멈춤
+        self.frames.clear()
+        self.audio.clear()
+
+    def stats(self):
+        return {
+            "frames_coalesced": self.frames.coalesced,
+            "audio_dropped": self.audio.dropped,
+            "audio_buffered_seconds": self.audio.seconds(),
+            "deferred_calls": self.deferred_calls,
+            "superseded_turns": self.superseded_turns,
+        }
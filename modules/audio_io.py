@@ -0,0 +1,118 @@
+# modules/audio_io.py
+# 오디오 버퍼를 디스크를 거치지 않고 메모리에서 주고받기 위한 헬퍼 모음
+# - Gradio 입력 (sample_rate, numpy) 튜플 / memoryview / 파일 경로를 모두 numpy로 통일
+# - numpy -> Vosk용 16비트 PCM 바이트 변환
+# - gTTS MP3 바이트를 메모리에서 바로 디코딩
+# - 턴(turn)마다 몇 바이트가 복사되었는지 집계 (FACE2CHAT_TRACK_COPIES=1 또는 copy_stats.enabled = True)
+
+import contextvars
+import io
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import soundfile as sf
+
+
+class CopyStats:
+    """오디오 버퍼 복사량 집계기. 비활성화 상태에서는 add()가 아무 일도 하지 않습니다."""
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.total_bytes = 0
+        self.by_stage = {}
+        self._lock = threading.Lock()
+        self._turn = contextvars.ContextVar("face2chat_copy_turn", default=None)
+
+    def add(self, nbytes, stage):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.total_bytes += nbytes
+            self.by_stage[stage] = self.by_stage.get(stage, 0) + nbytes
+        turn = self._turn.get()
+        if turn is not None:
+            turn[stage] = turn.get(stage, 0) + nbytes
+
+    @contextmanager
+    def turn(self, report=None):
+        """
+        with copy_stats.turn() as report: ... 블록 안에서 복사된 바이트를 단계별로 모읍니다.
+        report: 이어서 모을 기존 집계 (스트리밍 턴처럼 여러 블록에 나뉜 작업을 한 턴으로 합칠 때)
+        """
+        report = {} if report is None else report
+        token = self._turn.set(report)
+        try:
+            yield report
+        finally:
+            self._turn.reset(token)
+
+
+copy_stats = CopyStats(enabled=os.environ.get("FACE2CHAT_TRACK_COPIES") == "1")
+
+
+def as_float_mono(audio):
+    """numpy 오디오를 float32 모노로 변환합니다. 이미 float32 모노라면 복사하지 않습니다."""
+    audio = np.asarray(audio)
+    if np.issubdtype(audio.dtype, np.integer):
+        audio = audio.astype(np.float32) / np.iinfo(audio.dtype).max
+        copy_stats.add(audio.nbytes, "int_to_float")
+    elif audio.dtype != np.float32:
+        audio = audio.astype(np.float32)
+        copy_stats.add(audio.nbytes, "float_cast")
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1, dtype=np.float32)
+        copy_stats.add(audio.nbytes, "downmix")
+    return audio
+
+
+def to_pcm16_bytes(audio):
+    """numpy 오디오 청크(float 또는 int)를 Vosk가 받는 16비트 PCM 바이트로 변환합니다."""
+    audio = np.asarray(audio)
+    if audio.dtype == np.int16:
+        # int16 배열은 변환 없이 바이트로만 꺼냄 (Vosk cffi 바인딩은 bytes만 받음)
+        pcm = audio
+    elif np.issubdtype(audio.dtype, np.integer):
+        # int32 등 더 넓은 정수형은 상위 16비트만 사용
+        shift = audio.dtype.itemsize * 8 - 16
+        pcm = (audio.astype(np.int64) >> shift).astype(np.int16)
+    else:
+        pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+    copy_stats.add(pcm.nbytes, "pcm16")
+    return pcm.tobytes()
+
+
+def load_audio(source):
+    """
+    오디오 입력을 (numpy_array, sample_rate)로 읽습니다.
+    source: (sample_rate, numpy_array 또는 16비트 PCM memoryview) 튜플, 또는 파일 경로
+    튜플 입력은 디스크를 거치지 않으며 가능한 한 원본 버퍼를 그대로 사용합니다.
+    """
+    if isinstance(source, tuple):
+        sr, data = source
+        if isinstance(data, (memoryview, bytes, bytearray)):
+            data = np.frombuffer(data, dtype=np.int16) # 복사 없는 view
+        return np.asarray(data), int(sr)
+    if isinstance(source, str) and os.path.exists(source):
+        data, sr = sf.read(source, dtype='float32')
+        copy_stats.add(data.nbytes, "file_read")
+        return data, sr
+    return None, None
+
+
+def decode_audio_bytes(data):
+    """
+    MP3/WAV 등 인코딩된 오디오를 메모리에서 바로 (float32 모노, sample_rate)로 디코딩합니다.
+    data: bytes 또는 BytesIO 같은 파일 객체 (파일 객체는 처음부터 읽음)
+    """
+    if hasattr(data, "read"):
+        data.seek(0)
+        source = data
+    else:
+        source = io.BytesIO(data)
+    audio, sample_rate = sf.read(source, dtype='float32')
+    copy_stats.add(audio.nbytes, "decode")
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1, dtype=np.float32)
+        copy_stats.add(audio.nbytes, "downmix")
+    return audio, sample_rate
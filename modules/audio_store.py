@@ -0,0 +1,144 @@
+# modules/audio_store.py
+# 응답 오디오 파일 보관소
+# Gradio에 오디오를 파일 경로로 넘겨야 할 때(FACE2CHAT_AUDIO_OUTPUT=filepath) 사용합니다.
+# NamedTemporaryFile(delete=False)처럼 임시 디렉토리에 파일을 계속 남기지 않도록
+# - 파일 이름은 PCM 내용의 해시 (같은 응답 / 무음 대체 오디오는 파일 하나를 재사용)
+# - Gradio가 파일을 가져갈 때까지는 고정(pin)하고, 가져간 뒤(release)에는 LRU 정리 대상이 됨
+# - 전체 크기가 max_bytes를 넘으면 가장 오래 사용하지 않은 파일부터 삭제 (max_bytes=0이면 가져가는 즉시 삭제)
+# - 재시작 시 디렉토리에 남은 파일을 다시 읽어 들여 상한이 그대로 적용됨
+# 을 적용하고, 디스크 사용량을 게이지로 노출합니다.
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import soundfile as sf
+
+from .metrics import REGISTRY, log
+
+
+class AudioFileStore:
+    SUFFIX = ".wav"
+
+    def __init__(self, root=None, max_bytes=64 * 1024 * 1024):
+        """
+        root: 파일을 저장할 디렉토리 (None이면 시스템 임시 디렉토리 아래 face2chat-audio)
+        max_bytes: 보관할 파일 전체 크기 상한. Gradio가 아직 가져가지 않은 파일은 상한을 넘어도 지우지 않음
+        """
+        self.root = root or os.path.join(tempfile.gettempdir(), "face2chat-audio")
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._files = OrderedDict() # 파일 이름 -> 크기 (오래 사용하지 않은 순서)
+        self._pins = {}             # 파일 이름 -> Gradio가 아직 가져가지 않은 출력 수
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        self._load_existing()
+
+    def _load_existing(self):
+        """이전 실행에서 남은 파일을 수정 시각 순서로 목록에 넣고 상한을 적용합니다."""
+        entries = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.endswith(".tmp"):
+                os.remove(path) # 쓰는 도중 종료된 파일
+            elif name.endswith(self.SUFFIX):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._files[name] = size
+            self.current_bytes += size
+        with self._lock:
+            self._evict()
+
+    @classmethod
+    def make_name(cls, audio, sample_rate):
+        digest = hashlib.blake2b(np.ascontiguousarray(audio).data, digest_size=16)
+        digest.update(f"{audio.dtype.str}:{int(sample_rate)}".encode("ascii"))
+        return digest.hexdigest() + cls.SUFFIX
+
+    def put(self, audio, sample_rate):
+        """
+        오디오를 WAV 파일로 저장(또는 같은 내용의 파일을 재사용)하고 경로를 반환합니다.
+        반환된 파일은 release(path)를 호출할 때까지 삭제되지 않습니다.
+        """
+        audio = np.asarray(audio)
+        name = self.make_name(audio, sample_rate)
+        path = os.path.join(self.root, name)
+        with self._lock:
+            self._pins[name] = self._pins.get(name, 0) + 1
+            if name in self._files and os.path.exists(path):
+                self._files.move_to_end(name)
+                self.hits += 1
+                return path
+            self.misses += 1
+
+        size = self._write(path, audio, sample_rate)
+        with self._lock:
+            old = self._files.pop(name, None)
+            self.current_bytes += size - (old or 0)
+            self._files[name] = size
+            self._evict()
+        return path
+
+    def _write(self, path, audio, sample_rate):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            sf.write(tmp_path, audio, int(sample_rate), format="WAV", subtype="PCM_16")
+            os.replace(tmp_path, path) # Gradio가 반쯤 쓴 파일을 읽지 않도록 원자적으로 교체
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return os.path.getsize(path)
+
+    def release(self, path):
+        """Gradio가 파일을 가져간 뒤 호출합니다. 이후에는 상한을 넘을 때 LRU 순서로 삭제될 수 있습니다."""
+        name = os.path.basename(path)
+        with self._lock:
+            count = self._pins.get(name, 0) - 1
+            if count > 0:
+                self._pins[name] = count
+            else:
+                self._pins.pop(name, None)
+            self._evict()
+
+    def _evict(self):
+        # 호출자가 self._lock을 잡고 있어야 함. 고정된 파일은 건너뜀
+        if self.current_bytes <= self.max_bytes:
+            return
+        for name in [n for n in self._files if n not in self._pins]:
+            if self.current_bytes <= self.max_bytes:
+                break
+            size = self._files.pop(name)
+            self.current_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(os.path.join(self.root, name))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                log(f"[오디오 보관소] 파일 삭제 실패 ({name}): {e}")
+            REGISTRY.inc("face2chat_audio_store_evictions_total", help_text="상한을 넘어 삭제한 응답 오디오 파일 수")
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "files": len(self._files),
+            "bytes": self.current_bytes,
+            "pinned": len(self._pins),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+        }
+
+    def register_gauges(self, registry=REGISTRY):
+        registry.gauge("face2chat_audio_store_bytes", lambda: self.current_bytes, "응답 오디오 파일 디스크 사용량")
+        registry.gauge("face2chat_audio_store_files", lambda: len(self._files), "보관 중인 응답 오디오 파일 수")
+        registry.gauge("face2chat_audio_store_hit_rate", lambda: self.stats()["hit_rate"], "같은 내용의 파일을 재사용한 비율")
@@ -0,0 +1,294 @@
+# modules/batch_runner.py
+# 녹화해 둔 (이미지, 오디오) 쌍을 Face2ChatPipeline으로 한꺼번에 다시 실행하는 배치 CLI
+# - 매니페스트: CSV(.gradio/flagged/dataset*.csv와 같은 형식) 또는 JSONL ({"id", "image", "audio", ...})
+# - 프로세스 풀: 작업 프로세스마다 모델을 한 번만 로드하고, 코어 수에 맞춰 프로세스 / 프로세스당 스레드 수를 나눔
+# - 결과: 항목이 끝나는 대로 JSONL 한 줄씩 기록 (감정 / 인식 텍스트 / 응답 / 단계별 시간, 매니페스트의 기대값)
+# - 재시작: 출력 파일에 이미 기록된 항목은 건너뛰므로, 중단된 뒤 같은 명령으로 다시 실행하면 이어서 처리
+#
+# 실행 예:
+#   python -m modules.batch_runner .gradio/flagged/dataset2.csv --output results.jsonl
+#   python -m modules.batch_runner manifest.jsonl --output results.jsonl --workers 8 --backend onnx --tts stub
+#   python -m modules.batch_runner manifest.jsonl --output results.jsonl --models stub     # 모델 없이 경로만 점검
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+# CSV 열 이름 후보 (Gradio 플래그 데이터셋은 열 이름이 컴포넌트 label)
+IMAGE_COLUMNS = ("image", "얼굴 이미지 (웹캠 입력)")
+AUDIO_COLUMNS = ("audio", "음성 입력")
+EXPECTED_COLUMNS = {"emotion": ("emotion", "감정"), "text": ("text", "음성 인식 결과"),
+                    "response": ("response", "챗봇 응답", "GPT 응답")}
+
+# 작업 프로세스마다 한 번 만드는 파이프라인
+_pipeline = None
+_save_audio_dir = None
+
+
+def _pick(row, candidates):
+    for name in candidates:
+        if row.get(name):
+            return row[name]
+    return None
+
+
+def read_manifest(path, root=None):
+    """
+    매니페스트를 읽어 항목 목록을 반환합니다. 각 항목: {"id", "image", "audio", "expected"}
+    root: 상대 경로의 기준 디렉토리 (None이면 현재 디렉토리, 플래그 데이터셋의 경로는 저장소 루트 기준)
+    이미지와 오디오가 모두 비어 있는 행은 건너뜁니다.
+    """
+    if path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as fp:
+            rows = [json.loads(line) for line in fp if line.strip()]
+    else:
+        with open(path, encoding="utf-8", newline="") as fp:
+            rows = list(csv.DictReader(fp))
+
+    items = []
+    for index, row in enumerate(rows):
+        image, audio = _pick(row, IMAGE_COLUMNS), _pick(row, AUDIO_COLUMNS)
+        if not image and not audio:
+            continue
+        if root:
+            image = os.path.join(root, image) if image and not os.path.isabs(image) else image
+            audio = os.path.join(root, audio) if audio and not os.path.isabs(audio) else audio
+        expected = {key: _pick(row, names) for key, names in EXPECTED_COLUMNS.items()}
+        items.append({
+            "id": str(row.get("id") or index), # id 열이 없으면 행 번호 (재시작 시 같은 항목을 찾는 키)
+            "image": image,
+            "audio": audio,
+            "expected": {k: v for k, v in expected.items() if v},
+        })
+    return items
+
+
+def read_completed(output_path, retry_errors=False):
+    """
+    이미 기록된 결과의 id 집합을 반환합니다. 중단으로 마지막 줄이 잘렸으면 그 줄을 잘라 내어 이어 쓸 수 있게 합니다.
+    retry_errors: True면 마지막 결과가 오류인 항목은 다시 실행
+    """
+    if not os.path.exists(output_path):
+        return set()
+    with open(output_path, "rb") as fp:
+        data = fp.read()
+    if data and not data.endswith(b"\n"):
+        with open(output_path, "r+b") as fp:
+            fp.truncate(data.rfind(b"\n") + 1)
+        data = data[:data.rfind(b"\n") + 1]
+
+    status = {}
+    for line in data.decode("utf-8").splitlines():
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        status[record["id"]] = record.get("status") # 같은 id가 여러 번 있으면 마지막 결과 기준
+    return {item_id for item_id, s in status.items() if not (retry_errors and s == "error")}
+
+
+def _thread_env(threads):
+    """작업 프로세스들이 코어를 나눠 쓰도록 수치 라이브러리 스레드 수를 제한하는 환경 변수"""
+    env = {name: str(threads) for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "TF_NUM_INTRAOP_THREADS")}
+    env["TF_NUM_INTEROP_THREADS"] = "1"
+    env["FACE2CHAT_VERBOSE"] = os.environ.get("FACE2CHAT_VERBOSE", "0") # 항목마다 디버그 출력이 섞이지 않도록
+    return env
+
+
+def build_models(models="real", backend="torch", int8=False, threads=None):
+    """app.py와 같은 설정으로 (detector, stt, vision_analyzer)를 만듭니다. (model_server도 사용)"""
+    if models == "stub":
+        from .benchmark import build_components
+
+        detector, stt, vision_analyzer, _ = build_components("stub")
+        return detector, stt, vision_analyzer
+
+    from .emotion_detector import EmotionDetector
+    from .speech_to_text import SpeechToText
+    from .vision_analyzer import VisionAnalyzer
+
+    if backend == "onnx":
+        from .onnx_backend import onnx_paths
+
+        yolo_path, emotion_path = onnx_paths(int8=int8)
+        vision_analyzer = VisionAnalyzer(backend="onnx", onnx_path=yolo_path, threads=threads)
+        detector = EmotionDetector(backend="onnx", onnx_path=emotion_path, threads=threads)
+    else:
+        vision_analyzer, detector = VisionAnalyzer(), EmotionDetector()
+    return detector, SpeechToText(), vision_analyzer
+
+
+def build_pipeline(models="real", backend="torch", int8=False, tts="stub", llm="rule", llm_options=None, threads=None):
+    """app.py와 같은 구성의 파이프라인을 만듭니다. (항목끼리 결과를 재사용하지 않도록 프레임 게이트는 사용하지 않음)"""
+    from .benchmark import StubTTSBackend
+    from .chatbot_engine import ChatbotEngine
+    from .llm_backends import create_llm_backend
+    from .perception import PerceptionStage
+    from .pipeline import Face2ChatPipeline
+    from .text_to_speech import TextToSpeech
+    from .tts_backends import create_backend
+
+    detector, stt, vision_analyzer = build_models(models, backend, int8, threads)
+    tts_backend = StubTTSBackend(latency_ms=0.0) if tts == "stub" else create_backend(tts)
+    bot = ChatbotEngine(backend=create_llm_backend(llm, **(llm_options or {})))
+    perception = PerceptionStage(detector, vision_analyzer)
+    return Face2ChatPipeline(detector, stt, bot, TextToSpeech(backend=tts_backend), vision_analyzer, perception=perception)
+
+
+def _init_worker(options, save_audio_dir):
+    global _pipeline, _save_audio_dir
+    import cv2
+
+    threads = options.get("threads")
+    if threads:
+        cv2.setNumThreads(threads)
+    _pipeline = build_pipeline(**options)
+    _save_audio_dir = save_audio_dir
+
+
+def process_item(item):
+    """작업 프로세스에서 항목 하나를 실행하여 결과 dict를 반환합니다. (예외는 status="error"로 기록)"""
+    from .metrics import record_stages
+
+    record = {"id": item["id"], "image": item["image"], "audio": item["audio"], "worker": os.getpid()}
+    start = time.perf_counter()
+    try:
+        with record_stages() as stages:
+            emotion, text, response, (audio_out, sample_rate) = _pipeline.run(item["image"], item["audio"])
+        record.update(status="ok", emotion=emotion, text=text, response=response,
+                      audio_seconds=round(len(audio_out) / sample_rate, 3) if sample_rate else 0.0)
+        if _save_audio_dir:
+            import soundfile as sf
+
+            record["audio_out"] = os.path.join(_save_audio_dir, f"{item['id']}.wav")
+            sf.write(record["audio_out"], audio_out, sample_rate)
+        record["stages_ms"] = {stage: round(seconds * 1000, 2) for stage, seconds in stages.items()}
+    except Exception as e:
+        record.update(status="error", error=f"{type(e).__name__}: {e}")
+    record["total_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    if item.get("expected"):
+        record["expected"] = item["expected"]
+        record["matches"] = {key: record.get(key) == value for key, value in item["expected"].items()}
+    return record
+
+
+def summarize(records, elapsed):
+    """이번 실행 결과의 처리량, 단계별 p50/p95, 기대값 일치율"""
+    ok = [r for r in records if r["status"] == "ok"]
+    summary = {
+        "items": len(records),
+        "ok": len(ok),
+        "errors": len(records) - len(ok),
+        "elapsed_s": round(elapsed, 2),
+        "items_per_s": round(len(records) / elapsed, 3) if elapsed > 0 else 0.0,
+        "stages_ms": {},
+        "match_rate": {},
+    }
+    stages = {}
+    for r in ok:
+        for stage, ms in dict(r["stages_ms"], total=r["total_ms"]).items():
+            stages.setdefault(stage, []).append(ms)
+    for stage, values in sorted(stages.items()):
+        summary["stages_ms"][stage] = {"p50": round(float(np.percentile(values, 50)), 2),
+                                       "p95": round(float(np.percentile(values, 95)), 2)}
+    for key in EXPECTED_COLUMNS:
+        compared = [r["matches"][key] for r in ok if key in r.get("matches", {})]
+        if compared:
+            summary["match_rate"][key] = round(sum(compared) / len(compared), 3)
+    return summary
+
+
+def run_batch(manifest, output, workers=None, root=None, retry_errors=False, save_audio_dir=None, **pipeline_options):
+    """
+    매니페스트의 항목 중 output에 아직 없는 것만 프로세스 풀에서 실행하고, 끝나는 대로 output에 추가합니다.
+    반환값: 이번 실행의 요약 dict
+    """
+    items = read_manifest(manifest, root)
+    completed = read_completed(output, retry_errors)
+    pending = [item for item in items if item["id"] not in completed]
+    print(f"[배치] 전체 {len(items)}개 중 완료 {len(items) - len(pending)}개, 이번에 {len(pending)}개 실행")
+    if not pending:
+        return summarize([], 0.0)
+
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(workers or cpus, len(pending)))
+    if not pipeline_options.get("threads"):
+        pipeline_options["threads"] = max(1, cpus // workers)
+    # 자식 프로세스가 수치 라이브러리를 import하기 전에 스레드 수가 정해지도록 환경 변수로 넘김 (spawn 시 상속)
+    os.environ.update(_thread_env(pipeline_options["threads"]))
+    if save_audio_dir:
+        os.makedirs(save_audio_dir, exist_ok=True)
+
+    records = []
+    start = time.perf_counter()
+    # TensorFlow / PyTorch는 fork 후 자식에서 안전하지 않으므로 spawn으로 새 프로세스를 시작
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_init_worker, initargs=(pipeline_options, save_audio_dir))
+    queue = iter(pending)
+    in_flight = set()
+    try:
+        with open(output, "a", encoding="utf-8") as out:
+            while True:
+                # 대기열이 한꺼번에 커지지 않도록 작업 프로세스당 2개까지만 제출
+                while len(in_flight) < workers * 2:
+                    item = next(queue, None)
+                    if item is None:
+                        break
+                    in_flight.add(pool.submit(process_item, item))
+                if not in_flight:
+                    break
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record = future.result()
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush() # 중단되더라도 끝난 항목은 남도록 한 줄씩 기록
+                    records.append(record)
+                    mark = "✓" if record["status"] == "ok" else "✗"
+                    print(f"[배치] {mark} {len(records)}/{len(pending)} id={record['id']} {record['total_ms']:.0f}ms"
+                          + (f" {record['error']}" if record["status"] == "error" else ""))
+    except KeyboardInterrupt:
+        print(f"\n[배치] 중단되었습니다. 완료된 {len(records)}개는 {output}에 기록되어 있으며 같은 명령으로 이어서 실행할 수 있습니다.")
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+    return summarize(records, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Face2Chat 배치 / 오프라인 실행")
+    parser.add_argument("manifest", help="CSV(Gradio 플래그 데이터셋 형식) 또는 JSONL 매니페스트")
+    parser.add_argument("--output", required=True, help="결과 JSONL 경로 (이미 있으면 남은 항목만 이어서 실행)")
+    parser.add_argument("--workers", type=int, default=None, help="작업 프로세스 수 (기본: CPU 코어 수)")
+    parser.add_argument("--threads", type=int, default=None, help="프로세스당 추론 스레드 수 (기본: 코어 수 / 프로세스 수)")
+    parser.add_argument("--root", default=None, help="매니페스트 안 상대 경로의 기준 디렉토리 (기본: 현재 디렉토리)")
+    parser.add_argument("--models", choices=("real", "stub"), default="real", help="stub: 모델 없이 결정적인 stub 사용")
+    parser.add_argument("--backend", choices=("torch", "onnx"), default="torch", help="추론 백엔드 (app.py의 FACE2CHAT_INFERENCE_BACKEND)")
+    parser.add_argument("--int8", action="store_true", help="onnx 백엔드에서 int8 양자화 모델 사용")
+    parser.add_argument("--tts", default="stub", help="TTS 백엔드: stub(네트워크 없음, 기본), gtts, gtts-http")
+    parser.add_argument("--llm", default="rule", help="챗봇 백엔드: rule(기본) 또는 openai")
+    parser.add_argument("--llm-url", default=None, help="openai 백엔드 서버 주소 (mock_llm_server 등)")
+    parser.add_argument("--llm-model", default=None)
+    parser.add_argument("--save-audio", default=None, help="응답 음성 WAV를 <id>.wav로 저장할 디렉토리")
+    parser.add_argument("--retry-errors", action="store_true", help="이전 실행에서 오류가 난 항목도 다시 실행")
+    parser.add_argument("--summary", default=None, help="요약 JSON을 저장할 경로")
+    args = parser.parse_args()
+
+    llm_options = {key: value for key, value in (("base_url", args.llm_url), ("model", args.llm_model)) if value}
+    try:
+        summary = run_batch(args.manifest, args.output, workers=args.workers, root=args.root, retry_errors=args.retry_errors,
+                            save_audio_dir=args.save_audio, models=args.models, backend=args.backend, int8=args.int8,
+                            tts=args.tts, llm=args.llm, llm_options=llm_options, threads=args.threads)
+    except KeyboardInterrupt:
+        sys.exit(130)
+    text = json.dumps(summary, indent=2, ensure_ascii=False)
+    print(text)
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as fp:
+            fp.write(text)
@@ -0,0 +1,175 @@
+# modules/batch_scheduler.py
+# 여러 세션에서 동시에 들어오는 추론 요청을 모아 한 번의 배치 호출로 처리하는 스케줄러
+# 첫 요청이 들어온 뒤 max_wait_ms 동안(또는 max_batch_size개가 찰 때까지) 요청을 모아 batch_fn을 한 번 호출하고,
+# 결과를 각 호출자의 Future로 돌려줍니다. 부하가 낮으면 배치 크기 1로 바로 실행되고,
+# 부하가 높을수록 배치가 커져서 처리량이 함께 늘어납니다.
+# 과부하 시 큐가 끝없이 늘지 않도록, request_scope()로 붙인 기한(deadline)이 지난 요청과
+# 같은 key(세션)의 더 새로운 요청으로 대체된 요청은 실행하지 않고 버립니다.
+
+import contextvars
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from .metrics import REGISTRY, count_error, timed
+
+_request_scope = contextvars.ContextVar("face2chat_batch_scope", default=(None, None, None))
+
+
+@contextmanager
+def request_scope(key=None, deadline=None):
+    """
+    이 블록 안에서 제출하는 배치 요청에 key와 deadline(time.monotonic 기준)을 붙입니다.
+    key: 다른 블록에서 같은 key의 요청이 새로 들어오면 아직 실행되지 않은 이전 요청은 취소 (세션별 최신 프레임만 처리).
+        같은 블록 안에서 제출한 요청들(한 프레임의 얼굴 crop 여러 개 등)끼리는 서로 대체하지 않음
+    deadline: 실행 차례가 왔을 때 이미 지났으면 실행하지 않고 버림 (호출자가 이미 기다리기를 포기한 요청)
+    """
+    token = _request_scope.set((key, deadline, object()))
+    try:
+        yield
+    finally:
+        _request_scope.reset(token)
+
+
+class BatchScheduler:
+    def __init__(self, batch_fn, max_batch_size=8, max_wait_ms=10.0, name="batch"):
+        """
+        batch_fn: 입력 목록을 받아 같은 길이의 결과 목록을 반환하는 함수
+        max_batch_size: 한 번에 묶을 최대 요청 수
+        max_wait_ms: 첫 요청 이후 다른 요청을 기다리는 최대 시간 (지연 시간 상한)
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self.batches = 0
+        self.items = 0
+        self.batch_size_counts = {} # 배치 크기 -> 횟수
+        self.max_queue_depth = 0
+        self.dropped = {"expired": 0, "superseded": 0}
+        self._queue = queue.Queue()
+        self._latest = {} # key -> (가장 최근 request_scope, 그 블록에서 제출된 Future 목록)
+        self._latest_lock = threading.Lock()
+        self._closed = False
+        self._worker = threading.Thread(target=self._loop, daemon=True, name=f"batch-{name}")
+        self._worker.start()
+
+    def submit(self, item):
+        """요청을 큐에 넣고 결과를 받을 Future를 반환합니다."""
+        if self._closed:
+            raise RuntimeError(f"[{self.name} 스케줄러] 이미 종료되었습니다.")
+        future = Future()
+        key, deadline, scope = _request_scope.get()
+        if key is not None:
+            self._supersede(key, scope, future)
+        self._queue.put((item, future, deadline))
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return future
+
+    def _supersede(self, key, scope, future):
+        with self._latest_lock:
+            latest_scope, futures = self._latest.get(key, (None, []))
+            if latest_scope is scope:
+                futures.append(future)
+                previous = []
+            else:
+                self._latest[key] = (scope, [future])
+                previous = futures
+        # 아직 큐에서 기다리는 이전 요청만 취소됨 (이미 실행 중이면 cancel()이 False)
+        for old in previous:
+            if old.cancel():
+                self._count_drop("superseded")
+        future.add_done_callback(lambda _: self._forget(key, scope))
+
+    def _forget(self, key, scope):
+        # 블록의 요청이 모두 끝나면 key 기록을 지움 (세션 수만큼 쌓이지 않도록)
+        with self._latest_lock:
+            entry = self._latest.get(key)
+            if entry is not None and entry[0] is scope and all(f.done() for f in entry[1]):
+                del self._latest[key]
+
+    def _count_drop(self, reason):
+        self.dropped[reason] += 1
+        REGISTRY.inc("face2chat_dropped_inputs_total", help_text="과부하로 처리하지 않고 버린 입력 수",
+                     stage=f"batch_{self.name}", reason=reason)
+
+    def __call__(self, item, timeout=None):
+        """요청 하나를 제출하고 결과가 나올 때까지 기다립니다. (단일 호출 함수 대신 그대로 사용 가능)"""
+        return self.submit(item).result(timeout=timeout)
+
+    def _collect(self):
+        item = self._queue.get()
+        if item is None:
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None) # 종료 신호는 현재 배치를 처리한 뒤 다시 받도록 되돌려 놓음
+                break
+            batch.append(item)
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            batch = self._admit(batch)
+            if not batch:
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            self.batch_size_counts[len(batch)] = self.batch_size_counts.get(len(batch), 0) + 1
+            try:
+                with timed(f"batch_{self.name}"):
+                    results = self.batch_fn([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"배치 결과 개수 불일치: 입력 {len(batch)}개, 결과 {len(results)}개")
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                count_error(f"batch_{self.name}")
+                print(f"[{self.name} 스케줄러] 배치 실행 실패: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+
+    def _admit(self, batch):
+        """기한이 지난 요청은 버리고, 호출자가 취소했거나 새 요청으로 대체된 요청은 빼고 실행할 목록을 만듭니다."""
+        now = time.monotonic()
+        admitted = []
+        for item, future, deadline in batch:
+            if deadline is not None and now > deadline and future.cancel():
+                self._count_drop("expired")
+                continue
+            if future.set_running_or_notify_cancel():
+                admitted.append((item, future))
+        return admitted
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue_depth(),
+            "max_queue_depth": self.max_queue_depth,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "batch_size_counts": dict(sorted(self.batch_size_counts.items())),
+            "dropped": dict(self.dropped),
+        }
+
+    def close(self):
+        self._closed = True
+        self._queue.put(None)
+        self._worker.join(timeout=5)
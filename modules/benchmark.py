@@ -0,0 +1,482 @@
+# modules/benchmark.py
+# 오프라인 성능 벤치마크
+# - 여러 해상도의 합성 프레임 / 여러 샘플 레이트와 길이의 합성 오디오로 모듈별 지연 시간과 Face2ChatPipeline.run 전체를 측정
+# - N개 세션이 동시에 run을 호출할 때의 처리량 (app.py와 같은 배치 스케줄러 / 병렬 단계 구성)
+# - 결과(백분위 지연 시간, 처리량, 최대 RSS)를 JSON으로 저장하고, 저장해 둔 기준(baseline)과 비교
+#
+# --models stub(기본)은 DeepFace / YOLO / Vosk / gTTS 대신 결정적인 stub 모델을 사용하므로
+# 네트워크와 모델 파일 없이 CPU만으로 실행됩니다. stub은 실제 모델의 입출력 형식을 그대로 흉내 내어,
+# 전처리 / 후처리 / 스케줄링 / 캐시 등 이 저장소의 코드는 실제 경로 그대로 실행됩니다.
+#
+# 실행 예:
+#   python -m modules.benchmark --output bench.json
+#   python -m modules.benchmark --baseline bench_baseline.json            # 기준 대비 회귀가 있으면 종료 코드 1
+#   python -m modules.benchmark --output bench_baseline.json --sessions 1,4,8 --iterations 50
+
+import argparse
+import json
+import platform
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+try:
+    import resource # Windows에는 없음
+except ImportError:
+    resource = None
+
+from .batch_scheduler import BatchScheduler
+from .chatbot_engine import ChatbotEngine
+from .emotion_detector import EmotionDetector
+from .frame_preprocess import Frame
+from .metrics import REGISTRY, set_verbose
+from .perception import PerceptionStage
+from .pipeline import Face2ChatPipeline
+from .speech_to_text import SpeechStream, SpeechToText
+from .text_to_speech import TextToSpeech
+from .tts_backends import TTSBackend
+from .vision_analyzer import VisionAnalyzer
+
+DEFAULT_RESOLUTIONS = ((320, 240), (640, 480), (1280, 720))
+DEFAULT_SAMPLE_RATES = (16000, 44100, 48000)
+DEFAULT_DURATIONS = (1.0, 3.0)
+DEFAULT_SESSIONS = (1, 4, 8)
+
+# 기준 대비 이 비율 이상 나빠지면 회귀로 판단
+DEFAULT_TOLERANCE = 0.15
+# 1ms 미만의 지연 시간 차이는 측정 잡음으로 보고 무시
+MIN_DELTA_MS = 1.0
+
+
+# ---------------------------------------------------------------------------
+# 합성 입력
+# ---------------------------------------------------------------------------
+
+def synthetic_frame(width, height, seed=0):
+    """가운데에 밝은 사각형(사람 자리)이 있는 결정적인 RGB 프레임"""
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(0, 64, size=(height, width, 3), dtype=np.uint8)
+    frame[height // 8:height * 7 // 8, width * 3 // 8:width * 5 // 8] += 128
+    return frame
+
+
+def synthetic_audio(sample_rate, seconds, seed=0):
+    """음성 대역의 사인파 + 약한 잡음으로 만든 int16 모노 오디오 (Gradio 마이크 입력과 같은 형식)"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(sample_rate * seconds), dtype=np.float32) / sample_rate
+    wave = 0.3 * np.sin(2 * np.pi * 180.0 * t) + 0.02 * rng.standard_normal(t.size).astype(np.float32)
+    return (wave * 32767).astype(np.int16)
+
+
+# ---------------------------------------------------------------------------
+# stub 모델 (실제 모델과 같은 인터페이스, 고정된 모의 연산 시간)
+# ---------------------------------------------------------------------------
+
+class _StubKerasModel:
+    """DeepFace Emotion Keras 모델 대역. (N, 48, 48, 1) 입력의 평균 밝기로 감정 점수를 정합니다."""
+    def __init__(self, base_ms=4.0, per_item_ms=0.5):
+        self.base = base_ms / 1000.0
+        self.per_item = per_item_ms / 1000.0
+
+    def predict(self, batch, verbose=0):
+        time.sleep(self.base + self.per_item * len(batch))
+        means = batch.reshape(len(batch), -1).mean(axis=1)
+        scores = np.zeros((len(batch), len(EmotionDetector.EMOTION_LABELS)), dtype=np.float32)
+        scores[np.arange(len(batch)), (means * 100).astype(int) % scores.shape[1]] = 1.0
+        return scores
+
+
+class StubEmotionDetector(EmotionDetector):
+    def __init__(self, detect_ms=20.0, **model_kwargs):
+        self._emotion_classifier = _StubKerasModel(**model_kwargs)
+        self.detect_ms = detect_ms
+
+    def detect(self, image):
+        # DeepFace.analyze(얼굴 검출 + 분류) 대역: 프레임 전체를 전처리하고 고정 시간만큼 대기
+        if isinstance(image, Frame):
+            image = image.view(self.input_size, "bgr")
+        if not isinstance(image, np.ndarray) or image.size == 0:
+            return "알 수 없음"
+        time.sleep(self.detect_ms / 1000.0)
+        return self.classify_faces([image])[0]
+
+    def warmup(self):
+        self.classify_faces([np.zeros((224, 224, 3), dtype=np.uint8)])
+
+
+class _StubBoxes:
+    def __init__(self, cls, conf, xyxy):
+        self.cls, self.conf, self.xyxy = cls, conf, xyxy
+
+
+class _StubResult:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class _StubYOLO:
+    """ultralytics YOLO 대역. 프레임 가운데의 사람 1명과 크기에 따라 의자 1개를 '검출'합니다."""
+    names = {0: "person", 56: "chair"}
+
+    def __init__(self, base_ms=15.0, per_image_ms=3.0):
+        self.base = base_ms / 1000.0
+        self.per_image = per_image_ms / 1000.0
+
+    def predict(self, imgs, conf=0.5, verbose=False):
+        if isinstance(imgs, np.ndarray):
+            imgs = [imgs]
+        time.sleep(self.base + self.per_image * len(imgs))
+        results = []
+        for img in imgs:
+            h, w = img.shape[:2]
+            xyxy = [[w * 3 // 8, h // 8, w * 5 // 8, h * 7 // 8]]
+            cls = [0]
+            if w >= 640:
+                xyxy.append([0, h // 2, w // 8, h])
+                cls.append(56)
+            results.append(_StubResult(_StubBoxes(np.array(cls, dtype=np.float32),
+                                                  np.full(len(cls), 0.9, dtype=np.float32),
+                                                  np.array(xyxy, dtype=np.float32))))
+        return results
+
+
+class StubVisionAnalyzer(VisionAnalyzer):
+    def __init__(self, **model_kwargs):
+        self.model = _StubYOLO(**model_kwargs)
+
+
+class _StubRecognizer:
+    """KaldiRecognizer 대역. 들어온 PCM 길이에 비례하는 시간(실시간 대비 rtf배)을 쓰고 길이로 텍스트를 만듭니다."""
+    def __init__(self, sample_rate, rtf=0.02):
+        self.sample_rate = sample_rate
+        self.rtf = rtf
+        self.samples = 0
+
+    def AcceptWaveform(self, pcm):
+        n = len(pcm) // 2
+        self.samples += n
+        time.sleep(self.rtf * n / self.sample_rate)
+        return False
+
+    def Reset(self):
+        self.samples = 0
+
+    def PartialResult(self):
+        return json.dumps({"partial": "안녕" if self.samples else ""})
+
+    def FinalResult(self):
+        seconds = self.samples / self.sample_rate
+        self.samples = 0
+        return json.dumps({"text": " ".join(["안녕하세요"] * max(1, int(seconds))) if seconds >= 0.5 else ""})
+
+
+class StubSpeechStream(SpeechStream):
+    def __init__(self, model, sample_rate=16000, vad=None, resample_quality="medium", rtf=0.02):
+        self.sample_rate = sample_rate
+        self.recognizer = _StubRecognizer(sample_rate, rtf)
+        self.vad = vad
+        self.resample_quality = resample_quality
+        self._resampler = None
+        self.segments = []
+        self._partial = ""
+        self.samples_fed = 0
+
+
+class StubSpeechToText(SpeechToText):
+    def __init__(self, rtf=0.02, resample_quality="medium"):
+        self.model = None
+        self.rtf = rtf
+        self.resample_quality = resample_quality
+
+    def new_recognizer(self, sample_rate=16000):
+        return _StubRecognizer(sample_rate, self.rtf)
+
+    def open_stream(self, sample_rate=16000, vad=None):
+        return StubSpeechStream(self.model, sample_rate, vad, self.resample_quality, self.rtf)
+
+
+class StubTTSBackend(TTSBackend):
+    """네트워크 없이 텍스트 길이에 비례하는 사인파를 돌려주는 TTS 백엔드 (요청당 고정 지연 포함)"""
+    name = "stub"
+
+    def __init__(self, latency_ms=30.0, sample_rate=24000, seconds_per_char=0.06):
+        self.latency = latency_ms / 1000.0
+        self.sample_rate = sample_rate
+        self.seconds_per_char = seconds_per_char
+
+    def synthesize(self, text, lang):
+        time.sleep(self.latency)
+        n = max(1, int(self.sample_rate * self.seconds_per_char * max(1, len(text))))
+        t = np.arange(n, dtype=np.float32) / self.sample_rate
+        return (0.2 * np.sin(2 * np.pi * 220.0 * t)).astype(np.float32), self.sample_rate
+
+
+def build_components(models="stub"):
+    """(detector, stt, vision_analyzer, tts_backend)를 만듭니다. models='real'이면 실제 모델을 로드합니다."""
+    if models == "stub":
+        return StubEmotionDetector(), StubSpeechToText(), StubVisionAnalyzer(), StubTTSBackend()
+    from .tts_backends import create_backend
+
+    return EmotionDetector(), SpeechToText(), VisionAnalyzer(), create_backend("gtts")
+
+
+# ---------------------------------------------------------------------------
+# 측정
+# ---------------------------------------------------------------------------
+
+def summarize(latencies):
+    """초 단위 지연 시간 목록을 {n, mean_ms, p50_ms, p90_ms, p99_ms}로 요약합니다."""
+    arr = np.asarray(latencies, dtype=np.float64) * 1000.0
+    return {
+        "n": int(arr.size),
+        "mean_ms": float(arr.mean()),
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p90_ms": float(np.percentile(arr, 90)),
+        "p99_ms": float(np.percentile(arr, 99)),
+    }
+
+
+def measure(fn, iterations, warmup=2):
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies)
+
+
+def peak_rss_mb():
+    """프로세스 최대 RSS (MB). resource 모듈이 없는 플랫폼에서는 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux는 KB, macOS는 바이트 단위
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class Bench:
+    def __init__(self, models="stub", resolutions=DEFAULT_RESOLUTIONS, sample_rates=DEFAULT_SAMPLE_RATES,
+                 durations=DEFAULT_DURATIONS, iterations=20):
+        self.models = models
+        self.resolutions = resolutions
+        self.sample_rates = sample_rates
+        self.durations = durations
+        self.iterations = iterations
+        self.detector, self.stt, self.vision_analyzer, self.tts_backend = build_components(models)
+        self.bot = ChatbotEngine()
+
+    def _tts(self):
+        # 캐시 적중으로 측정이 왜곡되지 않도록 캐시 없이 합성
+        return TextToSpeech(backend=self.tts_backend)
+
+    def modules(self):
+        """각 모듈을 단독으로 측정합니다."""
+        report = {}
+        perception = PerceptionStage(self.detector, self.vision_analyzer)
+        for w, h in self.resolutions:
+            frame = synthetic_frame(w, h)
+            report[f"emotion.detect@{w}x{h}"] = measure(lambda: self.detector.detect(frame), self.iterations)
+            report[f"vision.analyze_scene@{w}x{h}"] = measure(lambda: self.vision_analyzer.analyze_scene(frame), self.iterations)
+            report[f"perception.analyze@{w}x{h}"] = measure(lambda: perception.analyze(frame), self.iterations)
+        for sr in self.sample_rates:
+            for seconds in self.durations:
+                audio = (sr, synthetic_audio(sr, seconds))
+                report[f"stt.transcribe@{sr}Hz/{seconds:g}s"] = measure(lambda: self.stt.transcribe(audio), self.iterations)
+        tts = self._tts()
+        for text in ("네.", "기분이 좋아 보여요! 오늘 하루는 어떠셨어요? 주변에 노트북이 보이네요."):
+            report[f"tts.synthesize@{len(text)}chars"] = measure(lambda: tts.synthesize(text), self.iterations)
+        report["bot.generate_response"] = measure(
+            lambda: self.bot.generate_response("안녕하세요", "happy", scene="주변에서 다음을 감지했습니다: person.", objects=["person"]),
+            self.iterations)
+        return report
+
+    def _pipeline(self, parallel):
+        """app.py와 같은 구성의 파이프라인 (parallel=True면 배치 스케줄러 + 병렬 단계). 종료 함수도 함께 반환"""
+        if not parallel:
+            return Face2ChatPipeline(self.detector, self.stt, self.bot, self._tts(), self.vision_analyzer), lambda: None
+        yolo = BatchScheduler(self.vision_analyzer.detect_objects_batch, max_batch_size=8, max_wait_ms=15, name="bench-yolo")
+        emotion = BatchScheduler(self.detector.classify_faces, max_batch_size=32, max_wait_ms=10, name="bench-emotion")
+        perception = PerceptionStage(self.detector, self.vision_analyzer, detection_scheduler=yolo, emotion_scheduler=emotion)
+        executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="bench-stage")
+        # 벤치마크는 단계 시간을 재는 것이 목적이므로 제한 시간 대체가 일어나지 않도록 넉넉하게 설정
+        pipeline = Face2ChatPipeline(self.detector, self.stt, self.bot, self._tts(), self.vision_analyzer,
+                                     perception=perception, executor=executor,
+                                     stage_timeouts={name: 60.0 for name in ("perception", "emotion", "scene", "stt")})
+
+        def close():
+            yolo.close()
+            emotion.close()
+            executor.shutdown(wait=True)
+        return pipeline, close
+
+    def pipeline(self):
+        """Face2ChatPipeline.run 전체 (순차 실행 구성)를 해상도 x 오디오 조합별로 측정합니다."""
+        report = {}
+        pipeline, close = self._pipeline(parallel=False)
+        try:
+            for w, h in self.resolutions:
+                frame = synthetic_frame(w, h)
+                for sr in self.sample_rates:
+                    for seconds in self.durations:
+                        audio = (sr, synthetic_audio(sr, seconds))
+                        report[f"run@{w}x{h}/{sr}Hz/{seconds:g}s"] = measure(lambda: pipeline.run(frame, audio), self.iterations)
+        finally:
+            close()
+        return report
+
+    def concurrency(self, sessions=DEFAULT_SESSIONS, resolution=(640, 480), sample_rate=48000, seconds=3.0):
+        """세션 N개가 동시에 run을 반복 호출할 때의 처리량(턴/초)과 턴 지연 시간을 측정합니다."""
+        report = {}
+        audio = (sample_rate, synthetic_audio(sample_rate, seconds))
+        for n in sessions:
+            pipeline, close = self._pipeline(parallel=True)
+            # 세션마다 다른 프레임 (게이트 / 캐시가 세션 사이에 결과를 공유하지 않도록)
+            frames = [synthetic_frame(*resolution, seed=i) for i in range(n)]
+            latencies = []
+            lock = threading.Lock()
+            barrier = threading.Barrier(n)
+
+            def session(i):
+                barrier.wait()
+                for _ in range(self.iterations):
+                    t0 = time.perf_counter()
+                    pipeline.run(frames[i], audio)
+                    with lock:
+                        latencies.append(time.perf_counter() - t0)
+
+            try:
+                pipeline.run(frames[0], audio) # 워밍업
+                threads = [threading.Thread(target=session, args=(i,)) for i in range(n)]
+                start = time.perf_counter()
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+                elapsed = time.perf_counter() - start
+            finally:
+                close()
+            report[f"sessions_{n}"] = dict(summarize(latencies), turns_per_s=len(latencies) / elapsed)
+        return report
+
+
+def run_benchmark(models="stub", iterations=20, sessions=DEFAULT_SESSIONS, resolutions=DEFAULT_RESOLUTIONS,
+                  sample_rates=DEFAULT_SAMPLE_RATES, durations=DEFAULT_DURATIONS):
+    """전체 벤치마크를 실행하고 JSON으로 저장할 수 있는 결과 dict를 반환합니다."""
+    set_verbose(False) # 요청마다 찍히는 디버그 출력이 측정에 섞이지 않도록
+    bench = Bench(models, resolutions, sample_rates, durations, iterations)
+    started = time.time()
+    report = {
+        "meta": {
+            "models": models,
+            "iterations": iterations,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+        },
+        "modules": bench.modules(),
+        "pipeline": bench.pipeline(),
+        "concurrency": bench.concurrency(sessions),
+    }
+    report["stages"] = REGISTRY.stage_summary()
+    report["peak_rss_mb"] = peak_rss_mb()
+    report["meta"]["elapsed_s"] = time.time() - started
+    return report
+
+
+# ---------------------------------------------------------------------------
+# 기준 비교
+# ---------------------------------------------------------------------------
+
+def _flatten(report):
+    """비교 대상 지표만 {"섹션/항목/지표": 값}으로 펼칩니다. (meta, stages는 참고용이라 제외)"""
+    flat = {}
+    for section in ("modules", "pipeline", "concurrency"):
+        for name, stats in report.get(section, {}).items():
+            for metric in ("p50_ms", "p99_ms", "turns_per_s"):
+                if metric in stats:
+                    flat[f"{section}/{name}/{metric}"] = stats[metric]
+    if report.get("peak_rss_mb") is not None:
+        flat["peak_rss_mb"] = report["peak_rss_mb"]
+    return flat
+
+
+def compare(report, baseline, tolerance=DEFAULT_TOLERANCE, min_delta_ms=MIN_DELTA_MS):
+    """
+    현재 결과를 기준 결과와 비교합니다.
+    반환값: {"regressions": [...], "improvements": [...], "missing": [...]}
+    지연 시간 / 메모리는 커질수록, 처리량(turns_per_s)은 작아질수록 나빠진 것으로 봅니다.
+    """
+    current, base = _flatten(report), _flatten(baseline)
+    result = {"regressions": [], "improvements": [], "missing": sorted(set(base) - set(current))}
+    for key in sorted(set(current) & set(base)):
+        old, new = base[key], current[key]
+        if not old or (key.endswith("_ms") and abs(new - old) < min_delta_ms):
+            continue
+        change = (new - old) / old
+        if key.endswith("turns_per_s"):
+            change = -change
+        entry = {"metric": key, "baseline": old, "current": new, "change": change}
+        if change > tolerance:
+            result["regressions"].append(entry)
+        elif change < -tolerance:
+            result["improvements"].append(entry)
+    return result
+
+
+def print_comparison(comparison, tolerance):
+    print(f"[벤치마크] 기준 대비 (허용 오차 {tolerance:.0%})")
+    for label, key in (("회귀", "regressions"), ("개선", "improvements")):
+        for entry in comparison[key]:
+            print(f"  {label} {entry['metric']}: {entry['baseline']:.2f} -> {entry['current']:.2f} ({entry['change']:+.1%})")
+    for key in comparison["missing"]:
+        print(f"  누락 {key}")
+    if not comparison["regressions"]:
+        print("  회귀 없음")
+
+
+def _csv(value, cast):
+    return tuple(cast(v) for v in value.split(",") if v)
+
+
+def _resolution(value):
+    w, h = value.lower().split("x")
+    return int(w), int(h)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Face2Chat 오프라인 성능 벤치마크")
+    parser.add_argument("--models", choices=("stub", "real"), default="stub",
+                        help="stub: 네트워크 / 모델 파일 없이 결정적인 stub 모델 사용, real: 실제 모델 로드")
+    parser.add_argument("--iterations", type=int, default=20, help="측정 항목별 반복 횟수 (동시 실행은 세션당 턴 수)")
+    parser.add_argument("--sessions", default=",".join(map(str, DEFAULT_SESSIONS)), help="동시 세션 수 목록 (예: 1,4,8)")
+    parser.add_argument("--resolutions", default=",".join(f"{w}x{h}" for w, h in DEFAULT_RESOLUTIONS))
+    parser.add_argument("--sample-rates", default=",".join(map(str, DEFAULT_SAMPLE_RATES)))
+    parser.add_argument("--durations", default=",".join(f"{d:g}" for d in DEFAULT_DURATIONS), help="오디오 길이(초) 목록")
+    parser.add_argument("--output", help="결과 JSON을 저장할 경로 (기준 파일로도 사용 가능)")
+    parser.add_argument("--baseline", help="비교할 기준 결과 JSON 경로. 회귀가 있으면 종료 코드 1")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="회귀로 판단할 변화 비율")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.models, args.iterations, _csv(args.sessions, int), _csv(args.resolutions, _resolution),
+                           _csv(args.sample_rates, int), _csv(args.durations, float))
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            fp.write(text)
+        print(f"[벤치마크] 결과 저장: {args.output}")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fp:
+            baseline = json.load(fp)
+        comparison = compare(report, baseline, args.tolerance)
+        print_comparison(comparison, args.tolerance)
+        sys.exit(1 if comparison["regressions"] else 0)
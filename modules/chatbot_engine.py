@@ -1,75 +1,82 @@
 # modules/chatbot_engine.py
+import requests
+
+from .llm_backends import ChatTurn, LLMBackend, RuleBackend
+from .metrics import count_error, count_fallback, log
+
+
 class ChatbotEngine:
-    def __init__(self):
-        # 향후 GPT API 키나 세션 초기화가 필요한 경우 여기에 작성
-        pass
+    # 입력이 비었을 때의 고정 응답 (TTS 캐시 사전 준비 대상)
+    EMPTY_INPUT_RESPONSE = "음성을 잘 못 들었어요. 다시 말씀해 주세요."
 
-    def generate_response(self, text: str, emotion: str) -> str:
+    RESPONSE_PREFIX = {
+        "happy": "기분이 좋아 보여요! ",
+        "sad": "기운 내세요. ",
+        "angry": "마음을 진정시켜볼까요? ",
+        "surprise": "놀라셨군요! ",
+        "fear": "걱정하지 마세요. ",
+        "disgust": "불쾌하셨군요... ",
+        "neutral": "",
+        "unknown": ""
+    }
+
+    def __init__(self, backend: LLMBackend = None):
+        """
+        backend: 응답 생성 백엔드 (None이면 규칙 기반 RuleBackend)
+        LLM 백엔드가 시간 초과 / 오류로 아무것도 내놓지 못하면 규칙 기반 응답으로 대체합니다.
+        """
+        self.backend = backend or RuleBackend()
+        self._fallback = RuleBackend()
+
+    def stream_response(self, text: str, emotion: str, scene: str = "", objects=None, history=(), cancel=None):
+        """
+        응답을 생성되는 대로 조각 단위로 yield합니다.
+        scene: 장면 설명 문장, objects: 감지된 객체 이름 목록, history: 세션의 (발화, 감정, 응답) 기록
+        cancel: threading.Event. 설정되면 LLM 응답 수신을 멈춤
+        """
         # 빈 입력 처리
         if not text.strip():
-            return "음성을 잘 못 들었어요. 다시 말씀해 주세요."
+            yield self.EMPTY_INPUT_RESPONSE
+            return
 
-        # ⭐️ pipeline.py에서 text는 이미 scene_info와 사용자의 발화가 합쳐진 상태일 수 있음 ⭐️
-        # 예: "주변에서 다음을 감지했습니다: person, laptop. 사용자가 말했어요: '안녕하세요?'"
-        # 이 합쳐진 텍스트를 파싱하여 활용하거나, LLM에 직접 전달하여 문맥을 이해하게 합니다.
+        # 감정 접두어는 고정 문구이므로 LLM 응답보다 먼저 내보냄 (TTS 캐시에서 바로 재생 가능)
+        prefix = self.RESPONSE_PREFIX.get(emotion, "")
+        if prefix:
+            yield prefix
 
-        response_prefix = {
-            "happy": "기분이 좋아 보여요! ",
-            "sad": "기운 내세요. ",
-            "angry": "마음을 진정시켜볼까요? ",
-            "surprise": "놀라셨군요! ",
-            "fear": "걱정하지 마세요. ",
-            "disgust": "불쾌하셨군요... ",
-            "neutral": "",
-            "unknown": ""
-        }
+        turn = ChatTurn(text, emotion, scene=scene, objects=objects, history=history)
+        produced = False
+        try:
+            for piece in self.backend.stream(turn, cancel=cancel):
+                produced = True
+                yield piece
+        except Exception as e:
+            count_error("llm")
+            count_fallback("bot", "timeout" if isinstance(e, (TimeoutError, requests.Timeout)) else "error")
+            print(f"(챗봇 엔진 오류) LLM 응답 생성 실패: {e}")
+            if not produced:
+                yield from self._fallback.stream(turn) # LLM 실패 시 대체 응답
 
-        prefix = response_prefix.get(emotion, "")
-        
-        # ⭐️ LLM (GPT) 연동 코드 예시 (실제 API 호출 코드로 교체 필요) ⭐️
-        # 현재는 단순한 문자열 조합이지만, 여기에 OpenAI, Google Gemini 등의 API 호출 로직이 들어갑니다.
-        # 이 때, 감정 정보와 주변 상황 정보(text에 포함됨)를 프롬프트에 잘 넣어주면 더 똑똑한 챗봇이 됩니다.
-        
-        # 예시: OpenAI API를 사용하는 경우 (주석 처리됨)
-        # from openai import OpenAI
-        # client = OpenAI(api_key="YOUR_OPENAI_API_KEY") # 실제 API 키로 교체
+    def generate_response(self, text: str, emotion: str, scene: str = "", objects=None, history=(), cancel=None) -> str:
+        """stream_response의 조각을 모두 이어 붙인 전체 응답"""
+        return "".join(self.stream_response(text, emotion, scene=scene, objects=objects, history=history, cancel=cancel))
 
-        # try:
-        #     system_prompt = "당신은 사용자의 감정과 주변 상황을 고려하여 친절하고 공감적인 대화를 나누는 챗봇입니다. 짧고 간결하게 대화하세요."
-        #     # text에 scene_info와 사용자 발화가 합쳐져 있으므로 이를 분리하여 프롬프트에 활용
-        #     if "주변에서 다음을 감지했습니다:" in text:
-        #         scene_info_for_llm = text.split("주변에서 다음을 감지했습니다:")[1].split('.')[0].strip()
-        #         user_text_for_llm = text.split('.', 1)[1].replace("사용자가 말했어요:", "").strip() if len(text.split('.', 1)) > 1 else ""
-        #     else:
-        #         scene_info_for_llm = "알 수 없음"
-        #         user_text_for_llm = text
-            
-        #     user_message = f"사용자의 감정: {emotion}. 주변 상황: {scene_info_for_llm}. 사용자가 말한 내용: {user_text_for_llm}."
-        #     messages = [
-        #         {"role": "system", "content": system_prompt},
-        #         {"role": "user", "content": user_message}
-        #     ]
-        #     completion = client.chat.completions.create(
-        #         model="gpt-3.5-turbo", # 또는 다른 모델
-        #         messages=messages
-        #     )
-        #     llm_response = completion.choices[0].message.content
-        #     response = f"{prefix}{llm_response}"
-        # except Exception as e:
-        #     print(f"(챗봇 엔진 오류) LLM 응답 생성 실패: {e}")
-        #     response = f"{prefix}당신은 이렇게 말했어요: '{text}'" # LLM 실패 시 대체 응답
-        
-        # 현재는 LLM 연동 없이 단순 문자열 조합
-        response = f"{prefix}당신은 이렇게 말했어요: '{text}'"
+    def warmup(self):
+        self.backend.warmup()
 
-        return response
+    def close(self):
+        self.backend.close()
     
+    def fixed_phrases(self):
+        """응답에 그대로 들어가는 고정 문구 목록 (TTS 캐시 사전 준비용)"""
+        return [self.EMPTY_INPUT_RESPONSE] + [p.strip() for p in self.RESPONSE_PREFIX.values() if p.strip()]
+
     # 이 respond 메서드는 pipeline.py에서 generate_response로 호출되므로
     # 사용되지 않거나 다른 목적으로 사용될 수 있습니다.
     # 현재 구조에서는 generate_response가 주된 응답 생성 로직입니다.
     def respond(self, text, emotion=None):
         if emotion:
-            print(f"(챗봇) 감정 고려하여 응답 생성 중... 감정: {emotion}")
+            log(f"(챗봇) 감정 고려하여 응답 생성 중... 감정: {emotion}")
             return f"({emotion} 상태에서) 당신은 이렇게 말했어요: '{text}'"
         else:
          return f"당신은 이렇게 말했어요: '{text}'"
\ No newline at end of file
@@ -13,22 +13,48 @@
 
 # 클래스 정의 개인 프로젝트 바이너 구조
 
-from deepface import DeepFace
 import cv2
 import numpy as np
 
+from .frame_preprocess import Frame
+from .metrics import count_error, log
+
+
+def _deepface():
+    # deepface(TensorFlow) import는 수 초가 걸리므로 모듈 로드 시점이 아니라 처음 사용할 때 불러옴
+    from deepface import DeepFace
+    return DeepFace
+
 
 class EmotionDetector:
-    def __init__(self):
-        print("(감정 인식기) 초기화 완료")
+    # DeepFace Emotion 모델의 출력 순서
+    EMOTION_LABELS = ["angry", "disgust", "fear", "happy", "sad", "surprise", "neutral"]
+    # 전처리된 Frame에서 꺼내 쓸 입력 해상도 (긴 변). 전체 프레임 얼굴 검출에는 이 정도면 충분
+    input_size = 640
+
+    def __init__(self, backend="keras", onnx_path=None, threads=None):
+        """
+        backend: 얼굴 crop 감정 분류(classify_faces)에 사용할 백엔드. "keras"(DeepFace 기본) 또는 "onnx"
+        threads: ONNX Runtime 세션의 스레드 수
+        전체 프레임 분석(detect)은 얼굴 검출이 포함된 DeepFace.analyze를 그대로 사용합니다.
+        """
+        self._emotion_classifier = None # classify_faces에서 처음 사용할 때 로드
+        self.backend = backend
+        if backend == "onnx":
+            from .onnx_backend import OnnxEmotionModel, onnx_paths
+
+            self._emotion_classifier = OnnxEmotionModel(onnx_path or onnx_paths()[1], threads=threads)
+        print(f"(감정 인식기) 초기화 완료 (분류 백엔드: {backend})")
 
     def detect(self, image):
         # image가 None (웹캠이 비활성화되었거나 초기 입력이 없는 경우)
         if image is None:
-            print("[감정 인식기] 이미지 입력이 없습니다.")
+            log("[감정 인식기] 이미지 입력이 없습니다.")
             return "알 수 없음"
             
-        if isinstance(image, str): # Gradio Image(type="filepath")
+        if isinstance(image, Frame): # 파이프라인의 프레임 전처리 단계를 거친 입력 (DeepFace는 BGR을 기대)
+            img = image.view(self.input_size, "bgr")
+        elif isinstance(image, str): # Gradio Image(type="filepath")
             img = cv2.imread(image)
         elif isinstance(image, np.ndarray): # Gradio Image(type="numpy")
             img = image
@@ -38,21 +64,87 @@ class EmotionDetector:
 
         # 이미지가 로드되지 않았거나 비어 있는 경우
         if img is None or img.size == 0:
-            print("[감정 인식기] 처리할 이미지가 비어 있습니다.")
+            log("[감정 인식기] 처리할 이미지가 비어 있습니다.")
             return "알 수 없음"
 
         try:
-            # enforce_detection=False: 얼굴을 찾지 못해도 오류를 발생시키지 않음
-            # 대신 빈 리스트를 반환할 수 있음
-            result = DeepFace.analyze(img, actions=['emotion'], enforce_detection=False, silent=True) # silent=True 추가로 콘솔 출력 줄임
-            
-            if result and len(result) > 0:
-                emotion = result[0]['dominant_emotion']
-                print(f"(감정 인식기) 감정 분석 결과: {emotion}")
-                return emotion
-            else:
-                print("(감정 인식기) 얼굴 감지 실패 또는 감정 분석 결과 없음.")
-                return "알 수 없음"
+            return self._analyze(img)
         except Exception as e:
+            count_error("emotion")
             print(f"(감정 인식 오류) {e}")
-            return "감정 인식 실패"
\ No newline at end of file
+            return "감정 인식 실패"
+
+    def _analyze(self, img):
+        """로드된 BGR 이미지 한 장에 얼굴 검출 + 감정 분류를 실행합니다. (모델 서버 프록시는 이 부분만 원격으로 실행)"""
+        # enforce_detection=False: 얼굴을 찾지 못해도 오류를 발생시키지 않음
+        # 대신 빈 리스트를 반환할 수 있음
+        result = _deepface().analyze(img, actions=['emotion'], enforce_detection=False, silent=True) # silent=True 추가로 콘솔 출력 줄임
+
+        if result and len(result) > 0:
+            emotion = result[0]['dominant_emotion']
+            log(f"(감정 인식기) 감정 분석 결과: {emotion}")
+            return emotion
+        log("(감정 인식기) 얼굴 감지 실패 또는 감정 분석 결과 없음.")
+        return "알 수 없음"
+
+    def warmup(self):
+        """
+        감정 분류 가중치와 얼굴 검출기를 미리 로드합니다.
+        DeepFace는 첫 analyze 호출 때 가중치를 읽으므로, 하지 않으면 첫 사용자가 그 비용을 부담합니다.
+        onnx 백엔드에서는 ONNX 세션만 준비하고 DeepFace(TensorFlow / Keras)는 불러오지 않습니다.
+        """
+        dummy = np.zeros((224, 224, 3), dtype=np.uint8)
+        if self.backend == "onnx":
+            self.classify_faces([dummy])
+            return
+        self._emotion_model()
+        self.classify_faces([dummy])
+        _deepface().analyze(dummy, actions=['emotion'], enforce_detection=False, silent=True)
+
+    def _emotion_model(self):
+        """DeepFace의 감정 분류 Keras 모델을 한 번만 로드해 둡니다."""
+        if self._emotion_classifier is None:
+            try:
+                client = _deepface().build_model(task="facial_attribute", model_name="Emotion") # deepface >= 0.0.93
+            except TypeError:
+                client = _deepface().build_model("Emotion") # 이전 버전 API
+            self._emotion_classifier = client.model
+        return self._emotion_classifier
+
+    @staticmethod
+    def _preprocess_face(crop):
+        """DeepFace Emotion 모델 입력 형식(48x48 흑백, 0~1)으로 변환합니다."""
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+        gray = cv2.resize(gray, (48, 48), interpolation=cv2.INTER_AREA)
+        return gray.astype(np.float32) / 255.0
+
+    def classify_faces(self, crops):
+        """
+        이미 잘라낸 얼굴(또는 머리) 영역 목록에 대해 감정 분류기만 실행합니다.
+        DeepFace의 얼굴 검출 단계를 건너뛰고, 모든 crop을 (N, 48, 48, 1) 배치로 묶어 predict를 한 번만 호출합니다.
+        (BatchScheduler의 batch_fn으로도 사용)
+        """
+        emotions = ["알 수 없음"] * len(crops)
+        valid = [i for i, crop in enumerate(crops) if crop is not None and crop.size > 0]
+        if not valid:
+            return emotions
+        try:
+            batch = np.stack([self._preprocess_face(crops[i]) for i in valid])[..., np.newaxis]
+            predictions = self._emotion_model().predict(batch, verbose=0)
+            for i, scores in zip(valid, predictions):
+                emotions[i] = self.EMOTION_LABELS[int(np.argmax(scores))]
+            return emotions
+        except Exception as e:
+            count_error("emotion_batch")
+            print(f"(감정 인식 오류) 배치 분류 실패, crop별 분석으로 대체: {e}")
+
+        for i in valid:
+            try:
+                # detector_backend='skip'으로 DeepFace의 얼굴 검출 단계를 건너뜀
+                result = _deepface().analyze(crops[i], actions=['emotion'], detector_backend='skip', enforce_detection=False, silent=True)
+                emotions[i] = result[0]['dominant_emotion'] if result else "알 수 없음"
+            except Exception as e:
+                count_error("emotion")
+                print(f"(감정 인식 오류) {e}")
+                emotions[i] = "감정 인식 실패"
+        return emotions
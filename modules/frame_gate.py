@@ -0,0 +1,89 @@
+# modules/frame_gate.py
+# 웹캠 프레임 변화 감지 게이트
+# 연속된 프레임이 거의 같으면 DeepFace / YOLO를 다시 돌리지 않고 직전 결과를 재사용합니다.
+# 프레임을 작은 흑백 썸네일로 줄여 직전 썸네일과의 평균 절대 차이만 비교하므로 비용이 매우 작습니다.
+
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from .frame_preprocess import Frame
+
+
+class FrameGate:
+    def __init__(self, diff_threshold=4.0, max_age=2.0, size=32):
+        """
+        diff_threshold: 썸네일(0~255 흑백) 평균 절대 차이가 이 값 이하이면 같은 장면으로 간주
+        max_age: 캐시된 결과를 재사용할 수 있는 최대 시간(초). 0 이하이면 시간 제한 없음
+        size: 비교용 썸네일 한 변의 크기(px)
+        """
+        self.diff_threshold = diff_threshold
+        self.max_age = max_age
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._signature = None
+        self._result = None
+        self._timestamp = 0.0
+        self._lock = threading.Lock()
+
+    def signature(self, frame):
+        """프레임을 size x size 흑백 썸네일(float32)로 축소합니다."""
+        small = cv2.resize(frame, (self.size, self.size), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = small.mean(axis=2, dtype=np.float32)
+        return small.astype(np.float32, copy=False)
+
+    def run(self, frame, compute):
+        """
+        frame이 직전 프레임과 거의 같고 결과가 max_age보다 오래되지 않았으면 캐시된 결과를,
+        아니면 compute(frame)을 실행한 새 결과를 반환합니다.
+        numpy 배열이 아닌 입력(None, 파일 경로 등)은 게이트를 거치지 않고 바로 compute합니다.
+        전처리된 Frame은 피라미드의 작은 단계로 썸네일을 만듭니다.
+        """
+        if isinstance(frame, Frame):
+            sig = self.signature(frame.view(self.size * 4))
+        elif not isinstance(frame, np.ndarray) or frame.size == 0:
+            return compute(frame)
+        else:
+            sig = self.signature(frame)
+        now = time.monotonic()
+        with self._lock:
+            if self._is_fresh(sig, now):
+                self.hits += 1
+                return self._result
+            self.misses += 1
+
+        result = compute(frame)
+        with self._lock:
+            self._signature = sig
+            self._result = result
+            self._timestamp = now
+        return result
+
+    def _is_fresh(self, sig, now):
+        if self._signature is None or self._signature.shape != sig.shape:
+            return False
+        if self.max_age > 0 and now - self._timestamp > self.max_age:
+            return False
+        return float(np.abs(sig - self._signature).mean()) <= self.diff_threshold
+
+    def cached_bytes(self):
+        """보관 중인 썸네일의 크기 (세션 메모리 집계용)"""
+        signature = self._signature
+        return signature.nbytes if signature is not None else 0
+
+    def reset(self):
+        with self._lock:
+            self._signature = None
+            self._result = None
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,86 @@
+# modules/frame_preprocess.py
+# 프레임 전처리 단계
+# 감정 인식 / 장면 분석 / 프레임 게이트가 같은 웹캠 프레임을 각자 검증하고 줄이던 것을 프레임당 한 번으로 모읍니다.
+# - 입력 검증 (None, 파일 경로, 흑백 / RGBA, dtype)과 파일은 한 번만 읽기
+# - max_side로 고해상도 카메라 프레임의 처리 비용 상한을 둠
+# - 절반씩 줄인 피라미드를 필요한 단계까지만 만들고, 각 모델에는 필요한 해상도의 단계를 view로 넘김
+# - Gradio는 RGB, OpenCV 계열 모델(YOLO / DeepFace)은 BGR을 기대하므로 색 순서는 [..., ::-1] view로 바꿈 (복사 없음)
+
+import os
+import threading
+
+import cv2
+import numpy as np
+
+
+class Frame:
+    """
+    전처리된 프레임 하나. view(target_side, color)로 모델별 입력을 꺼냅니다.
+    같은 프레임을 여러 단계가 동시에 사용하므로 피라미드 생성은 잠금으로 보호합니다.
+    """
+    def __init__(self, base, color="rgb"):
+        self.color = color # base의 채널 순서
+        self.levels = [base] # levels[i]는 base를 2^i배 줄인 이미지
+        self._lock = threading.Lock()
+
+    @property
+    def shape(self):
+        return self.levels[0].shape
+
+    def level_for(self, target_side):
+        """긴 변이 target_side 이상인 가장 작은 피라미드 단계의 번호 (필요하면 그 단계까지 생성)"""
+        with self._lock:
+            i = 0
+            while True:
+                if i + 1 >= len(self.levels):
+                    current = self.levels[i]
+                    if max(current.shape[:2]) // 2 < target_side or min(current.shape[:2]) < 2:
+                        return i
+                    self.levels.append(cv2.pyrDown(current))
+                if max(self.levels[i + 1].shape[:2]) < target_side:
+                    return i
+                i += 1
+
+    def view(self, target_side=None, color="bgr"):
+        """긴 변이 target_side 이상인 단계를 color 순서의 view로 반환합니다. target_side가 None이면 원본 해상도"""
+        level = self.levels[0] if target_side is None else self.levels[self.level_for(target_side)]
+        return level if color == self.color else level[..., ::-1]
+
+
+class FramePreprocessor:
+    def __init__(self, max_side=1280):
+        """max_side: 이보다 긴 변을 가진 프레임은 이 크기로 줄인 뒤 사용 (0 이하이면 제한 없음)"""
+        self.max_side = max_side
+
+    def prepare(self, image):
+        """
+        입력을 Frame으로 변환합니다. 반환: (Frame 또는 None, 오류 메시지 또는 None)
+        image: Gradio Image(type="numpy")의 RGB 배열 또는 이미지 파일 경로
+        """
+        color = "rgb"
+        if isinstance(image, str):
+            if not os.path.exists(image):
+                return None, "이미지 분석 실패: 파일 없음"
+            image = cv2.imread(image) # OpenCV는 BGR로 읽음
+            color = "bgr"
+        elif image is None:
+            return None, "이미지 분석 실패: 입력 없음"
+        elif not isinstance(image, np.ndarray):
+            return None, "이미지 분석 실패: 잘못된 입력 형식"
+
+        if image is None or image.size == 0:
+            return None, "이미지 분석 실패: 빈 이미지"
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB if color == "rgb" else cv2.COLOR_GRAY2BGR)
+        elif image.shape[2] == 4:
+            image = image[..., :3] # 알파 채널은 버림 (view)
+        if image.dtype != np.uint8:
+            # float(0~1) 입력은 0~255로 변환
+            scale = 255.0 if np.issubdtype(image.dtype, np.floating) and image.max() <= 1.0 else 1.0
+            image = np.clip(image * scale, 0, 255).astype(np.uint8)
+
+        h, w = image.shape[:2]
+        if self.max_side > 0 and max(h, w) > self.max_side:
+            ratio = self.max_side / max(h, w)
+            image = cv2.resize(image, (max(1, int(w * ratio)), max(1, int(h * ratio))), interpolation=cv2.INTER_AREA)
+        return Frame(image, color), None
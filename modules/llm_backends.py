@@ -0,0 +1,242 @@
+# modules/llm_backends.py
+# ChatbotEngine이 사용하는 응답 생성 백엔드
+# - RuleBackend: 기존 규칙 기반 응답 (LLM 없이 사용자의 말을 되돌려 줌, LLM 실패 시 대체 응답으로도 사용)
+# - OpenAIChatBackend: OpenAI 호환 /v1/chat/completions 스트리밍 API 호출.
+#   하나의 requests.Session(keep-alive 연결 풀)을 재사용하고, 토큰이 오는 대로 yield합니다.
+#   첫 토큰까지의 시간(TTFT)과 초당 토큰 수를 지표로 남기며, base_url을 mock_llm_server로 바꾸면 오프라인 테스트가 가능합니다.
+#
+# 백엔드는 문자열 하나로 합친 프롬프트 대신 ChatTurn(발화, 감정, 장면 설명, 객체 목록, 대화 기록)을 받습니다.
+
+import json
+import os
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .metrics import REGISTRY, log, observe
+
+DEFAULT_SYSTEM_PROMPT = "당신은 사용자의 감정과 주변 상황을 고려하여 친절하고 공감적인 대화를 나누는 챗봇입니다. 짧고 간결하게 대화하세요."
+
+TOKENS_PER_SECOND_BUCKETS = (1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0, 200.0, 500.0)
+
+
+class ChatTurn:
+    """챗봇에 넘기는 한 턴의 입력"""
+    def __init__(self, utterance, emotion, scene="", objects=None, history=()):
+        self.utterance = utterance
+        self.emotion = emotion
+        self.scene = scene or "" # 장면 설명 문장 (객체 목록이 없을 때 사용)
+        self.objects = list(objects) if objects else [] # 감지된 객체 이름 목록
+        self.history = list(history) # [(사용자 발화, 감정, 챗봇 응답), ...] 오래된 순서
+
+
+class LLMBackend:
+    name = "base"
+
+    def stream(self, turn: ChatTurn, cancel=None):
+        """
+        응답 텍스트 조각을 생성되는 순서대로 yield합니다.
+        cancel: threading.Event. 설정되면 남은 응답을 받지 않고 바로 멈춤
+        """
+        raise NotImplementedError
+
+    def warmup(self):
+        """첫 요청 전에 연결 등을 미리 준비합니다. (기본은 아무 것도 하지 않음)"""
+
+    def close(self):
+        pass
+
+
+class RuleBackend(LLMBackend):
+    """LLM 없이 사용자의 말을 (주변 상황과 함께) 그대로 되돌려 주는 기존 동작"""
+    name = "rule"
+
+    def stream(self, turn, cancel=None):
+        text = f"{turn.scene}. 사용자가 말했어요: '{turn.utterance}'" if turn.scene else turn.utterance
+        yield f"당신은 이렇게 말했어요: '{text}'"
+
+
+def build_messages(turn, system_prompt=DEFAULT_SYSTEM_PROMPT, max_history=6):
+    """ChatTurn을 OpenAI chat 형식의 메시지 목록으로 만듭니다. (최근 max_history 턴의 대화 기록 포함)"""
+    messages = [{"role": "system", "content": system_prompt}]
+    for text, emotion, response in (turn.history[-max_history:] if max_history > 0 else []):
+        messages.append({"role": "user", "content": f"[감정: {emotion}] {text}"})
+        messages.append({"role": "assistant", "content": response})
+
+    if turn.objects:
+        scene = ", ".join(turn.objects)
+    elif turn.scene and not turn.scene.startswith("이미지 분석 실패"):
+        scene = turn.scene
+    else:
+        scene = "알 수 없음"
+    messages.append({"role": "user", "content": f"사용자의 감정: {turn.emotion}. 주변 상황: {scene}. 사용자가 말한 내용: {turn.utterance}"})
+    return messages
+
+
+class OpenAIChatBackend(LLMBackend):
+    """
+    OpenAI 호환 chat completions 스트리밍 백엔드.
+    호출마다 클라이언트를 새로 만들지 않고 연결 풀이 있는 세션 하나를 계속 재사용합니다.
+    """
+    name = "openai"
+    PATH = "/v1/chat/completions"
+
+    def __init__(self, base_url="https://api.openai.com", model="gpt-4o-mini", api_key=None, timeout=(3.05, 10.0),
+                 total_timeout=20.0, max_tokens=256, temperature=0.7, retries=2, backoff_factor=0.2, pool_size=8,
+                 system_prompt=DEFAULT_SYSTEM_PROMPT, max_history=6):
+        """
+        base_url: API 서버 주소 (오프라인 테스트 시 mock_llm_server 주소)
+        model: 요청에 넣을 모델 이름
+        api_key: 지정하지 않으면 OPENAI_API_KEY 환경 변수 사용
+        timeout: (연결, 읽기) 타임아웃 초. 읽기 타임아웃은 토큰 사이 최대 대기 시간
+        total_timeout: 한 응답 전체에 허용하는 최대 시간 (읽기마다 타임아웃을 남은 시간으로 줄이며, 넘으면 TimeoutError)
+        retries / backoff_factor: 연결 오류 및 429/5xx 응답에 대한 재시도 정책 (첫 바이트를 받기 전까지만)
+        pool_size: 호스트당 유지할 keep-alive 연결 수 (동시 세션 수에 맞춤)
+        max_history: 프롬프트에 넣을 최근 대화 턴 수
+        """
+        self.url = base_url.rstrip("/") + self.PATH
+        self.model = model
+        self.timeout = timeout
+        self.total_timeout = total_timeout
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.system_prompt = system_prompt
+        self.max_history = max_history
+        self.session = requests.Session()
+        # 읽기 오류는 재시도하지 않음: 서버가 이미 요청을 받았고, 재시도하면 total_timeout을 넘김
+        retry = Retry(total=retries, read=0, backoff_factor=backoff_factor, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=None) # 응답을 받기 전의 재시도이므로 POST라도 중복 생성되지 않음
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Content-Type": "application/json", "Accept": "text/event-stream"})
+        api_key = api_key or os.environ.get("OPENAI_API_KEY")
+        if api_key:
+            self.session.headers["Authorization"] = f"Bearer {api_key}"
+
+    def _payload(self, turn):
+        return {
+            "model": self.model,
+            "messages": build_messages(turn, self.system_prompt, self.max_history),
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "stream": True,
+        }
+
+    def stream(self, turn, cancel=None):
+        start = time.perf_counter()
+        first_at = None
+        tokens = 0
+        outcome = "ok"
+        response = None
+        deadline = start + self.total_timeout
+        try:
+            connect_timeout, read_timeout = self.timeout if isinstance(self.timeout, tuple) else (self.timeout, self.timeout)
+            try:
+                response = self.session.post(self.url, json=self._payload(turn), stream=True,
+                                             timeout=(connect_timeout, self._read_timeout(read_timeout, deadline)))
+            except requests.RequestException as e: # 재시도 후의 읽기 타임아웃은 ConnectionError로 옴
+                self._raise_if_expired(deadline, e)
+                raise
+            response.raise_for_status()
+            # 서버 전송 이벤트(SSE): "data: {json}" 줄이 토큰마다 오고 "data: [DONE]"으로 끝남
+            for line in self._iter_lines(response, read_timeout, deadline):
+                if cancel is not None and cancel.is_set():
+                    outcome = "cancelled"
+                    log("[LLM] 응답 생성이 취소되었습니다.")
+                    return
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or [{}]
+                delta = (choices[0].get("delta") or {}).get("content")
+                if not delta:
+                    continue
+                tokens += 1 # 스트리밍 청크 하나를 토큰 하나로 셈
+                if first_at is None:
+                    first_at = time.perf_counter()
+                    observe("llm_first_token", first_at - start)
+                yield delta
+        except GeneratorExit:
+            outcome = "cancelled" # 호출한 쪽이 스트림을 중간에 닫음
+            raise
+        except TimeoutError:
+            outcome = "timeout"
+            raise
+        except Exception:
+            if outcome == "ok":
+                outcome = "error"
+            raise
+        finally:
+            # 끝까지 읽지 않은 연결은 닫아서 다음 요청이 남은 응답을 읽지 않도록 함
+            if response is not None:
+                response.close()
+            end = time.perf_counter()
+            observe("llm", end - start)
+            REGISTRY.inc("face2chat_llm_requests_total", help_text="LLM 요청 수 (결과별)", outcome=outcome)
+            REGISTRY.inc("face2chat_llm_tokens_total", tokens, help_text="LLM이 생성한 토큰 수")
+            if first_at is not None and tokens > 1 and end > first_at:
+                # 첫 토큰 이후의 생성 속도 (첫 토큰 지연은 llm_first_token으로 따로 기록)
+                REGISTRY.histogram("face2chat_llm_tokens_per_second", "LLM 토큰 생성 속도",
+                                   buckets=TOKENS_PER_SECOND_BUCKETS).observe((tokens - 1) / (end - first_at))
+
+    @staticmethod
+    def _read_timeout(read_timeout, deadline):
+        """토큰 사이 읽기 타임아웃과 전체 응답의 남은 시간 중 짧은 쪽"""
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            raise TimeoutError("LLM 응답이 전체 제한 시간 안에 끝나지 않았습니다.")
+        return remaining if read_timeout is None else min(read_timeout, remaining)
+
+    def _iter_lines(self, response, read_timeout, deadline):
+        """
+        응답 줄을 yield합니다. 읽기마다 소켓 타임아웃을 남은 전체 시간으로 줄여서,
+        연결만 열어 두고 아무것도 보내지 않는 서버도 total_timeout에 끊깁니다.
+        """
+        sock = getattr(getattr(response.raw, "connection", None), "sock", None)
+        lines = response.iter_lines()
+        while True:
+            timeout = self._read_timeout(read_timeout, deadline)
+            if sock is not None:
+                sock.settimeout(timeout)
+            try:
+                line = next(lines)
+            except StopIteration:
+                return
+            except requests.RequestException as e:
+                self._raise_if_expired(deadline, e)
+                raise
+            yield line
+
+    def _raise_if_expired(self, deadline, error):
+        """읽기 타임아웃이 전체 제한 시간 때문에 난 것이면 TimeoutError로 바꿈"""
+        if time.perf_counter() >= deadline:
+            raise TimeoutError(f"LLM 응답이 {self.total_timeout}초 안에 끝나지 않았습니다.") from error
+
+    def warmup(self):
+        """
+        토큰을 생성하지 않는 GET /v1/models로 연결 풀에 keep-alive 연결을 하나 열어 둡니다.
+        (DNS 조회 / TLS 핸드셰이크를 첫 응답의 TTFT에서 제외. 서버가 이 경로를 지원하지 않아도 연결은 남음)
+        """
+        response = self.session.get(self.url.replace(self.PATH, "/v1/models"), timeout=self.timeout)
+        response.close()
+
+    def close(self):
+        self.session.close()
+
+
+LLM_BACKENDS = {
+    RuleBackend.name: RuleBackend,
+    OpenAIChatBackend.name: OpenAIChatBackend,
+}
+
+
+def create_llm_backend(name, **kwargs):
+    """이름으로 챗봇 백엔드를 생성합니다. (예: FACE2CHAT_LLM_BACKEND=openai)"""
+    if name not in LLM_BACKENDS:
+        raise ValueError(f"알 수 없는 LLM 백엔드: {name} (사용 가능: {', '.join(LLM_BACKENDS)})")
+    return LLM_BACKENDS[name](**kwargs)
@@ -0,0 +1,197 @@
+# modules/metrics.py
+# 가벼운 계측 레이어
+# - 단계별 지연 시간 히스토그램 (감정 인식, 장면 분석, STT, 챗봇, TTS, 오디오 출력 등)
+# - 대체 응답(fallback) / 오류 카운터
+# - 다른 모듈의 stats()를 그대로 노출하는 게이지 (캐시 적중률, 스케줄러 큐 길이 등)
+# - Prometheus 텍스트 형식 출력 (app.py에서 /metrics로 노출)
+# - 요청마다 찍던 디버그 출력은 log()로 모아 FACE2CHAT_VERBOSE=0 한 번으로 끌 수 있음
+
+import contextvars
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# 기본 지연 시간 버킷 (초). 프레임 단위 추론(수 ms)부터 네트워크 TTS/LLM(수 초)까지 포함
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_verbose = os.environ.get("FACE2CHAT_VERBOSE", "1") != "0"
+
+
+def set_verbose(enabled):
+    """요청 경로의 디버그 출력(log)을 켜거나 끕니다."""
+    global _verbose
+    _verbose = bool(enabled)
+
+
+def log(*args):
+    """FACE2CHAT_VERBOSE가 꺼져 있으면 아무 것도 하지 않는 print. 요청마다 찍히는 디버그 출력에 사용합니다."""
+    if _verbose:
+        print(*args)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Histogram:
+    """누적 버킷 히스토그램. 최근 샘플(reservoir)로 p50/p99 같은 백분위도 바로 계산할 수 있습니다."""
+    def __init__(self, buckets=DEFAULT_BUCKETS, reservoir=2048):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self._recent = deque(maxlen=reservoir)
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.count += 1
+            self.sum += value
+            self._recent.append(value)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.bucket_counts[i] += 1
+                    break
+
+    def percentile(self, q):
+        """최근 샘플 기준 백분위 (q: 0~100). 샘플이 없으면 0.0"""
+        with self._lock:
+            samples = sorted(self._recent)
+        if not samples:
+            return 0.0
+        index = min(len(samples) - 1, max(0, math.ceil(q / 100.0 * len(samples)) - 1))
+        return samples[index]
+
+
+class Registry:
+    def __init__(self):
+        self._histograms = {} # (name, labels) -> Histogram
+        self._counters = {}   # (name, labels) -> float
+        self._gauges = {}     # name -> (help, fn)  fn()은 {labels tuple: value} 또는 숫자를 반환
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name, help_text="", buckets=DEFAULT_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = Histogram(buckets)
+                self._help.setdefault(name, help_text)
+            return self._histograms[key]
+
+    def inc(self, name, amount=1, help_text="", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+            self._help.setdefault(name, help_text)
+
+    def gauge(self, name, fn, help_text=""):
+        """스크레이프할 때마다 fn()을 호출해 값을 읽는 게이지를 등록합니다."""
+        with self._lock:
+            self._gauges[name] = (help_text, fn)
+
+    def stage_summary(self, name="face2chat_stage_seconds"):
+        """단계별 {count, p50_ms, p99_ms} 요약 (로그 / 벤치마크용)"""
+        with self._lock:
+            items = [(dict(labels).get("stage"), h) for (n, labels), h in self._histograms.items() if n == name]
+        return {stage: {"count": h.count, "p50_ms": h.percentile(50) * 1000, "p99_ms": h.percentile(99) * 1000}
+                for stage, h in items}
+
+    def render(self):
+        """Prometheus 텍스트 노출 형식(0.0.4)으로 모든 지표를 출력합니다."""
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            help_texts = dict(self._help)
+
+        seen = set()
+        for (name, labels), h in histograms:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {help_texts.get(name, '')}")
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, c in zip(h.buckets, h.bucket_counts):
+                cumulative += c
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', repr(bound)),))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {h.count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {h.sum}")
+            lines.append(f"{name}_count{_format_labels(labels)} {h.count}")
+
+        for (name, labels), value in counters:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {help_texts.get(name, '')}")
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        for name, (help_text, fn) in gauges:
+            try:
+                value = fn()
+            except Exception as e:
+                lines.append(f"# {name} 수집 실패: {e!r}")
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            if isinstance(value, dict):
+                for labels, v in value.items():
+                    lines.append(f"{name}{_format_labels(labels)} {float(v)}")
+            else:
+                lines.append(f"{name} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+@contextmanager
+def timed(stage):
+    """with timed("stt"): ... 블록의 실행 시간을 face2chat_stage_seconds{stage=...}에 기록하고, 예외는 오류로 셉니다."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        count_error(stage)
+        raise
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def observe(stage, seconds):
+    REGISTRY.histogram("face2chat_stage_seconds", "파이프라인 단계별 실행 시간", stage=stage).observe(seconds)
+    record = _stage_record.get()
+    if record is not None:
+        record[stage] = record.get(stage, 0.0) + seconds
+
+
+_stage_record = contextvars.ContextVar("face2chat_stage_record", default=None)
+
+
+@contextmanager
+def record_stages():
+    """
+    with record_stages() as stages: ... 블록 안에서 기록된 단계별 시간을 {stage: 초} dict로도 모읍니다.
+    전체 지표와 별도로 항목 하나의 단계별 시간이 필요할 때(배치 실행) 사용합니다.
+    """
+    record = {}
+    token = _stage_record.set(record)
+    try:
+        yield record
+    finally:
+        _stage_record.reset(token)
+
+
+def count_fallback(stage, reason):
+    """단계가 대체 결과(무음, 기본 응답, 시간 초과 등)로 끝난 횟수"""
+    REGISTRY.inc("face2chat_fallbacks_total", help_text="대체 결과를 사용한 횟수", stage=stage, reason=reason)
+
+
+def count_error(component):
+    REGISTRY.inc("face2chat_errors_total", help_text="구성요소별 오류 횟수", component=component)
@@ -0,0 +1,169 @@
+# modules/mock_llm_server.py
+# 오프라인 테스트 / 벤치마크용 로컬 LLM 서버
+# OpenAI 호환 /v1/chat/completions (stream=true면 SSE, 아니면 JSON 한 번에) 응답을 흉내 내어
+# OpenAIChatBackend를 네트워크와 API 키 없이 그대로 테스트할 수 있습니다.
+# 응답은 마지막 사용자 메시지를 되돌려 주는 고정 문장이고, 첫 토큰 지연과 토큰 간격을 지정할 수 있습니다.
+#
+# 서버만 실행:   python -m modules.mock_llm_server --port 8766 --ttft-ms 300 --token-ms 30
+# 벤치마크 실행: python -m modules.mock_llm_server --bench --requests 50 --ttft-ms 300 --token-ms 30
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+def make_reply(messages):
+    """마지막 사용자 메시지로 응답 토큰 목록을 만듭니다. (단어 하나 = 토큰 하나)"""
+    user = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+    said = user.split("사용자가 말한 내용:")[-1].strip()
+    text = f"말씀 잘 들었어요. '{said}'에 대해 조금 더 이야기해 볼까요? 무엇이든 편하게 말씀해 주세요."
+    words = text.split(" ")
+    return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive 지원 (스트리밍 응답은 chunked 전송)
+    ttft = 0.0
+    token_delay = 0.0
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionResetError:
+            pass # 요청마다 새 연결을 여는 클라이언트가 연결을 끊은 경우
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            request = json.loads(body)
+            messages = request["messages"]
+        except Exception:
+            self._reply(400, b'{"error": "bad request"}')
+            return
+
+        tokens = make_reply(messages)
+        if self.ttft:
+            time.sleep(self.ttft) # 프롬프트 처리 시간 흉내
+        if not request.get("stream"):
+            time.sleep(self.token_delay * len(tokens))
+            payload = {"object": "chat.completion", "model": request.get("model", "mock"),
+                       "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+                       "usage": {"completion_tokens": len(tokens)}}
+            self._reply(200, json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for i, token in enumerate(tokens):
+                if i and self.token_delay:
+                    time.sleep(self.token_delay)
+                chunk = {"object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+                self._write_event(json.dumps(chunk, ensure_ascii=False))
+            self._write_event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True # 클라이언트가 스트림을 중간에 닫음 (취소)
+
+    def _write_event(self, data):
+        event = f"data: {data}\n\n".encode("utf-8")
+        self.wfile.write(f"{len(event):x}\r\n".encode("ascii") + event + b"\r\n")
+        self.wfile.flush()
+
+    def _reply(self, status, data):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass # 요청마다 콘솔 출력하지 않음
+
+
+def start_server(host="127.0.0.1", port=0, ttft_ms=0.0, token_ms=0.0):
+    """백그라운드 스레드에서 서버를 시작하고 (server, base_url)을 반환합니다. port=0이면 빈 포트를 사용."""
+    handler = type("ConfiguredMockLLMHandler", (MockLLMHandler,), {"ttft": ttft_ms / 1000.0, "token_delay": token_ms / 1000.0})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="mock-llm-server").start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def _percentiles(samples):
+    arr = np.array(samples) * 1000.0
+    return {"p50_ms": float(np.percentile(arr, 50)), "p95_ms": float(np.percentile(arr, 95)), "mean_ms": float(arr.mean())}
+
+
+def benchmark(base_url, n_requests=50, text="오늘 날씨가 좋네요"):
+    """
+    스트리밍 없이 전체 응답을 기다리는 방식(기존 주석 코드처럼 요청마다 새 연결)과
+    연결 풀 + 스트리밍 백엔드의 첫 토큰 / 전체 응답 시간을 비교합니다.
+    """
+    import requests
+    from .llm_backends import ChatTurn, OpenAIChatBackend, build_messages
+
+    backend = OpenAIChatBackend(base_url=base_url, model="mock", api_key="mock")
+    turn = ChatTurn(text, "happy", objects=["person", "laptop"])
+    report = {}
+
+    # 1) 요청마다 새 연결 + 전체 응답 대기 (첫 토큰 = 전체 응답)
+    latencies = []
+    for _ in range(n_requests):
+        t0 = time.perf_counter()
+        requests.post(backend.url, json={"model": "mock", "messages": build_messages(turn)}, timeout=30).raise_for_status()
+        latencies.append(time.perf_counter() - t0)
+    report["new_connection_blocking"] = {"first_token": _percentiles(latencies), "total": _percentiles(latencies)}
+
+    # 2) 연결 풀 세션 + 스트리밍
+    first_tokens, totals, tokens = [], [], 0
+    for _ in range(n_requests):
+        t0 = time.perf_counter()
+        first = None
+        for _piece in backend.stream(turn):
+            tokens += 1
+            if first is None:
+                first = time.perf_counter() - t0
+        totals.append(time.perf_counter() - t0)
+        first_tokens.append(first)
+    report["pooled_streaming"] = {"first_token": _percentiles(first_tokens), "total": _percentiles(totals),
+                                  "tokens_per_second": tokens / sum(totals)}
+
+    # 3) 취소: 첫 토큰을 받은 뒤 스트림을 닫으면 바로 반환되어야 함
+    cancel = threading.Event()
+    t0 = time.perf_counter()
+    for _piece in backend.stream(turn, cancel=cancel):
+        cancel.set()
+    report["cancelled_after_first_token_ms"] = (time.perf_counter() - t0) * 1000.0
+
+    backend.close()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Face2Chat 오프라인 LLM mock 서버 / 벤치마크")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--ttft-ms", type=float, default=0.0, help="첫 토큰까지의 인위적인 지연 (ms)")
+    parser.add_argument("--token-ms", type=float, default=0.0, help="토큰 사이의 인위적인 지연 (ms)")
+    parser.add_argument("--bench", action="store_true", help="서버를 띄우고 백엔드 벤치마크를 실행한 뒤 종료")
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.bench:
+        server, url = start_server(args.host, 0, args.ttft_ms, args.token_ms)
+        print(json.dumps(benchmark(url, args.requests), indent=2, ensure_ascii=False))
+        server.shutdown()
+    else:
+        server, url = start_server(args.host, args.port, args.ttft_ms, args.token_ms)
+        print(f"[mock LLM] {url} 에서 대기 중 (FACE2CHAT_LLM_URL로 지정하세요). Ctrl+C로 종료")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
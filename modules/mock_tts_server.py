@@ -0,0 +1,142 @@
+# modules/mock_tts_server.py
+# 오프라인 벤치마크용 로컬 TTS 서버
+# Google Translate TTS의 batchexecute(jQ1olc) 응답 형식을 흉내 내어, GoogleTranslateHTTPBackend를
+# 네트워크 없이 그대로 테스트할 수 있습니다. 오디오는 텍스트 길이에 비례하는 사인파 WAV입니다.
+#
+# 서버만 실행:   python -m modules.mock_tts_server --port 8765 --delay-ms 40
+# 벤치마크 실행: python -m modules.mock_tts_server --bench --requests 200 --delay-ms 40
+
+import argparse
+import base64
+import io
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import soundfile as sf
+
+
+def make_tone(text, sample_rate=24000, seconds_per_char=0.06):
+    """텍스트 길이에 비례하는 길이의 사인파 WAV 바이트를 만듭니다."""
+    n = max(1, int(sample_rate * seconds_per_char * max(1, len(text))))
+    t = np.arange(n, dtype=np.float32) / sample_rate
+    tone = 0.2 * np.sin(2 * np.pi * 220.0 * t)
+    buffer = io.BytesIO()
+    sf.write(buffer, tone, sample_rate, format="WAV", subtype="PCM_16")
+    return buffer.getvalue()
+
+
+class MockTTSHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive 지원 (Content-Length 필수)
+    # 헤더와 본문을 따로 쓰므로, 재사용 연결에서 Nagle + 지연 ACK로 응답마다 ~40ms씩 멈추지 않도록 TCP_NODELAY 설정
+    disable_nagle_algorithm = True
+    delay = 0.0
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+        try:
+            form = urllib.parse.parse_qs(body)
+            rpc = json.loads(form["f.req"][0])
+            text, lang = json.loads(rpc[0][0][1])[:2]
+        except Exception:
+            self._reply(400, b"bad request")
+            return
+
+        if self.delay:
+            time.sleep(self.delay) # 원격 서버 처리 시간 흉내
+
+        audio_b64 = base64.b64encode(make_tone(text)).decode("ascii")
+        payload = json.dumps([["wrb.fr", "jQ1olc", json.dumps([audio_b64]), None, None, None, "generic"]], separators=(",", ":"))
+        self._reply(200, f")]}}'\n\n{len(payload)}\n{payload}\n".encode("utf-8"))
+
+    def _reply(self, status, data):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass # 요청마다 콘솔 출력하지 않음
+
+
+def start_server(host="127.0.0.1", port=0, delay_ms=0.0):
+    """백그라운드 스레드에서 서버를 시작하고 (server, base_url)을 반환합니다. port=0이면 빈 포트를 사용."""
+    handler = type("ConfiguredMockTTSHandler", (MockTTSHandler,), {"delay": delay_ms / 1000.0})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="mock-tts-server").start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def _percentiles(samples):
+    arr = np.array(samples) * 1000.0
+    return {"p50_ms": float(np.percentile(arr, 50)), "p95_ms": float(np.percentile(arr, 95)), "mean_ms": float(arr.mean())}
+
+
+def benchmark(base_url, n_requests=100, text="오늘 기분은 어떠세요?", concurrency=4):
+    """
+    새 연결을 매번 여는 방식과 연결 풀 세션을 재사용하는 방식의 지연 시간과 처리량을 비교합니다.
+    text는 한 문장이어야 모든 항목이 HTTP 요청 하나씩이 되어 rps를 서로 비교할 수 있습니다.
+    (synthesize_async는 여러 문장을 조각별 요청으로 나눔)
+    """
+    import requests
+    from .tts_backends import GoogleTranslateHTTPBackend
+
+    backend = GoogleTranslateHTTPBackend(base_url=base_url, concurrency=concurrency, pool_size=concurrency)
+    data = backend._package_rpc(text, "ko")
+    report = {}
+
+    # 1) 요청마다 새 연결 (기존 gTTS와 같은 방식)
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(n_requests):
+        t0 = time.perf_counter()
+        requests.post(backend.url, data=data, headers=dict(backend.session.headers), timeout=10).raise_for_status()
+        latencies.append(time.perf_counter() - t0)
+    report["new_connection"] = dict(_percentiles(latencies), rps=n_requests / (time.perf_counter() - start))
+
+    # 2) 연결 풀 세션 재사용 (순차)
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(n_requests):
+        t0 = time.perf_counter()
+        backend._request_part(text, "ko")
+        latencies.append(time.perf_counter() - t0)
+    report["pooled"] = dict(_percentiles(latencies), rps=n_requests / (time.perf_counter() - start))
+
+    # 3) 연결 풀 세션 + 동시 요청 (문장 조각 동시 합성과 같은 방식, 디코딩 포함)
+    start = time.perf_counter()
+    futures = [backend.synthesize_async(text, "ko") for _ in range(n_requests)]
+    for future in futures:
+        future.result()
+    report[f"pooled_concurrent_{concurrency}"] = {"rps": n_requests / (time.perf_counter() - start)}
+
+    backend.close()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Face2Chat 오프라인 TTS mock 서버 / 벤치마크")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay-ms", type=float, default=0.0, help="요청당 인위적인 서버 지연 (ms)")
+    parser.add_argument("--bench", action="store_true", help="서버를 띄우고 백엔드 벤치마크를 실행한 뒤 종료")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    if args.bench:
+        server, url = start_server(args.host, 0, args.delay_ms)
+        print(json.dumps(benchmark(url, args.requests, concurrency=args.concurrency), indent=2, ensure_ascii=False))
+        server.shutdown()
+    else:
+        server, url = start_server(args.host, args.port, args.delay_ms)
+        print(f"[mock TTS] {url} 에서 대기 중 (base_url로 지정하세요). Ctrl+C로 종료")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
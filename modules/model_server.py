@@ -0,0 +1,873 @@
+# modules/model_server.py
+# 호스트당 하나만 띄우는 모델 서버
+# 웹 워커 프로세스마다 EmotionDetector / VisionAnalyzer / Vosk Model을 따로 로드하면 같은 가중치가 워커 수만큼 메모리에 올라가므로,
+# 모델은 이 서버 프로세스 하나가 갖고 워커는 추론 요청만 보냅니다.
+# - 전송: 워커가 만든 공유 메모리 링(SharedRing)의 슬롯에 프레임 / 얼굴 crop / PCM을 한 번 복사하고,
+#   서버는 같은 메모리를 numpy 뷰로 바로 읽음 (pickle / 소켓 복사 없음). 요청 / 응답 메시지에는 슬롯 위치만 담김
+# - 프로토콜: multiprocessing.connection(authkey 인증) 위의 {"id", "op", "args", "slot", "layout"} 사전 메시지.
+#   한 연결에서 여러 요청이 동시에 진행될 수 있고, 응답은 id로 짝을 맞춤
+# - 여러 워커에서 온 YOLO / 감정 분류 요청은 서버의 BatchScheduler가 다시 모아 배치로 추론
+# - 모델별 동시 처리 상한(limits): 상한을 넘은 요청은 queue_timeout까지 기다린 뒤 "busy" 오류로 거절 (워커 쪽은 기존 대체 결과 사용)
+# - health: 모델별 처리 중 / 거절 수, 스케줄러 상태, 연결 / 스트림 수
+#
+# - 보안: 메시지는 pickle이므로 인증 키가 곧 서버 프로세스의 실행 권한. 기본 소켓은 사용자 전용(0700) 디렉토리 안의 0600 소켓이고,
+#   FACE2CHAT_MODEL_SERVER_KEY가 없으면 서버가 임의의 키를 만들어 소켓 옆 0600 파일(<소켓>.key)에 저장 (같은 사용자의 워커가 읽음).
+#   루프백이 아닌 TCP 주소는 키를 명시적으로 지정해야만 사용할 수 있음
+#
+# 서버 실행:   python -m modules.model_server --backend onnx --int8        (기본 소켓: <임시 디렉토리>/face2chat-<uid>/models.sock)
+# 헬스 체크:   python -m modules.model_server --health   (실패 시 종료 코드 1)
+# 전송 벤치마크: python -m modules.model_server --bench --models stub
+# 웹 워커:     FACE2CHAT_MODEL_SERVER=<소켓 경로> python app.py
+
+import argparse
+import atexit
+import ipaddress
+import itertools
+import json
+import os
+import queue
+import secrets
+import signal
+import stat
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from multiprocessing import AuthenticationError, resource_tracker, shared_memory
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+from .batch_scheduler import BatchScheduler
+from .emotion_detector import EmotionDetector
+from .metrics import REGISTRY, count_error, log
+from .speech_to_text import SpeechToText
+from .vision_analyzer import VisionAnalyzer
+
+KEY_ENV = "FACE2CHAT_MODEL_SERVER_KEY"
+# 모델별 동시 처리 상한 (yolo / emotion은 서버 스케줄러에서 배치를 기다리는 요청 포함, deepface는 전체 프레임 분석)
+DEFAULT_LIMITS = {"yolo": 16, "emotion": 16, "deepface": 2, "stt": os.cpu_count() or 4}
+RPC_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class ModelServerError(RuntimeError):
+    pass
+
+
+class ModelServerBusy(ModelServerError):
+    """모델별 동시 처리 상한에 걸려 거절된 요청"""
+
+
+def parse_address(address):
+    """'host:port'면 TCP, 그 밖에는 유닉스 소켓 경로로 해석합니다."""
+    if isinstance(address, tuple):
+        return address
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and "/" not in address:
+        return host or "127.0.0.1", int(port)
+    return address
+
+
+def _check_private(path, is_dir=False):
+    """다른 사용자가 만들었거나 그룹 / 다른 사용자가 접근할 수 있는 경로면 PermissionError"""
+    if not hasattr(os, "getuid"):
+        return # 유닉스 권한이 없는 플랫폼
+    st = os.lstat(path)
+    kind_ok = stat.S_ISDIR(st.st_mode) if is_dir else stat.S_ISREG(st.st_mode)
+    if not kind_ok or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError(f"{path}: 현재 사용자만 접근할 수 있는 {'디렉토리' if is_dir else '파일'}이어야 합니다. (0700 / 0600)")
+
+
+def runtime_dir():
+    """소켓과 키 파일을 두는 사용자 전용(0700) 디렉토리"""
+    path = os.path.join(tempfile.gettempdir(), f"face2chat-{os.getuid() if hasattr(os, 'getuid') else 'user'}")
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    _check_private(path, is_dir=True) # 다른 사용자가 미리 만들어 둔 디렉토리는 사용하지 않음
+    return path
+
+
+def default_address():
+    return os.path.join(runtime_dir(), "models.sock")
+
+
+def _is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def key_path(address):
+    """서버가 만든 인증 키를 저장하는 파일 (유닉스 소켓은 소켓 옆, TCP는 사용자 전용 디렉토리)"""
+    address = parse_address(address)
+    if isinstance(address, str):
+        return address + ".key"
+    host, port = address
+    return os.path.join(runtime_dir(), f"models-{host}-{port}.key")
+
+
+def resolve_authkey(address, authkey=None, create=False):
+    """
+    인증 키를 정합니다. 우선순위: 인자 > FACE2CHAT_MODEL_SERVER_KEY > 서버가 만든 키 파일
+    create=True(서버)이면 키 파일이 없을 때 임의의 키를 만들어 0600으로 저장합니다.
+    키 파일이 아직 없으면(서버가 시작 전) FileNotFoundError
+    """
+    address = parse_address(address)
+    authkey = authkey if authkey is not None else os.environ.get(KEY_ENV)
+    if authkey:
+        return authkey.encode("utf-8") if isinstance(authkey, str) else authkey
+    if isinstance(address, tuple) and not _is_loopback(address[0]):
+        # 다른 호스트에서 키 파일을 읽을 수 없고, 추측 가능한 키로 외부에 열면 원격 코드 실행이 가능해짐
+        raise ValueError(f"루프백이 아닌 주소({address[0]})에는 {KEY_ENV}로 인증 키를 지정해야 합니다.")
+    path = key_path(address)
+    if create and not os.path.exists(path):
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass # 다른 프로세스가 방금 만듦
+        else:
+            with os.fdopen(fd, "w") as fp:
+                fp.write(secrets.token_hex(32))
+    _check_private(path)
+    with open(path, encoding="ascii") as fp:
+        return fp.read().strip().encode("ascii")
+
+
+# ---------------------------------------------------------------------------
+# 공유 메모리 링
+# ---------------------------------------------------------------------------
+
+class SharedRing:
+    """
+    워커가 만들고 소유하는 공유 메모리. 고정 크기 슬롯 여러 개로 나누어 요청마다 슬롯 하나를 빌려 씁니다.
+    슬롯은 서버의 응답이 도착한 뒤(서버가 다 읽은 뒤)에 반납되므로, 서버가 읽는 도중에 덮어쓰지 않습니다.
+    모든 슬롯이 사용 중이면 acquire가 기다리므로 링 크기가 워커당 처리 중인 요청 수의 상한이 됩니다.
+    """
+    ALIGN = 64
+
+    def __init__(self, slots=4, slot_bytes=8 * 1024 * 1024):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+        self.name = self.shm.name
+        self._free = queue.Queue()
+        for slot in range(slots):
+            self._free.put(slot)
+
+    def acquire(self, timeout=None):
+        try:
+            return self._free.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError("공유 메모리 링의 빈 슬롯을 기다리다 시간이 초과되었습니다.") from None
+
+    def release(self, slot):
+        self._free.put(slot)
+
+    def in_use(self):
+        return self.slots - self._free.qsize()
+
+    def write(self, slot, arrays):
+        """
+        배열들을 슬롯에 이어서 복사하고 [(오프셋, shape, dtype), ...]를 반환합니다.
+        슬롯에 다 들어가지 않으면 None (호출자가 파이프로 직접 보냄)
+        연속이 아닌 뷰(BGR 뒤집기, crop 등)도 여기서 한 번만 복사됩니다.
+        """
+        layout = []
+        offset = 0
+        base = slot * self.slot_bytes
+        for array in arrays:
+            array = np.asarray(array)
+            if offset + array.nbytes > self.slot_bytes:
+                return None
+            target = np.ndarray(array.shape, dtype=array.dtype, buffer=self.shm.buf, offset=base + offset)
+            np.copyto(target, array)
+            layout.append((offset, array.shape, array.dtype.str))
+            offset += -(-array.nbytes // self.ALIGN) * self.ALIGN
+        return layout
+
+    def close(self):
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _attach_shared_memory(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False) # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        # 3.12 이하는 붙기만 한 프로세스도 resource_tracker에 등록하여, 서버가 종료될 때 워커의 메모리를 unlink해 버림
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+# ---------------------------------------------------------------------------
+# 서버
+# ---------------------------------------------------------------------------
+
+class ModelLimit:
+    """모델 하나의 동시 처리 상한과 처리 / 거절 횟수"""
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self.in_flight = 0
+        self.requests = 0
+        self.rejected = 0
+        self._semaphore = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout):
+        if not self._semaphore.acquire(timeout=timeout):
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.in_flight += 1
+            self.requests += 1
+        return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._semaphore.release()
+
+    def stats(self):
+        return {"limit": self.limit, "in_flight": self.in_flight, "requests": self.requests, "rejected": self.rejected}
+
+
+class _Connection:
+    """서버 쪽 연결 하나의 상태: 워커의 공유 메모리, 열린 인식기 스트림, 응답 전송 잠금"""
+    def __init__(self, conn):
+        self.conn = conn
+        self.shm = None
+        self.slot_bytes = 0
+        self.streams = {} # 스트림 id -> 인식기
+        self.send_lock = threading.Lock()
+
+    def attach(self, ring, slot_bytes):
+        if self.shm is not None:
+            self.shm.close()
+        self.shm = _attach_shared_memory(ring)
+        self.slot_bytes = slot_bytes
+
+    def arrays(self, msg):
+        """요청에 담긴 입력 배열 목록. 공유 메모리로 온 입력은 복사하지 않은 뷰"""
+        if "inline" in msg:
+            return msg["inline"]
+        if msg.get("slot") is None:
+            return []
+        if self.shm is None:
+            raise ModelServerError("공유 메모리가 연결되지 않았습니다. (attach 필요)")
+        base = msg["slot"] * self.slot_bytes
+        return [np.ndarray(tuple(shape), dtype=np.dtype(dtype), buffer=self.shm.buf, offset=base + offset)
+                for offset, shape, dtype in msg["layout"]]
+
+    def send(self, reply):
+        with self.send_lock:
+            try:
+                self.conn.send(reply)
+            except (OSError, EOFError):
+                pass # 워커가 먼저 연결을 끊음
+
+    def close(self):
+        self.streams.clear()
+        self.conn.close()
+        if self.shm is not None:
+            try:
+                self.shm.close()
+            except BufferError:
+                pass # 아직 처리 중인 요청이 뷰를 잡고 있으면 GC가 정리
+
+
+class ModelServer:
+    def __init__(self, detector, stt, vision_analyzer, address=None, authkey=None, limits=None,
+                 queue_timeout=2.0, max_workers=64):
+        """
+        detector / stt / vision_analyzer: 이 프로세스에서 한 번만 로드한 모델
+        limits: {"yolo", "emotion", "deepface", "stt"} -> 모델별 동시 처리 상한 (DEFAULT_LIMITS를 덮어씀)
+        queue_timeout: 상한에 걸린 요청이 자리를 기다리는 최대 시간 (넘으면 busy로 거절)
+        """
+        self.detector = detector
+        self.stt = stt
+        self.vision_analyzer = vision_analyzer
+        self.address = parse_address(address or default_address())
+        self.authkey = resolve_authkey(self.address, authkey, create=True)
+        self.queue_timeout = queue_timeout
+        self.limits = {name: ModelLimit(name, limit) for name, limit in {**DEFAULT_LIMITS, **(limits or {})}.items()}
+        # 여러 워커에서 동시에 온 요청을 다시 모아 배치로 추론 (워커 쪽 스케줄러가 모은 배치끼리도 합쳐짐)
+        self.yolo_scheduler = BatchScheduler(vision_analyzer.detect_objects_batch, max_batch_size=16, max_wait_ms=5, name="server-yolo")
+        self.emotion_scheduler = BatchScheduler(detector.classify_faces, max_batch_size=64, max_wait_ms=5, name="server-emotion")
+        self.ops = {
+            "attach": (None, self._op_attach),
+            "health": (None, lambda connection, arrays: self.health()),
+            "nop": (None, lambda connection, arrays: [a.shape for a in arrays]), # 전송 비용 측정용
+            "detect_objects_batch": ("yolo", self._op_detect_objects_batch),
+            "classify_faces": ("emotion", self._op_classify_faces),
+            "detect": ("deepface", self._op_detect),
+            "stt_open": (None, self._op_stt_open),
+            "stt_accept": ("stt", self._op_stt_accept),
+            "stt_final": ("stt", self._op_stt_final),
+            "stt_reset": (None, self._op_stt_reset),
+            "stt_close": (None, self._op_stt_close),
+        }
+        self.started_at = time.monotonic()
+        self._connections = set()
+        self._stream_ids = itertools.count(1)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="model-server")
+        self._listener = None
+        self._stopped = threading.Event()
+
+    def serve_forever(self):
+        if isinstance(self.address, str):
+            if os.path.exists(self.address) and stat.S_ISSOCK(os.lstat(self.address).st_mode):
+                os.remove(self.address) # 이전 실행이 남긴 소켓 파일
+            previous_umask = os.umask(0o177) # 소켓 파일을 소유자만 연결할 수 있게(0600) 생성
+            try:
+                self._listener = listener = Listener(self.address, authkey=self.authkey)
+            finally:
+                os.umask(previous_umask)
+        else:
+            self._listener = listener = Listener(self.address, authkey=self.authkey)
+        print(f"[모델 서버] {self.address} 에서 대기 중 (pid {os.getpid()})")
+        try:
+            while not self._stopped.is_set():
+                try:
+                    conn = listener.accept()
+                except (OSError, EOFError, AuthenticationError):
+                    if self._stopped.is_set():
+                        break
+                    continue # 인증 실패 등 연결 하나의 오류
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True, name="model-server-conn").start()
+        finally:
+            self.close()
+
+    def _serve_connection(self, conn):
+        connection = _Connection(conn)
+        self._connections.add(connection)
+        try:
+            while True:
+                msg = conn.recv()
+                # 느린 요청(전체 프레임 분석 등)이 같은 연결의 다른 요청을 막지 않도록 스레드 풀에서 처리
+                self._executor.submit(self._handle, connection, msg)
+        except (EOFError, OSError):
+            pass # 워커 종료
+        finally:
+            self._connections.discard(connection)
+            connection.close()
+
+    def _handle(self, connection, msg):
+        reply = {"id": msg.get("id")}
+        arrays = None
+        try:
+            model, handler = self.ops[msg["op"]]
+            arrays = connection.arrays(msg)
+            limit = self.limits.get(model)
+            if limit is not None and not limit.acquire(self.queue_timeout):
+                reply.update(ok=False, busy=True, error=f"{model} 모델의 동시 처리 상한({limit.limit})을 넘었습니다.")
+            else:
+                try:
+                    reply.update(ok=True, result=handler(connection, arrays, **msg.get("args", {})))
+                finally:
+                    if limit is not None:
+                        limit.release()
+        except Exception as e:
+            count_error(f"model_server_{msg.get('op')}")
+            reply.update(ok=False, error=f"{type(e).__name__}: {e}")
+        finally:
+            del arrays # 공유 메모리 뷰를 놓은 뒤 응답 (응답을 받으면 워커가 슬롯을 다시 씀)
+        connection.send(reply)
+
+    def _op_attach(self, connection, arrays, ring, slot_bytes):
+        connection.attach(ring, slot_bytes)
+        return {"pid": os.getpid(), "limits": {name: limit.limit for name, limit in self.limits.items()}}
+
+    def _op_detect_objects_batch(self, connection, arrays):
+        futures = [self.yolo_scheduler.submit(img) for img in arrays]
+        return [future.result() for future in futures]
+
+    def _op_classify_faces(self, connection, arrays):
+        futures = [self.emotion_scheduler.submit(crop) for crop in arrays]
+        return [future.result() for future in futures]
+
+    def _op_detect(self, connection, arrays):
+        return self.detector.detect(arrays[0])
+
+    def _op_stt_open(self, connection, arrays, sample_rate=16000):
+        stream = next(self._stream_ids)
+        connection.streams[stream] = self.stt.new_recognizer(sample_rate)
+        return stream
+
+    def _recognizer(self, connection, stream):
+        try:
+            return connection.streams[stream]
+        except KeyError:
+            raise ModelServerError(f"알 수 없는 인식기 스트림: {stream}") from None
+
+    def _op_stt_accept(self, connection, arrays, stream):
+        recognizer = self._recognizer(connection, stream)
+        # Vosk는 bytes만 받으므로 PCM은 여기서 한 번 복사됨
+        if recognizer.AcceptWaveform(arrays[0].tobytes()):
+            return True, recognizer.Result()
+        return False, recognizer.PartialResult()
+
+    def _op_stt_final(self, connection, arrays, stream):
+        return self._recognizer(connection, stream).FinalResult()
+
+    def _op_stt_reset(self, connection, arrays, stream):
+        self._recognizer(connection, stream).Reset()
+
+    def _op_stt_close(self, connection, arrays, stream):
+        connection.streams.pop(stream, None)
+
+    def health(self):
+        connections = list(self._connections)
+        return {
+            "status": "ok",
+            "pid": os.getpid(),
+            "uptime_s": time.monotonic() - self.started_at,
+            "clients": len(connections),
+            "streams": sum(len(c.streams) for c in connections),
+            "models": {name: limit.stats() for name, limit in self.limits.items()},
+            "schedulers": {s.name: s.stats() for s in (self.yolo_scheduler, self.emotion_scheduler)},
+        }
+
+    def stop(self):
+        """다른 스레드에서 serve_forever를 멈춥니다."""
+        self._stopped.set()
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.close() # 유닉스 소켓 파일도 함께 삭제됨
+
+    def close(self):
+        self.stop()
+        for connection in list(self._connections):
+            connection.close()
+        self.yolo_scheduler.close()
+        self.emotion_scheduler.close()
+        self._executor.shutdown(wait=False)
+
+
+# ---------------------------------------------------------------------------
+# 클라이언트 (웹 워커)
+# ---------------------------------------------------------------------------
+
+class ModelClient:
+    """
+    워커 프로세스에서 모델 서버로 요청을 보내는 클라이언트. 스레드 여러 개가 동시에 써도 됩니다.
+    응답은 읽기 스레드가 id로 찾아 Future에 넣고, 연결이 끊기면 다음 요청에서 다시 연결합니다.
+    """
+    def __init__(self, address=None, authkey=None, ring_slots=4, slot_bytes=8 * 1024 * 1024,
+                 timeout=10.0, connect_timeout=60.0):
+        """
+        ring_slots / slot_bytes: 이 워커의 공유 메모리 링 크기 (슬롯 하나에 한 요청의 입력 전체가 들어가야 함)
+        timeout: 요청 하나의 응답을 기다리는 최대 시간
+        connect_timeout: 서버가 아직 모델을 로드 중이면 연결될 때까지 기다리는 최대 시간
+        """
+        self.address = parse_address(address or default_address())
+        self._authkey = authkey # None이면 연결할 때마다 환경 변수 / 서버의 키 파일에서 읽음
+        self.timeout = timeout
+        self.ring = SharedRing(ring_slots, slot_bytes)
+        self.epoch = 0 # 다시 연결할 때마다 증가 (서버 쪽 인식기 스트림은 연결과 함께 사라짐)
+        self.server_info = {}
+        self._conn = None
+        self._pending = {} # 요청 id -> (Future, 슬롯)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._connect_lock = threading.Lock()
+        self._closed = False
+        self._connect(connect_timeout)
+
+    @property
+    def connected(self):
+        return self._conn is not None
+
+    def _connect(self, wait):
+        deadline = time.monotonic() + wait
+        while True:
+            try:
+                conn = Client(self.address, authkey=resolve_authkey(self.address, self._authkey))
+                break
+            except (ConnectionRefusedError, FileNotFoundError): # 서버가 아직 소켓 / 키 파일을 만들기 전
+                if time.monotonic() >= deadline:
+                    raise ConnectionError(f"모델 서버({self.address})에 연결할 수 없습니다.") from None
+                time.sleep(0.2)
+        with self._lock:
+            self._conn = conn
+            self.epoch += 1
+        threading.Thread(target=self._read_loop, args=(conn,), daemon=True, name="model-client-reader").start()
+        self.server_info = self.call("attach", ring=self.ring.name, slot_bytes=self.ring.slot_bytes)
+        log(f"[모델 클라이언트] {self.address} 연결됨 (서버 pid {self.server_info.get('pid')})")
+
+    def _ensure_connected(self):
+        if self._conn is not None:
+            return
+        if self._closed:
+            raise ConnectionError("모델 클라이언트가 이미 종료되었습니다.")
+        with self._connect_lock:
+            if self._conn is None:
+                REGISTRY.inc("face2chat_model_server_reconnects_total", help_text="모델 서버에 다시 연결한 횟수")
+                self._connect(wait=0)
+
+    def _read_loop(self, conn):
+        try:
+            while True:
+                reply = conn.recv()
+                with self._lock:
+                    future, slot = self._pending.pop(reply["id"], (None, None))
+                if slot is not None:
+                    self.ring.release(slot)
+                if future is not None:
+                    future.set_result(reply)
+        except (EOFError, OSError):
+            pass
+        with self._lock:
+            if self._conn is conn:
+                self._conn = None
+            pending, self._pending = self._pending, {}
+        for future, slot in pending.values():
+            if slot is not None:
+                self.ring.release(slot)
+            future.set_exception(ConnectionError("모델 서버 연결이 끊겼습니다."))
+        if not self._closed:
+            print(f"[모델 클라이언트] 서버 연결이 끊겼습니다: {self.address}")
+
+    def submit(self, op, arrays=(), **args):
+        """요청을 보내고 응답 메시지를 받을 Future를 반환합니다."""
+        self._ensure_connected()
+        msg = {"op": op, "args": args}
+        slot = None
+        if len(arrays):
+            slot = self.ring.acquire(self.timeout)
+            layout = self.ring.write(slot, arrays)
+            if layout is None:
+                # 슬롯보다 큰 입력은 파이프로 직접 보냄 (pickle 복사 비용이 있으므로 횟수를 지표로 남김)
+                self.ring.release(slot)
+                slot = None
+                msg["inline"] = [np.ascontiguousarray(a) for a in arrays]
+                REGISTRY.inc("face2chat_model_server_inline_transfers_total", help_text="공유 메모리 슬롯보다 커서 파이프로 보낸 요청 수")
+            else:
+                msg.update(slot=slot, layout=layout)
+        future = Future()
+        with self._lock:
+            conn = self._conn
+            msg["id"] = next(self._ids)
+            self._pending[msg["id"]] = (future, slot)
+            try:
+                if conn is None:
+                    raise OSError("연결 없음")
+                conn.send(msg)
+            except OSError as e:
+                self._pending.pop(msg["id"], None)
+                if slot is not None:
+                    self.ring.release(slot)
+                raise ConnectionError(f"모델 서버로 요청을 보내지 못했습니다: {e}") from None
+        return future
+
+    def call(self, op, arrays=(), timeout=None, **args):
+        """요청을 보내고 결과를 기다립니다. 서버가 거절하면 ModelServerBusy, 처리 중 오류는 ModelServerError"""
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            try:
+                reply = self.submit(op, arrays, **args).result(timeout or self.timeout)
+            except FutureTimeoutError:
+                # 응답이 늦게 오더라도 읽기 스레드가 슬롯을 반납함
+                raise TimeoutError(f"모델 서버 응답 시간 초과 ({op})") from None
+            if not reply["ok"]:
+                if reply.get("busy"):
+                    raise ModelServerBusy(reply["error"])
+                raise ModelServerError(reply["error"])
+            return reply["result"]
+        except ModelServerBusy:
+            outcome = "busy"
+            raise
+        except TimeoutError:
+            outcome = "timeout"
+            raise
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            REGISTRY.histogram("face2chat_model_server_rpc_seconds", "모델 서버 요청 왕복 시간",
+                               buckets=RPC_BUCKETS, op=op).observe(time.perf_counter() - start)
+            REGISTRY.inc("face2chat_model_server_requests_total", help_text="모델 서버 요청 수 (결과별)", op=op, outcome=outcome)
+
+    def health(self, timeout=2.0):
+        return self.call("health", timeout=timeout)
+
+    def close(self):
+        self._closed = True
+        with self._lock:
+            conn, self._conn = self._conn, None
+        if conn is not None:
+            conn.close()
+        self.ring.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def connect(address=None, **kwargs):
+    """프로세스마다 서버 주소당 클라이언트(공유 메모리 링) 하나를 만들어 재사용합니다."""
+    address = address or default_address()
+    with _clients_lock:
+        client = _clients.get(address)
+        if client is None:
+            client = _clients[address] = ModelClient(address, **kwargs)
+            atexit.register(client.close) # 종료 시 공유 메모리를 바로 해제
+        return client
+
+
+def check_health(address=None, authkey=None, timeout=2.0):
+    """공유 메모리 없이 연결만 열어 서버 상태를 묻습니다. (외부 헬스 체크용, 실패 시 예외)"""
+    address = parse_address(address or default_address())
+    conn = Client(address, authkey=resolve_authkey(address, authkey))
+    try:
+        conn.send({"id": 0, "op": "health"})
+        if not conn.poll(timeout):
+            raise TimeoutError(f"모델 서버가 {timeout}초 안에 응답하지 않았습니다.")
+        reply = conn.recv()
+    finally:
+        conn.close()
+    if not reply["ok"]:
+        raise ModelServerError(reply["error"])
+    return reply["result"]
+
+
+# ---------------------------------------------------------------------------
+# 모델 프록시 (워커에서 기존 클래스 대신 사용)
+# ---------------------------------------------------------------------------
+
+class RemoteVisionAnalyzer(VisionAnalyzer):
+    """이미지 로드 / 장면 설명은 워커에서, YOLO 추론만 모델 서버에서 실행하는 VisionAnalyzer"""
+    def __init__(self, client):
+        self.client = client
+        self.model = client # PerceptionStage는 model이 None인지로 YOLO 사용 여부를 판단
+        self.backend = "remote"
+
+    def warmup(self):
+        self.client.health()
+
+    def detect_objects_batch(self, imgs):
+        return self.client.call("detect_objects_batch", arrays=list(imgs))
+
+
+class RemoteEmotionDetector(EmotionDetector):
+    """입력 변환은 워커에서, DeepFace 분석 / 감정 분류만 모델 서버에서 실행하는 EmotionDetector"""
+    def __init__(self, client):
+        self.client = client
+        self.backend = "remote"
+        self._emotion_classifier = None
+
+    def warmup(self):
+        self.client.health()
+
+    def _analyze(self, img):
+        return self.client.call("detect", arrays=[img])
+
+    def classify_faces(self, crops):
+        emotions = ["알 수 없음"] * len(crops)
+        valid = [i for i, crop in enumerate(crops) if crop is not None and crop.size > 0]
+        if valid:
+            for i, emotion in zip(valid, self.client.call("classify_faces", arrays=[crops[i] for i in valid])):
+                emotions[i] = emotion
+        return emotions
+
+
+class RemoteRecognizer:
+    """
+    KaldiRecognizer와 같은 메서드를 가진 원격 인식기. SpeechStream에 그대로 넣어 사용합니다.
+    AcceptWaveform 응답에 Result / PartialResult를 함께 받아 두므로 청크당 왕복은 한 번입니다.
+    """
+    def __init__(self, client, sample_rate=16000):
+        self.client = client
+        self.sample_rate = sample_rate
+        self._stream = None
+        self._epoch = None
+        self._result = json.dumps({"text": ""})
+        self._partial = json.dumps({"partial": ""})
+        self._open()
+
+    def _open(self):
+        self._stream = self.client.call("stt_open", sample_rate=self.sample_rate)
+        self._epoch = self.client.epoch
+
+    def _call(self, op, arrays=()):
+        self.client._ensure_connected()
+        if self._epoch != self.client.epoch:
+            # 서버가 다시 시작되어 인식기 상태가 사라짐: 진행 중이던 발화는 버리고 새 스트림을 엶
+            log("[모델 클라이언트] 서버 재연결로 인식기 스트림을 다시 엽니다.")
+            self._open()
+        return self.client.call(op, arrays=arrays, stream=self._stream)
+
+    def AcceptWaveform(self, pcm):
+        final, result = self._call("stt_accept", arrays=[np.frombuffer(pcm, dtype=np.uint8)])
+        if final:
+            self._result = result
+        else:
+            self._partial = result
+        return final
+
+    def Result(self):
+        return self._result
+
+    def PartialResult(self):
+        return self._partial
+
+    def FinalResult(self):
+        return self._call("stt_final")
+
+    def Reset(self):
+        self._call("stt_reset")
+
+    def close(self):
+        """서버 쪽 인식기를 해제합니다. 세션이 제거될 때 SpeechStream.close()가 호출함"""
+        stream, self._stream = self._stream, None
+        if stream is not None and self._epoch == self.client.epoch and self.client.connected:
+            try:
+                self.client.submit("stt_close", stream=stream) # 응답은 기다리지 않음
+            except Exception:
+                pass
+
+    def __del__(self):
+        try:
+            self.close() # close()를 거치지 않고 버려진 경우의 안전망
+        except Exception:
+            pass
+
+
+class RemoteSpeechToText(SpeechToText):
+    """인식기를 모델 서버에 두는 SpeechToText (Vosk 모델을 워커에서 로드하지 않음)"""
+    def __init__(self, client, resample_quality="medium"):
+        self.client = client
+        self.model = None
+        self.resample_quality = resample_quality
+
+    def new_recognizer(self, sample_rate=16000):
+        return RemoteRecognizer(self.client, sample_rate)
+
+
+# ---------------------------------------------------------------------------
+# 실행 / 벤치마크
+# ---------------------------------------------------------------------------
+
+def _parse_limits(text):
+    """'yolo=8,deepface=1' 형식의 모델별 상한"""
+    limits = {}
+    for part in filter(None, (text or "").split(",")):
+        name, _, value = part.partition("=")
+        if name.strip() not in DEFAULT_LIMITS:
+            raise argparse.ArgumentTypeError(f"알 수 없는 모델 이름: {name} (사용 가능: {', '.join(DEFAULT_LIMITS)})")
+        limits[name.strip()] = int(value)
+    return limits
+
+
+def run_server(address=None, models="real", backend="torch", int8=False, threads=None, limits=None,
+               queue_timeout=2.0, warmup=True):
+    """모델을 로드 / 워밍업한 뒤 서버를 실행합니다. (워커는 모델이 준비된 뒤에야 연결됨)"""
+    from .batch_runner import build_models
+    from .startup import Startup
+
+    startup = Startup()
+    startup.add("models", lambda: build_models(models, backend, int8, threads))
+    startup.start()
+    detector, stt, vision_analyzer = startup.get("models")
+    if warmup:
+        startup.warmup({"emotion_detector": detector.warmup, "stt": stt.warmup, "vision_analyzer": vision_analyzer.warmup})
+    startup.report()
+    server = ModelServer(detector, stt, vision_analyzer, address, limits=limits, queue_timeout=queue_timeout)
+    # systemd / 컨테이너의 SIGTERM도 Ctrl+C처럼 처리하여 소켓 파일을 지우고 종료
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass # serve_forever가 종료 전에 close()를 호출함
+
+
+def benchmark(address, n_requests=200, width=640, height=480, batch=4):
+    """
+    같은 서버에 대해 공유 메모리 전송과 pickle 전송(슬롯 0개 → 파이프로 직접 전송)의 왕복 시간을 비교하고,
+    stub 모델로 detect_objects_batch / classify_faces / 인식기 스트림 왕복을 측정합니다.
+    """
+    from .mock_llm_server import _percentiles
+
+    frames = [np.random.default_rng(i).integers(0, 255, (height, width, 3), dtype=np.uint8) for i in range(batch)]
+    report = {}
+    shared = ModelClient(address, connect_timeout=30.0)
+    inline = ModelClient(address, slot_bytes=1) # 모든 입력이 슬롯보다 커서 파이프로 전송됨
+    for name, client in (("shared_memory", shared), ("pipe_pickle", inline)):
+        latencies = []
+        for _ in range(n_requests):
+            t0 = time.perf_counter()
+            client.call("nop", arrays=frames)
+            latencies.append(time.perf_counter() - t0)
+        report[f"transfer_{name}"] = _percentiles(latencies)
+    inline.close()
+
+    for op, arrays in (("detect_objects_batch", frames), ("classify_faces", [f[:120, :120] for f in frames])):
+        latencies = []
+        for _ in range(max(1, n_requests // 10)):
+            t0 = time.perf_counter()
+            shared.call(op, arrays=arrays)
+            latencies.append(time.perf_counter() - t0)
+        report[op] = _percentiles(latencies)
+
+    recognizer = RemoteRecognizer(shared)
+    chunk = np.zeros(1600, dtype=np.int16).tobytes() # 0.1초
+    latencies = []
+    for _ in range(n_requests):
+        t0 = time.perf_counter()
+        recognizer.AcceptWaveform(chunk)
+        latencies.append(time.perf_counter() - t0)
+    recognizer.close()
+    report["stt_accept_100ms"] = _percentiles(latencies)
+    report["health"] = shared.health()
+    shared.close()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Face2Chat 공유 모델 서버")
+    parser.add_argument("--address", default=os.environ.get("FACE2CHAT_MODEL_SERVER"),
+                        help="유닉스 소켓 경로 또는 host:port (기본: 사용자 전용 디렉토리의 models.sock). "
+                             "루프백이 아닌 TCP 주소는 FACE2CHAT_MODEL_SERVER_KEY 필요")
+    parser.add_argument("--models", choices=("real", "stub"), default="real", help="stub: 모델 없이 결정적인 stub 사용")
+    parser.add_argument("--backend", choices=("torch", "onnx"), default="torch", help="추론 백엔드 (app.py의 FACE2CHAT_INFERENCE_BACKEND)")
+    parser.add_argument("--int8", action="store_true", help="onnx 백엔드에서 int8 양자화 모델 사용")
+    parser.add_argument("--threads", type=int, default=None, help="ONNX Runtime 세션의 스레드 수")
+    parser.add_argument("--limits", type=_parse_limits, default=None, help="모델별 동시 처리 상한 (예: yolo=8,deepface=1,stt=4)")
+    parser.add_argument("--queue-timeout", type=float, default=2.0, help="상한에 걸린 요청이 기다리는 최대 시간(초), 넘으면 busy")
+    parser.add_argument("--health", action="store_true", help="실행 중인 서버의 상태를 출력 (응답이 없으면 종료 코드 1)")
+    parser.add_argument("--bench", action="store_true", help="stub 서버를 띄우고 전송 / 왕복 시간 벤치마크를 실행한 뒤 종료")
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.health:
+        try:
+            print(json.dumps(check_health(args.address), indent=2, ensure_ascii=False))
+        except Exception as e:
+            print(f"[모델 서버] 상태 확인 실패: {e}")
+            sys.exit(1)
+    elif args.bench:
+        import subprocess
+
+        # 실제 배치처럼 서버는 별도 프로세스(별도 resource_tracker)로 실행
+        address = os.path.join(runtime_dir(), f"models-bench-{os.getpid()}.sock")
+        server = subprocess.Popen([sys.executable, "-m", "modules.model_server", "--models", "stub", "--address", address],
+                                  stdout=subprocess.DEVNULL)
+        try:
+            print(json.dumps(benchmark(address, args.requests), indent=2, ensure_ascii=False))
+        finally:
+            server.terminate()
+            server.wait()
+            if os.path.exists(key_path(address)):
+                os.remove(key_path(address)) # 벤치마크마다 새로 만든 키
+    else:
+        run_server(args.address, args.models, args.backend, args.int8, args.threads, args.limits, args.queue_timeout)
@@ -0,0 +1,307 @@
+# modules/onnx_backend.py
+# ONNX Runtime CPU 추론 백엔드 (YOLOv8 / DeepFace Emotion)
+# - 모델을 ONNX로 내보내고(export_yolo / export_emotion), 선택적으로 int8 동적 양자화(quantize_int8)
+# - OnnxYOLO는 ultralytics YOLO.predict와, OnnxEmotionModel은 Keras model.predict와 같은 형식의 결과를 돌려주므로
+#   VisionAnalyzer._parse_result / EmotionDetector.classify_faces는 백엔드와 관계없이 그대로 동작
+# - 모델별 스레드 수(intra_op_num_threads) 지정: 한 노드에서 YOLO와 감정 모델이 코어를 나눠 쓰도록
+#
+# 내보내기 + 양자화:   python -m modules.onnx_backend --export --quantize
+# 정확도 / 속도 비교:  python -m modules.onnx_backend --compare [--images 이미지_폴더]
+#   (이미지 폴더를 지정하지 않으면 ultralytics에 포함된 예제 이미지를 사용)
+
+import argparse
+import ast
+import glob
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+DEFAULT_ONNX_DIR = os.path.join("models", "onnx")
+
+
+def onnx_paths(onnx_dir=DEFAULT_ONNX_DIR, int8=False):
+    """(YOLO onnx 경로, 감정 모델 onnx 경로). int8=True면 양자화된 파일 경로"""
+    suffix = ".int8.onnx" if int8 else ".onnx"
+    return os.path.join(onnx_dir, "yolov8n" + suffix), os.path.join(onnx_dir, "emotion" + suffix)
+
+
+def create_session(path, threads=None):
+    """
+    ONNX Runtime CPU 세션을 만듭니다.
+    threads: 연산자 내부 병렬 스레드 수 (None이면 ONNX Runtime 기본값 = 물리 코어 수)
+    """
+    import onnxruntime as ort # 무거운 import이므로 ONNX 백엔드를 쓸 때만
+
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"ONNX 모델을 찾을 수 없습니다: {path} (python -m modules.onnx_backend --export 로 생성)")
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads:
+        options.intra_op_num_threads = int(threads)
+        options.inter_op_num_threads = 1
+    return ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
+
+# ---------------------------------------------------------------------------
+# 내보내기 / 양자화
+# ---------------------------------------------------------------------------
+
+def export_yolo(model_path="yolov8n.pt", onnx_dir=DEFAULT_ONNX_DIR, imgsz=640):
+    """ultralytics의 ONNX exporter로 배치 크기가 가변인 YOLO ONNX 모델을 만듭니다."""
+    from ultralytics import YOLO
+
+    exported = YOLO(model_path).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+    target = onnx_paths(onnx_dir)[0]
+    os.makedirs(onnx_dir, exist_ok=True)
+    os.replace(exported, target)
+    return target
+
+
+def export_emotion(onnx_dir=DEFAULT_ONNX_DIR):
+    """DeepFace Emotion Keras 모델을 tf2onnx로 변환합니다. 입력: (N, 48, 48, 1) float32"""
+    import tensorflow as tf
+    import tf2onnx
+
+    from .emotion_detector import EmotionDetector
+
+    model = EmotionDetector()._emotion_model()
+    target = onnx_paths(onnx_dir)[1]
+    os.makedirs(onnx_dir, exist_ok=True)
+    spec = (tf.TensorSpec((None, 48, 48, 1), tf.float32, name="input"),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, output_path=target)
+    return target
+
+
+def quantize_int8(path):
+    """가중치를 int8로 동적 양자화한 모델을 *.int8.onnx로 저장합니다. (보정 데이터 불필요)"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    target = path[:-len(".onnx")] + ".int8.onnx"
+    quantize_dynamic(path, target, weight_type=QuantType.QInt8)
+    return target
+
+
+# ---------------------------------------------------------------------------
+# YOLO
+# ---------------------------------------------------------------------------
+
+class _Boxes:
+    """ultralytics Results.boxes와 같은 속성(cls, conf, xyxy)을 가진 numpy 결과"""
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy, self.conf, self.cls = xyxy, conf, cls
+
+
+class _Result:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+def letterbox(img, size=640, pad_value=114):
+    """비율을 유지한 채 size x size로 맞추고 남는 부분을 채웁니다. (ultralytics 전처리와 동일) 반환: (이미지, 배율, (pad_x, pad_y))"""
+    h, w = img.shape[:2]
+    scale = min(size / h, size / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    resized = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR) if (new_w, new_h) != (w, h) else img
+    pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+    canvas = np.full((size, size, 3), pad_value, dtype=np.uint8)
+    canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = resized
+    return canvas, scale, (pad_x, pad_y)
+
+
+class OnnxYOLO:
+    """ONNX Runtime으로 실행하는 YOLOv8. predict()의 입출력 형식은 ultralytics YOLO.predict와 같습니다."""
+    def __init__(self, path, threads=None, imgsz=640, iou=0.45, max_det=300):
+        self.session = create_session(path, threads)
+        self.input_name = self.session.get_inputs()[0].name
+        self.imgsz = imgsz
+        self.iou = iou
+        self.max_det = max_det
+        # ultralytics exporter가 메타데이터에 클래스 이름 dict를 문자열로 저장해 둠
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadata["names"]) if "names" in metadata else {}
+
+    def _preprocess(self, imgs):
+        batch = np.empty((len(imgs), 3, self.imgsz, self.imgsz), dtype=np.float32)
+        meta = []
+        for i, img in enumerate(imgs):
+            canvas, scale, pad = letterbox(img, self.imgsz)
+            # ultralytics와 같이 입력을 BGR로 보고 RGB / CHW / 0~1로 변환
+            np.multiply(canvas[..., ::-1].transpose(2, 0, 1), 1.0 / 255.0, out=batch[i], casting="unsafe")
+            meta.append((scale, pad, img.shape[:2]))
+        return batch, meta
+
+    def _postprocess(self, pred, conf, scale, pad, shape):
+        # pred: (4 + 클래스 수, 후보 수) -> 후보별 (cx, cy, w, h, 클래스 점수...)
+        pred = pred.T
+        scores = pred[:, 4:]
+        cls = scores.argmax(axis=1)
+        best = scores[np.arange(len(cls)), cls]
+        keep = best > conf
+        boxes, best, cls = pred[keep, :4], best[keep], cls[keep]
+        xyxy = np.concatenate([boxes[:, :2] - boxes[:, 2:] / 2, boxes[:, :2] + boxes[:, 2:] / 2], axis=1)
+        if len(xyxy):
+            # 클래스별 NMS (좌표를 클래스마다 멀리 떨어뜨려 한 번에 처리)
+            offset = cls[:, np.newaxis].astype(np.float32) * 4096.0
+            shifted = xyxy + offset
+            wh = shifted[:, 2:] - shifted[:, :2]
+            idx = cv2.dnn.NMSBoxes(np.concatenate([shifted[:, :2], wh], axis=1).tolist(), best.tolist(), conf, self.iou)
+            idx = np.array(idx, dtype=int).reshape(-1)[:self.max_det]
+            xyxy, best, cls = xyxy[idx], best[idx], cls[idx]
+        # letterbox 좌표 -> 원본 이미지 좌표
+        xyxy = (xyxy - np.array([pad[0], pad[1], pad[0], pad[1]], dtype=np.float32)) / scale
+        h, w = shape
+        np.clip(xyxy, 0, [w, h, w, h], out=xyxy)
+        return _Result(_Boxes(xyxy, best.astype(np.float32), cls.astype(np.float32)))
+
+    def predict(self, imgs, conf=0.25, verbose=False):
+        if isinstance(imgs, np.ndarray):
+            imgs = [imgs]
+        batch, meta = self._preprocess(imgs)
+        output = self.session.run(None, {self.input_name: batch})[0]
+        return [self._postprocess(pred, conf, *m) for pred, m in zip(output, meta)]
+
+
+# ---------------------------------------------------------------------------
+# 감정 분류
+# ---------------------------------------------------------------------------
+
+class OnnxEmotionModel:
+    """ONNX Runtime으로 실행하는 DeepFace Emotion 모델. predict()는 Keras model.predict처럼 (N, 7) 점수를 반환합니다."""
+    def __init__(self, path, threads=None):
+        self.session = create_session(path, threads)
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch, verbose=0):
+        return self.session.run(None, {self.input_name: np.ascontiguousarray(batch, dtype=np.float32)})[0]
+
+
+# ---------------------------------------------------------------------------
+# 정확도 / 속도 비교
+# ---------------------------------------------------------------------------
+
+def _box_iou(a, b):
+    x1, y1 = np.maximum(a[0], b[:, 0]), np.maximum(a[1], b[:, 1])
+    x2, y2 = np.minimum(a[2], b[:, 2]), np.minimum(a[3], b[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = lambda box: (box[..., 2] - box[..., 0]) * (box[..., 3] - box[..., 1])
+    return inter / (area(a) + area(b) - inter + 1e-9)
+
+
+def detection_parity(reference, candidate, iou_threshold=0.5):
+    """
+    두 검출 결과 목록({"name", "conf", "box"}) 사이의 일치도.
+    같은 클래스끼리 IoU가 iou_threshold 이상이면 일치로 봅니다. 반환: {recall, precision, mean_iou}
+    """
+    matched, ious = 0, []
+    used = set()
+    cand_boxes = np.array([c["box"] for c in candidate], dtype=np.float32).reshape(-1, 4)
+    for ref in reference:
+        if not len(cand_boxes):
+            break
+        iou = _box_iou(np.array(ref["box"], dtype=np.float32), cand_boxes)
+        for j in np.argsort(-iou):
+            if j in used or iou[j] < iou_threshold:
+                continue
+            if candidate[j]["name"] == ref["name"]:
+                used.add(j)
+                matched += 1
+                ious.append(float(iou[j]))
+                break
+    return {
+        "recall": matched / len(reference) if reference else 1.0,
+        "precision": matched / len(candidate) if candidate else 1.0,
+        "mean_iou": float(np.mean(ious)) if ious else 0.0,
+    }
+
+
+def _time_ms(fn, repeat):
+    fn()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    return {"p50_ms": float(np.percentile(samples, 50)), "mean_ms": float(np.mean(samples))}
+
+
+def load_images(image_dir=None):
+    """비교용 고정 이미지 세트 (BGR). image_dir가 없으면 ultralytics 예제 이미지를 사용합니다."""
+    if image_dir is None:
+        from ultralytics.utils import ASSETS
+
+        image_dir = str(ASSETS)
+    paths = sorted(p for ext in ("*.jpg", "*.jpeg", "*.png") for p in glob.glob(os.path.join(image_dir, ext)))
+    images = [cv2.imread(p) for p in paths]
+    return [(os.path.basename(p), img) for p, img in zip(paths, images) if img is not None]
+
+
+def compare(image_dir=None, onnx_dir=DEFAULT_ONNX_DIR, threads=None, repeat=10):
+    """
+    현재 백엔드(PyTorch YOLO / Keras 감정 모델)와 ONNX fp32 / int8 백엔드의 결과 일치도와 속도를 비교합니다.
+    감정 모델은 각 이미지의 person 박스 머리 영역(통합 인식 단계와 같은 crop)을 입력으로 사용합니다.
+    """
+    from .emotion_detector import EmotionDetector
+    from .perception import PerceptionStage
+    from .vision_analyzer import VisionAnalyzer
+
+    images = load_images(image_dir)
+    reference_vision = VisionAnalyzer()
+    reference_detector = EmotionDetector()
+    head_cropper = PerceptionStage(reference_detector, reference_vision)
+
+    reference_objects = {name: reference_vision.detect_objects(img) for name, img in images}
+    crops = [head_cropper.head_roi(img, obj["box"]) for name, img in images for obj in reference_objects[name] if obj["name"] == "person"]
+    crops = [c for c in crops if c.size]
+    reference_faces = np.stack([EmotionDetector._preprocess_face(c) for c in crops])[..., np.newaxis] if crops else None
+    reference_scores = reference_detector._emotion_model().predict(reference_faces, verbose=0) if crops else None
+
+    report = {"images": [name for name, _ in images], "crops": len(crops), "yolo": {}, "emotion": {}}
+    report["yolo"]["torch"] = _time_ms(lambda: reference_vision.detect_objects_batch([img for _, img in images]), repeat)
+    if crops:
+        report["emotion"]["keras"] = _time_ms(lambda: reference_detector._emotion_model().predict(reference_faces, verbose=0), repeat)
+
+    for int8 in (False, True):
+        label = "onnx_int8" if int8 else "onnx_fp32"
+        yolo_path, emotion_path = onnx_paths(onnx_dir, int8)
+        if os.path.exists(yolo_path):
+            vision = VisionAnalyzer(backend="onnx", onnx_path=yolo_path, threads=threads)
+            parity = [detection_parity(reference_objects[name], vision.detect_objects(img)) for name, img in images]
+            report["yolo"][label] = dict(
+                _time_ms(lambda: vision.detect_objects_batch([img for _, img in images]), repeat),
+                recall=float(np.mean([p["recall"] for p in parity])),
+                precision=float(np.mean([p["precision"] for p in parity])),
+                mean_iou=float(np.mean([p["mean_iou"] for p in parity])),
+            )
+        if crops and os.path.exists(emotion_path):
+            model = OnnxEmotionModel(emotion_path, threads)
+            scores = model.predict(reference_faces)
+            report["emotion"][label] = dict(
+                _time_ms(lambda: model.predict(reference_faces), repeat),
+                top1_agreement=float(np.mean(scores.argmax(axis=1) == reference_scores.argmax(axis=1))),
+                max_abs_diff=float(np.abs(scores - reference_scores).max()),
+            )
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="YOLO / 감정 모델 ONNX 내보내기 및 기존 백엔드와의 비교")
+    parser.add_argument("--export", action="store_true", help="yolov8n.pt와 DeepFace Emotion 모델을 ONNX로 내보내기")
+    parser.add_argument("--quantize", action="store_true", help="내보낸 ONNX 모델의 int8 동적 양자화 버전 생성")
+    parser.add_argument("--compare", action="store_true", help="기존 백엔드 대비 정확도 일치도 / 속도 비교")
+    parser.add_argument("--images", help="비교에 사용할 고정 이미지 폴더")
+    parser.add_argument("--onnx-dir", default=DEFAULT_ONNX_DIR)
+    parser.add_argument("--threads", type=int, help="ONNX Runtime 세션별 스레드 수")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.export:
+        print(f"[ONNX] YOLO 내보내기: {export_yolo(onnx_dir=args.onnx_dir)}")
+        print(f"[ONNX] 감정 모델 내보내기: {export_emotion(onnx_dir=args.onnx_dir)}")
+    if args.quantize:
+        for path in onnx_paths(args.onnx_dir):
+            print(f"[ONNX] int8 양자화: {quantize_int8(path)}")
+    if args.compare:
+        print(json.dumps(compare(args.images, args.onnx_dir, args.threads, args.repeat), indent=2, ensure_ascii=False))
@@ -0,0 +1,99 @@
+# modules/perception.py
+# 감정 인식 + 주변 상황 분석을 한 번의 검출로 처리하는 통합 인식 단계
+# 기존에는 DeepFace가 전체 프레임에서 자체 얼굴 검출기를 돌리고, YOLO가 같은 프레임에서 다시 사람을 찾았습니다.
+# 여기서는 YOLO 검출을 한 번만 실행하고, 'person' 박스의 머리 영역을 잘라 감정 분류기에만 넘깁니다.
+
+from .batch_scheduler import BatchScheduler
+from .emotion_detector import EmotionDetector
+from .metrics import count_error, log
+from .vision_analyzer import VisionAnalyzer
+
+
+class PerceptionStage:
+    def __init__(self, detector: EmotionDetector, vision_analyzer: VisionAnalyzer, head_ratio=0.45, max_people=4,
+                 detection_scheduler: BatchScheduler = None, emotion_scheduler: BatchScheduler = None):
+        """
+        head_ratio: person 박스 위쪽에서 머리 영역으로 잘라낼 높이 비율
+        max_people: 감정 분석을 수행할 최대 인원 수 (박스 면적이 큰 순서)
+        detection_scheduler / emotion_scheduler: 지정하면 다른 세션의 요청과 묶어서 배치로 추론
+            (각각 vision_analyzer.detect_objects_batch / detector.classify_faces를 batch_fn으로 사용)
+        """
+        self.detector = detector
+        self.vision_analyzer = vision_analyzer
+        self.head_ratio = head_ratio
+        self.max_people = max_people
+        self.detection_scheduler = detection_scheduler
+        self.emotion_scheduler = emotion_scheduler
+
+    def _detect(self, img):
+        if self.detection_scheduler is not None:
+            return self.detection_scheduler(img)
+        return self.vision_analyzer.detect_objects(img)
+
+    def _classify(self, crops):
+        if self.emotion_scheduler is not None:
+            # crop마다 따로 제출해야 다른 세션의 crop과 자유롭게 묶일 수 있음
+            futures = [self.emotion_scheduler.submit(crop) for crop in crops]
+            return [future.result() for future in futures]
+        return self.detector.classify_faces(crops)
+
+    def head_roi(self, img, box):
+        """person 박스에서 머리 영역을 잘라냅니다. numpy slicing이므로 복사가 없는 view입니다."""
+        x1, y1, x2, y2 = box
+        h, w = img.shape[:2]
+        x1, x2 = max(0, x1), min(w, x2)
+        y1 = max(0, y1)
+        y2 = min(h, y1 + int((y2 - y1) * self.head_ratio))
+        # 정사각형에 가깝게 좌우 여백을 줄임 (어깨 제외)
+        box_w, head_h = x2 - x1, y2 - y1
+        if box_w > head_h:
+            margin = (box_w - head_h) // 2
+            x1, x2 = x1 + margin, x2 - margin
+        return img[y1:y2, x1:x2]
+
+    def warmup(self, img):
+        """
+        YOLO 검출과 머리 영역 crop → 감정 분류 경로(배치 스케줄러 포함)를 한 번씩 실행합니다.
+        빈 프레임에는 사람이 없어 analyze가 DeepFace 전체 프레임 분석으로 넘어가므로, 프레임 가운데에 가상의 person 박스를 둠
+        """
+        self._detect(img)
+        h, w = img.shape[:2]
+        self._classify([self.head_roi(img, (w // 4, h // 8, w * 3 // 4, h))])
+
+    def analyze(self, image):
+        """
+        반환값: {"emotion": 대표 감정, "scene": 장면 설명, "objects": 감지된 객체 이름 목록, "people": [{"box", "emotion"}, ...]}
+        대표 감정은 가장 크게 보이는(카메라에 가장 가까운) 사람의 감정입니다.
+        image가 전처리된 Frame이면 box는 YOLO에 넘긴 피라미드 단계의 좌표입니다.
+        """
+        if self.vision_analyzer.model is None:
+            # YOLO를 쓸 수 없으면 기존 방식(전체 프레임 DeepFace)으로 대체
+            return {"emotion": self.detector.detect(image), "scene": self.vision_analyzer.analyze_scene(image), "people": []}
+
+        img, error = self.vision_analyzer._load_image(image)
+        if error:
+            return {"emotion": "알 수 없음", "scene": error, "people": []}
+
+        try:
+            objects = self._detect(img)
+        except Exception as e:
+            count_error("perception")
+            print(f"[통합 인식 오류] 객체 감지 실패: {e}")
+            return {"emotion": self.detector.detect(img), "scene": "이미지 분석 실패: 처리 오류", "people": []}
+
+        scene_info = self.vision_analyzer.describe_scene(objects)
+        names = list(dict.fromkeys(obj["name"] for obj in objects)) # 챗봇에 구조화된 형태로 전달
+
+        persons = [obj for obj in objects if obj["name"] == "person"]
+        if not persons:
+            # 사람 박스가 없으면 DeepFace 자체 검출기로 한 번 더 시도 (가까운 얼굴 등)
+            return {"emotion": self.detector.detect(img), "scene": scene_info, "objects": names, "people": []}
+
+        persons.sort(key=lambda obj: (obj["box"][2] - obj["box"][0]) * (obj["box"][3] - obj["box"][1]), reverse=True)
+        persons = persons[:self.max_people]
+        crops = [self.head_roi(img, obj["box"]) for obj in persons]
+        emotions = self._classify(crops)
+
+        people = [{"box": obj["box"], "emotion": emotion} for obj, emotion in zip(persons, emotions)]
+        log(f"(통합 인식) 사람 {len(people)}명 감정: {[p['emotion'] for p in people]}")
+        return {"emotion": emotions[0], "scene": scene_info, "objects": names, "people": people}
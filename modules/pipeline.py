@@ -1,63 +1,297 @@
 # modules/pipeline.py
+import contextvars
+import threading
+import time
+from concurrent.futures import Executor, TimeoutError as FutureTimeoutError
+
 import numpy as np # np 임포트 추가 (STT 길이 체크에 필요)
 
 # ⭐️ 추가: VisionAnalyzer 및 다른 모듈들을 명시적으로 임포트 (타입 힌트 및 린터 경고 해결용) ⭐️
 from .emotion_detector import EmotionDetector
 from .speech_to_text import SpeechToText
 from .chatbot_engine import ChatbotEngine
-from .text_to_speech import TextToSpeech
+from .text_to_speech import TextToSpeech, pop_complete_sentences
 from .vision_analyzer import VisionAnalyzer # ⭐️ VisionAnalyzer 명시적 임포트 ⭐️
+from .audio_io import copy_stats
+from .batch_scheduler import request_scope
+from .frame_gate import FrameGate
+from .frame_preprocess import FramePreprocessor
+from .perception import PerceptionStage
+from .metrics import REGISTRY, count_fallback, log, observe, timed
+from .session_store import Session
+
+
+# STT 결과가 없을 때의 고정 응답 (TTS 캐시 사전 준비 대상)
+FALLBACK_RESPONSE = "잘 이해하지 못했어요. 다시 말씀해 주시겠어요?"
+
+# 병렬 실행 모드에서 단계가 제한 시간을 넘기거나 실패했을 때 사용하는 대체 결과
+STAGE_FALLBACKS = {
+    "perception": {"emotion": "알 수 없음", "scene": "", "objects": [], "people": []},
+    "emotion": "알 수 없음",
+    "scene": "",
+    "stt": "",
+}
+DEFAULT_STAGE_TIMEOUTS = {"perception": 2.0, "emotion": 2.0, "scene": 1.5, "stt": 5.0}
+
+
+def _in_copy_turn(iterable, copies):
+    """
+    next() 호출마다 copy_stats 턴(copies) 안에서 실행하는 제너레이터.
+    Gradio는 스트리밍 제너레이터의 각 단계를 다른 스레드 / 컨텍스트에서 진행할 수 있으므로 yield를 걸쳐 턴을 열어 두지 않음
+    """
+    it = iter(iterable)
+    try:
+        while True:
+            with copy_stats.turn(copies):
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+            yield item
+    finally:
+        close = getattr(it, "close", None)
+        if close is not None:
+            close() # 중간에 닫히면 감싼 제너레이터(LLM 스트림 등)도 바로 닫음
 
 
 class Face2ChatPipeline:
     # ⭐️ 수정: __init__ 메서드에 타입 힌트 추가 및 vision_analyzer 인자 포함 ⭐️
-    def __init__(self, detector: EmotionDetector, stt: SpeechToText, bot: ChatbotEngine, tts: TextToSpeech, vision_analyzer: VisionAnalyzer):
+    # emotion_gate / scene_gate: 프레임 변화가 작을 때 직전 결과를 재사용하는 FrameGate (None이면 매 프레임 실행)
+    # perception: 지정하면 감정 인식과 주변 상황 분석을 YOLO 검출 한 번으로 처리 (emotion_gate로 게이트)
+    # executor: 지정하면 감정 인식 / 장면 분석 / 음성 인식을 동시에 실행 (stage_timeouts 초 안에 끝나지 않으면 대체 결과 사용)
+    # preprocessor: 프레임 검증 / 색 변환 / 피라미드를 프레임당 한 번만 수행 (None이면 기본 설정으로 생성)
+    def __init__(self, detector: EmotionDetector, stt: SpeechToText, bot: ChatbotEngine, tts: TextToSpeech, vision_analyzer: VisionAnalyzer,
+                 emotion_gate: FrameGate = None, scene_gate: FrameGate = None, perception: PerceptionStage = None,
+                 executor: Executor = None, stage_timeouts: dict = None, preprocessor: FramePreprocessor = None):
         self.detector = detector
         self.stt = stt
         self.bot = bot
         self.tts = tts
         self.vision_analyzer = vision_analyzer # ⭐️ 초기화 ⭐️
+        self.emotion_gate = emotion_gate
+        self.scene_gate = scene_gate
+        self.perception = perception
+        self.executor = executor
+        self.stage_timeouts = dict(DEFAULT_STAGE_TIMEOUTS, **(stage_timeouts or {}))
+        self.preprocessor = preprocessor or FramePreprocessor()
+        self.last_copy_report = None # 직전 턴의 오디오 버퍼 복사량 (copy_stats.enabled일 때만 채워짐)
+
+    def run(self, image, audio, session: Session = None):
+        # session: 지정하면 세션별 프레임 게이트를 사용하고 대화 기록을 남김
+        # 음성 인식
+        # audio는 STT 모듈이 기대하는 파일 경로 (app.py에서 처리됨)
+        # audio는 (sample_rate, numpy_array) 튜플도 받으며, 이 경우 디스크를 거치지 않음
+        with copy_stats.turn() as copies:
+            results = self._run_stages(self._perception_stages(image, session) + [("stt", self.stt.transcribe, audio)], session)
+            emotion, scene_info, objects = self._perception_result(results)
+            result = self._respond(emotion, scene_info, results["stt"], session, objects)
+        self._report_copies(copies)
+        return result
+
+    def run_text(self, image, text, session: Session = None):
+        """
+        이미 인식된 텍스트로 나머지 단계를 실행합니다.
+        스트리밍 모드에서는 SpeechStream이 발화 끝을 감지한 뒤 이 메서드를 호출합니다.
+        """
+        with copy_stats.turn() as copies:
+            results = self._run_stages(self._perception_stages(image, session), session)
+            emotion, scene_info, objects = self._perception_result(results)
+            result = self._respond(emotion, scene_info, text, session, objects)
+        self._report_copies(copies)
+        return result
+
+    def _perception_stages(self, image, session=None):
+        """감정 인식과 주변 상황 분석 단계를 (이름, 함수, 인자) 목록으로 반환합니다."""
+        with timed("preprocess"):
+            frame, _ = self.preprocessor.prepare(image)
+        if frame is not None:
+            # 검증에 실패한 입력은 그대로 넘겨 각 모델이 기존과 같은 오류 결과를 내도록 함
+            image = frame
+        # 세션이 있으면 직전 결과 캐시(게이트)도 세션별로 사용 (다른 사용자의 프레임과 섞이지 않도록)
+        emotion_gate, scene_gate = (session.emotion_gate, session.scene_gate) if session is not None else (self.emotion_gate, self.scene_gate)
+        if self.perception is not None:
+            # 통합 인식: YOLO 한 번 + 사람별 머리 영역 감정 분류
+            return [("perception", self._gated, emotion_gate, image, self.perception.analyze)]
+
+        return [
+            # 1. 감정 인식
+            # image는 numpy 배열 (Gradio Image type="numpy"로 설정했으므로)
+            ("emotion", self._gated, emotion_gate, image, self.detector.detect),
+            # 2. 주변 상황 분석 (새로운 기능)
+            ("scene", self._gated, scene_gate, image, self.vision_analyzer.analyze_scene), # ⭐️ 추가 ⭐️
+        ]
+
+    @staticmethod
+    def _perception_result(results):
+        """(감정, 장면 설명, 객체 이름 목록 또는 None)"""
+        if "perception" in results:
+            perception = results["perception"]
+            return perception["emotion"], perception["scene"], perception.get("objects")
+        return results["emotion"], results["scene"], None
+
+    def _run_stages(self, stages, session=None):
+        """
+        서로 의존하지 않는 단계들을 실행하여 {단계 이름: 결과}를 반환합니다.
+        executor가 없으면 순서대로 실행하고, 있으면 동시에 제출한 뒤 단계별 제한 시간까지만 기다립니다.
+        제한 시간을 넘긴 단계는 대체 결과를 쓰고, 실행 중인 작업은 백그라운드에서 끝나도록 둡니다.
+        이때 배치 스케줄러에 아직 대기 중인 추론 요청은 기한이 지나면 실행되지 않고 버려지며,
+        같은 세션의 다음 턴이 제출한 요청이 있으면 그 요청으로 대체됩니다.
+        """
+        if self.executor is None:
+            return {name: self._timed_call(name, fn, *args) for name, fn, *args in stages}
+
+        start = time.monotonic()
+        session_id = session.session_id if session is not None else None
+        # copy_stats 턴 정보가 작업 스레드에도 전달되도록 컨텍스트를 복사해서 실행
+        # 제한 시간이 없거나(None, 0) 설정되지 않은 단계는 끝날 때까지 기다림
+        deadlines = {name: start + self.stage_timeouts[name] if self.stage_timeouts.get(name) else None
+                     for name, *_ in stages}
+        futures = [(name, self.executor.submit(contextvars.copy_context().run, self._scoped_call, name,
+                                               f"{session_id}:{name}" if session_id is not None else None,
+                                               deadlines[name], fn, *args))
+                   for name, fn, *args in stages]
+        results = {}
+        for name, future in futures:
+            deadline = deadlines[name]
+            try:
+                results[name] = future.result(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                future.cancel()
+                count_fallback(name, "timeout")
+                log(f"[파이프라인] '{name}' 단계가 {self.stage_timeouts.get(name)}초 안에 끝나지 않아 대체 결과를 사용합니다.")
+                results[name] = STAGE_FALLBACKS[name]
+            except Exception as e:
+                count_fallback(name, "error")
+                print(f"[파이프라인] '{name}' 단계 실행 실패: {e}. 대체 결과를 사용합니다.")
+                results[name] = STAGE_FALLBACKS[name]
+        return results
+
+    @staticmethod
+    def _timed_call(name, fn, *args):
+        with timed(name):
+            return fn(*args)
 
-    def run(self, image, audio):
-        # 1. 감정 인식
-        # image는 numpy 배열 (Gradio Image type="numpy"로 설정했으므로)
-        emotion = self.detector.detect(image)
+    @classmethod
+    def _scoped_call(cls, name, key, deadline, fn, *args):
+        # 이 단계가 배치 스케줄러에 제출하는 요청에 세션 key와 단계 제한 시간을 붙임
+        with request_scope(key, deadline):
+            return cls._timed_call(name, fn, *args)
+
+    @staticmethod
+    def _gated(gate, image, compute):
+        if gate is None:
+            return compute(image)
+        return gate.run(image, compute)
+
+    def fixed_phrases(self):
+        """파이프라인과 챗봇이 그대로 읽어 주는 고정 문구 목록 (TTS 캐시 사전 준비용)"""
+        return [FALLBACK_RESPONSE] + self.bot.fixed_phrases()
+
+    def gate_stats(self):
+        """프레임 게이트 적중/미적중 통계를 반환합니다."""
+        return {name: gate.stats() for name, gate in (("emotion", self.emotion_gate), ("scene", self.scene_gate)) if gate is not None}
+
+    def _report_copies(self, copies):
+        if not copy_stats.enabled:
+            return
+        self.last_copy_report = dict(copies, total=sum(copies.values()))
+        log(f"[파이프라인] 이번 턴 오디오 복사량(bytes): {self.last_copy_report}")
+
+    def run_text_stream(self, image, text, session: Session = None, cancel=None):
+        """
+        run_text의 스트리밍 버전. 응답을 문장 단위로 합성하면서 (감정, 인식 텍스트, 지금까지의 응답, 오디오 조각)을 yield합니다.
+        LLM 응답은 토큰 단위로 받으면서 문장이 끝나는 대로 합성하므로,
+        첫 오디오까지의 시간이 전체 응답이 아니라 첫 문장 생성 + 합성 시간에 좌우됩니다.
+        cancel: threading.Event. 설정되면(새 발화가 이 턴을 대체) 다음 조각부터 내보내지 않고 LLM 스트림도 닫음.
+            호출자가 제너레이터를 닫아도(GeneratorExit) 같은 방식으로 LLM 스트림을 멈춤
+        """
+        cancel = cancel if cancel is not None else threading.Event()
+        copies = {} # 턴 전체의 버퍼 복사량. yield 사이에는 호출자의 컨텍스트를 건드리지 않도록 블록마다 이어서 모음
+        with copy_stats.turn(copies):
+            results = self._run_stages(self._perception_stages(image, session), session)
+        emotion, scene_info, objects = self._perception_result(results)
+        start = time.perf_counter()
+        first = True
+        response, pending = "", ""
+        bot_seconds = 0.0
+        pieces = _in_copy_turn(self._stream_response(emotion, scene_info, text, session, objects, cancel=cancel), copies)
+        try:
+            while not cancel.is_set():
+                t0 = time.perf_counter()
+                piece = next(pieces, None)
+                bot_seconds += time.perf_counter() - t0
+                if piece is not None:
+                    response += piece
+                    ready, pending = pop_complete_sentences(pending + piece)
+                else:
+                    ready, pending = pending, "" # 응답이 끝나면 남은 문장까지 합성
+                if ready.strip() or (piece is None and first):
+                    # TTS 합성 동안 LLM 스트림은 소켓 버퍼에 쌓이므로 토큰을 잃지 않음
+                    for audio_chunk in _in_copy_turn(self.tts.synthesize_stream(ready.strip()), copies):
+                        if first:
+                            observe("tts_first_chunk", time.perf_counter() - start) # 응답 생성 시작부터 첫 오디오까지
+                            first = False
+                        yield emotion, text, response, audio_chunk
+                        if cancel.is_set():
+                            break
+                if piece is None:
+                    break
+            if cancel.is_set():
+                REGISTRY.inc("face2chat_turns_cancelled_total", help_text="새 발화 / 세션 종료로 중간에 멈춘 응답 수", reason="superseded")
+        except GeneratorExit:
+            REGISTRY.inc("face2chat_turns_cancelled_total", help_text="새 발화 / 세션 종료로 중간에 멈춘 응답 수", reason="closed")
+            raise
+        finally:
+            cancel.set()
+            pieces.close() # 아직 받고 있는 LLM 응답 연결을 닫음
+            self._report_copies(copies)
+        observe("bot", bot_seconds)
+        if session is not None:
+            session.add_turn(text, emotion, response) # 중간에 멈춘 턴은 거기까지 말한 응답을 기록
+        observe("tts", time.perf_counter() - start - bot_seconds)
+
+    def _respond(self, emotion, scene_info, text, session=None, objects=None):
+        response = self._compose_response(emotion, scene_info, text, session, objects)
+        if session is not None:
+            session.add_turn(text, emotion, response)
+
+        # 5. 텍스트를 음성으로 변환
+        with timed("tts"):
+            audio_out = self.tts.synthesize(response)
         
-        # 2. 주변 상황 분석 (새로운 기능)
-        scene_info = self.vision_analyzer.analyze_scene(image) # ⭐️ 추가 ⭐️
-        print(f"[파이프라인] 주변 상황 분석 결과: {scene_info}")
+        return emotion, text, response, audio_out
 
-        # 3. 음성 인식
-        # audio는 STT 모듈이 기대하는 파일 경로 (app.py에서 처리됨)
-        text = self.stt.transcribe(audio)
+    def _compose_response(self, emotion, scene_info, text, session=None, objects=None):
+        """감정 / 장면 / 인식 텍스트로 챗봇 응답 문장을 만듭니다."""
+        with timed("bot"):
+            return "".join(self._stream_response(emotion, scene_info, text, session, objects))
+
+    def _stream_response(self, emotion, scene_info, text, session=None, objects=None, cancel=None):
+        """
+        챗봇 응답을 조각 단위로 yield합니다. objects: 통합 인식이 넘겨준 객체 이름 목록 (없으면 None)
+        cancel: 챗봇 백엔드에 넘길 threading.Event (설정되면 LLM 응답 수신을 멈춤)
+        """
+        log(f"[파이프라인] 주변 상황 분석 결과: {scene_info}")
 
         # STT 결과 예외 처리 로직
         min_text_length = 3
         if not text or len(text.strip()) < min_text_length:
-            print(f"[파이프라인] STT 결과가 비어있거나 너무 짧습니다: '{text}'. 기본 응답으로 대체합니다.")
+            log(f"[파이프라인] STT 결과가 비어있거나 너무 짧습니다: '{text}'. 기본 응답으로 대체합니다.")
+            count_fallback("stt", "empty")
             
-            # STT 실패 시 챗봇에게 보낼 텍스트에 주변 상황 정보를 포함 (선택적)
+            # STT 실패 시 주변 상황 정보로 사용자에게 더 직접적인 피드백 제공 (선택적)
+            if objects:
+                yield f"잘 이해하지 못했어요. 혹시 주변의 {', '.join(objects)}과(와) 관련된 질문인가요?"
+                return
             if scene_info and "주변에서 다음을 감지했습니다" in scene_info:
-                # scene_info에서 객체 목록만 추출하여 사용자에게 더 직접적인 피드백 제공
+                # 개별 장면 분석 단계는 설명 문장만 주므로 객체 목록을 추출
                 scene_objects = scene_info.split("주변에서 다음을 감지했습니다:")[1].strip().replace('.', '')
-                response_text = f"잘 이해하지 못했어요. 혹시 주변의 {scene_objects}과(와) 관련된 질문인가요?"
-            else:
-                response_text = "잘 이해하지 못했어요. 다시 말씀해 주시겠어요?"
-
-            audio_out = self.tts.synthesize(response_text)
-            return emotion, text, response_text, audio_out
+                yield f"잘 이해하지 못했어요. 혹시 주변의 {scene_objects}과(와) 관련된 질문인가요?"
+                return
+            yield FALLBACK_RESPONSE
+            return
 
         # 4. 챗봇 응답 생성
-        # 챗봇에 감정 정보와 함께 주변 상황 정보를 전달하여 응답을 생성하도록 프롬프트를 구성
-        # 챗봇에 전달할 최종 텍스트를 구성 (기존 사용자 발화 + 주변 상황 정보)
-        # chatbot_engine의 generate_response가 text와 emotion만 받으므로,
-        # 여기서는 scene_info를 text에 통합하여 전달.
-        full_text_for_chatbot = f"{scene_info}. 사용자가 말했어요: '{text}'" if scene_info else text
-        
-        # ⭐️ chatbot_engine.py의 메서드 이름을 'generate_response'로 수정 ⭐️
-        response = self.bot.generate_response(full_text_for_chatbot, emotion) 
-        
-        # 5. 텍스트를 음성으로 변환
-        audio_out = self.tts.synthesize(response)
-        
-        return emotion, text, response, audio_out
\ No newline at end of file
+        # 발화 / 감정 / 장면 / 대화 기록을 합치지 않고 그대로 넘겨 챗봇 백엔드가 프롬프트를 구성하도록 함
+        history = list(session.history) if session is not None else ()
+        yield from self.bot.stream_response(text, emotion, scene=scene_info, objects=objects, history=history, cancel=cancel)
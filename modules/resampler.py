@@ -0,0 +1,241 @@
+# modules/resampler.py
+# 오디오 입력용 polyphase 리샘플러
+# - (원본 레이트, 목표 레이트, 품질)별로 정수비 polyphase 필터를 한 번만 만들어 캐시
+# - 청크 단위 스트리밍: 청크 경계의 샘플을 다음 청크까지 보관하므로 청크로 나눠 넣어도 한 번에 넣은 것과 같은 결과
+# - 다채널 -> 모노 다운믹스와 정수 -> float 스케일링을 한 번의 행렬 곱으로, 클리핑과 int16 변환을 제자리 연산으로 처리
+#
+# 예: 48000 -> 16000은 (up=1, down=3), 44100 -> 16000은 (up=160, down=441)로 약분되고,
+#     출력 샘플마다 up개 위상 중 하나의 필터(taps개 계수)를 입력 창에 곱합니다.
+#
+# 벤치마크: python -m modules.resampler --bench
+
+import argparse
+import json
+import math
+import time
+from functools import lru_cache
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+from .audio_io import copy_stats
+
+# 품질 단계: (통과 대역 비율 rolloff, 필터 반쪽 길이의 영교차 수, Kaiser beta)
+QUALITY_LEVELS = {
+    "low": (0.80, 8, 5.0),
+    "medium": (0.90, 16, 8.0),
+    "high": (0.945, 32, 10.0),
+}
+
+
+class PolyphaseFilter:
+    def __init__(self, src_rate, dst_rate, quality="medium"):
+        if quality not in QUALITY_LEVELS:
+            raise ValueError(f"지원하지 않는 리샘플링 품질: {quality} (가능: {', '.join(QUALITY_LEVELS)})")
+        g = math.gcd(int(src_rate), int(dst_rate))
+        self.up = int(dst_rate) // g
+        self.down = int(src_rate) // g
+        rolloff, zero_crossings, beta = QUALITY_LEVELS[quality]
+        # 차단 주파수 (입력 샘플 단위). 다운샘플링이면 출력 나이퀴스트에 맞춰 낮추고, 필터 길이는 그만큼 늘림
+        cutoff = rolloff * min(1.0, self.up / self.down)
+        self.half = int(math.ceil(zero_crossings / cutoff))
+        self.taps = 2 * self.half
+
+        # 위상 p의 k번째 계수 = g(p/up + half - 1 - k): 출력 시점과 입력 샘플 사이의 거리로 연속 커널을 샘플링
+        x = np.arange(self.up)[:, np.newaxis] / self.up + (self.half - 1 - np.arange(self.taps))[np.newaxis, :]
+        window = np.i0(beta * np.sqrt(np.clip(1.0 - (x / self.half) ** 2, 0.0, None))) / np.i0(beta)
+        self.phases = (cutoff * np.sinc(cutoff * x) * window).astype(np.float32) # (up, taps)
+
+
+@lru_cache(maxsize=32)
+def get_filter(src_rate, dst_rate, quality="medium"):
+    """(src_rate, dst_rate, quality)별 polyphase 필터 (프로세스 전체에서 공유)"""
+    return PolyphaseFilter(src_rate, dst_rate, quality)
+
+
+def downmix(audio):
+    """
+    numpy 오디오를 float32 모노(-1~1)로 바꿉니다.
+    다채널 정수 입력은 채널 평균과 정수 스케일링을 가중치 벡터와의 행렬 곱 한 번으로 처리합니다.
+    """
+    audio = np.asarray(audio)
+    scale = 1.0 / np.iinfo(audio.dtype).max if np.issubdtype(audio.dtype, np.integer) else 1.0
+    if audio.ndim > 1:
+        out = audio @ np.full(audio.shape[1], scale / audio.shape[1], dtype=np.float32)
+    elif scale != 1.0 or audio.dtype != np.float32:
+        out = np.multiply(audio, np.float32(scale), dtype=np.float32)
+    else:
+        return audio
+    copy_stats.add(out.nbytes, "downmix")
+    return out
+
+
+def to_int16(audio):
+    """float 오디오(-1~1)를 클리핑하여 int16으로 변환합니다. (중간 배열은 제자리 연산으로 재사용)"""
+    scaled = np.multiply(audio, np.float32(32767.0), dtype=np.float32)
+    np.clip(scaled, -32768.0, 32767.0, out=scaled)
+    return scaled.astype(np.int16)
+
+
+class Resampler:
+    """
+    청크 단위 스트리밍 리샘플러.
+    process(chunk)는 지금까지 들어온 입력으로 계산할 수 있는 출력만 반환하고,
+    필터 길이만큼의 입력은 다음 청크와 이어 계산하기 위해 보관합니다. 스트림 끝에서는 flush()로 나머지를 꺼냅니다.
+    output="int16"이면 Vosk에 바로 넘길 수 있는 int16 배열을 반환합니다.
+    """
+    def __init__(self, src_rate, dst_rate, quality="medium", output="float32"):
+        self.src_rate = int(src_rate)
+        self.dst_rate = int(dst_rate)
+        self.quality = quality
+        self.output = output
+        self.filter = get_filter(self.src_rate, self.dst_rate, quality)
+        self.reset()
+
+    def reset(self):
+        half = self.filter.half
+        # 첫 출력의 창이 입력 시작 전까지 걸치므로 그만큼 0으로 채워 둠
+        self._buffer = np.zeros(half - 1, dtype=np.float32)
+        self._buffer_start = -(half - 1) # _buffer[0]의 입력 절대 위치
+        self._next_out = 0 # 다음에 계산할 출력 절대 위치
+        self._total_in = 0
+
+    def buffered_bytes(self):
+        return self._buffer.nbytes
+
+    def _compute(self, n_end):
+        """출력 [_next_out, n_end)를 계산합니다. 위상이 같은 출력끼리 (개수, taps) strided view @ 계수로 묶습니다."""
+        f = self.filter
+        n_start = self._next_out
+        count = n_end - n_start
+        out = np.empty(max(0, count), dtype=np.float32)
+        if count <= 0:
+            return out
+        buf = self._buffer
+        if count < 32 * f.up:
+            # 위상 수(up)에 비해 출력이 적으면 (44.1kHz 입력의 짧은 청크 등) 위상별 반복 대신 창을 한 번에 모아 계산
+            n = np.arange(n_start, n_end)
+            i = (n * f.down) // f.up
+            starts = i - f.half + 1 - self._buffer_start
+            windows = buf[starts[:, np.newaxis] + np.arange(f.taps)]
+            np.einsum("nk,nk->n", windows, f.phases[n * f.down - i * f.up], out=out)
+            self._next_out = n_end
+            return out
+        step = buf.strides[0]
+        for r in range(min(f.up, count)):
+            n0 = n_start + r
+            i0 = (n0 * f.down) // f.up
+            phase = n0 * f.down - i0 * f.up
+            rows = len(range(n0, n_end, f.up))
+            start = i0 - f.half + 1 - self._buffer_start
+            windows = as_strided(buf[start:], shape=(rows, f.taps), strides=(f.down * step, step), writeable=False)
+            out[r::f.up] = windows @ f.phases[phase]
+        self._next_out = n_end
+        return out
+
+    def _emit(self, out):
+        if self.output == "int16":
+            out = to_int16(out)
+        copy_stats.add(out.nbytes, "resample")
+        return out
+
+    def _trim(self):
+        # 다음 출력의 창 시작 이전 샘플은 더 이상 필요 없음
+        f = self.filter
+        keep_from = (self._next_out * f.down) // f.up - f.half + 1
+        drop = max(0, keep_from - self._buffer_start)
+        if drop:
+            self._buffer = self._buffer[drop:]
+            self._buffer_start += drop
+
+    def process(self, chunk):
+        """입력 청크(모노/다채널, int/float)를 넣고 지금 계산 가능한 출력 샘플을 반환합니다."""
+        x = downmix(chunk)
+        self._total_in += len(x)
+        self._buffer = np.concatenate([self._buffer, x]) if len(self._buffer) else np.asarray(x, dtype=np.float32)
+        f = self.filter
+        # 출력 n은 입력 [i_n - half + 1, i_n + half]가 필요 -> i_n <= buffer_end - half - 1
+        last_input = self._buffer_start + len(self._buffer) - f.half - 1
+        n_end = ((last_input + 1) * f.up - 1) // f.down + 1 if last_input >= 0 else 0
+        out = self._compute(n_end)
+        self._trim()
+        return self._emit(out)
+
+    def flush(self):
+        """스트림 끝: 남은 입력 뒤를 0으로 채워 마지막 출력까지 계산하고 상태를 초기화합니다."""
+        f = self.filter
+        n_total = -(-self._total_in * f.up // f.down) # ceil(total_in * up / down)
+        self._buffer = np.concatenate([self._buffer, np.zeros(f.taps, dtype=np.float32)])
+        out = self._compute(n_total)
+        self.reset()
+        return self._emit(out)
+
+
+def resample(audio, src_rate, dst_rate, quality="medium", output="float32"):
+    """오디오 전체를 한 번에 리샘플링합니다. (resampy.resample 대체)"""
+    if src_rate == dst_rate:
+        x = downmix(audio)
+        return to_int16(x) if output == "int16" else x
+    resampler = Resampler(src_rate, dst_rate, quality, output)
+    head = resampler.process(audio)
+    tail = resampler.flush()
+    return np.concatenate([head, tail]) if len(tail) else head
+
+
+def benchmark(seconds=3.0, rates=(44100, 48000), dst_rate=16000, chunk_ms=100, repeat=5):
+    """resampy(기본 kaiser_best) 경로와 품질 단계별 polyphase 리샘플러의 속도와 오차를 비교합니다."""
+    report = {}
+    for src in rates:
+        t = np.arange(int(src * seconds)) / src
+        audio = (0.4 * np.sin(2 * np.pi * 440.0 * t) + 0.2 * np.sin(2 * np.pi * 3100.0 * t)).astype(np.float32)
+        pcm = (audio * 32767).astype(np.int16)
+        t_out = np.arange(int(dst_rate * seconds)) / dst_rate
+        expected = (0.4 * np.sin(2 * np.pi * 440.0 * t_out) + 0.2 * np.sin(2 * np.pi * 3100.0 * t_out)).astype(np.float32)
+
+        def timed_ms(fn):
+            fn()
+            t0 = time.perf_counter()
+            for _ in range(repeat):
+                result = fn()
+            return (time.perf_counter() - t0) / repeat * 1000.0, result
+
+        def error_db(y):
+            # 가장자리(필터 과도 구간)를 제외한 기대 신호 대비 오차
+            n = min(len(y), len(expected))
+            edge = dst_rate // 20
+            diff = y[edge:n - edge].astype(np.float32) - expected[edge:n - edge]
+            return float(10 * np.log10(np.mean(diff ** 2) + 1e-20))
+
+        entry = {}
+        try:
+            import resampy
+
+            ms, y = timed_ms(lambda: resampy.resample(audio, src, dst_rate))
+            entry["resampy"] = {"ms": ms, "error_db": error_db(y)}
+        except ImportError:
+            entry["resampy"] = None
+        for quality in QUALITY_LEVELS:
+            ms, y = timed_ms(lambda: resample(audio, src, dst_rate, quality))
+            entry[quality] = {"ms": ms, "error_db": error_db(y)}
+
+            # 스트리밍 (int16 입력 청크 -> int16 출력, STT 입력 경로와 동일)
+            chunk = int(src * chunk_ms / 1000)
+
+            def stream():
+                r = Resampler(src, dst_rate, quality, output="int16")
+                parts = [r.process(pcm[i:i + chunk]) for i in range(0, len(pcm), chunk)]
+                parts.append(r.flush())
+                return np.concatenate(parts)
+            ms, y = timed_ms(stream)
+            entry[f"{quality}_stream_int16"] = {"ms": ms, "error_db": error_db(y / 32767.0)}
+        report[f"{src}->{dst_rate}"] = entry
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="polyphase 리샘플러 벤치마크 (resampy 대비)")
+    parser.add_argument("--bench", action="store_true")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(benchmark(args.seconds, repeat=args.repeat), indent=2))
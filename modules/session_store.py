@@ -0,0 +1,154 @@
+# modules/session_store.py
+# 세션별 상태 관리
+# Gradio 세션(gr.Request.session_hash)마다 스트리밍 음성 인식기, 프레임 게이트(직전 감정 / 장면 결과),
+# 대화 기록을 따로 보관합니다. 오래 켜 두는 서버에서 상태가 끝없이 늘지 않도록
+# - 세션 수 상한 (가장 오래 사용하지 않은 세션부터 LRU 제거)
+# - 유휴 시간 초과 제거 (브라우저를 닫아도 unload 이벤트가 오지 않는 경우 대비)
+# - 세션별 메모리 상한 (넘으면 오래된 대화 기록 -> 게이트 캐시 -> 음성 버퍼 순으로 비움)
+# - 대화 기록은 길이가 고정된 링 버퍼
+# - 입력 수용 계층(Admission)의 최신 프레임 슬롯 / 오디오 버퍼도 세션 메모리에 포함
+# 를 적용하고, 세션 수와 전체 메모리 사용량을 게이지로 노출합니다.
+
+import threading
+import time
+from collections import OrderedDict, deque
+
+from .metrics import REGISTRY, log
+
+
+class Session:
+    def __init__(self, session_id, stt_stream=None, emotion_gate=None, scene_gate=None, history_size=20, admission=None):
+        self.session_id = session_id
+        self.stt_stream = stt_stream
+        self.emotion_gate = emotion_gate
+        self.scene_gate = scene_gate
+        self.history = deque(maxlen=history_size) # (사용자 발화, 감정, 챗봇 응답)
+        self.admission = admission # live 모드 입력 슬롯 / 버퍼 (modules.admission.Admission)
+        self.created_at = time.monotonic()
+        self.last_seen = self.created_at
+        self.lock = threading.Lock() # 같은 세션의 요청이 겹칠 때 스트림 / 기록 갱신을 직렬화
+
+    def add_turn(self, text, emotion, response):
+        self.history.append((text, emotion, response))
+
+    def memory_bytes(self):
+        """세션이 들고 있는 버퍼 / 캐시 / 기록의 대략적인 크기 (bytes)"""
+        total = sum(len(t.encode("utf-8")) + len(e.encode("utf-8")) + len(r.encode("utf-8")) for t, e, r in self.history)
+        for gate in (self.emotion_gate, self.scene_gate):
+            if gate is not None:
+                total += gate.cached_bytes()
+        if self.stt_stream is not None:
+            total += self.stt_stream.buffered_bytes()
+        if self.admission is not None:
+            total += self.admission.nbytes()
+        return total
+
+    def close(self):
+        """세션이 제거될 때 인식기(모델 서버 쪽 인식기 포함)와 입력 버퍼를 바로 정리합니다. (GC를 기다리지 않음)"""
+        with self.lock:
+            if self.stt_stream is not None:
+                try:
+                    self.stt_stream.close()
+                except Exception as e:
+                    log(f"[세션] {self.session_id} 인식기 정리 실패: {e}")
+            if self.admission is not None:
+                self.admission.clear()
+
+    def trim(self, max_bytes):
+        """메모리 사용량이 max_bytes 이하가 될 때까지 오래된 기록, 게이트 캐시, 음성 버퍼(입력 버퍼 포함) 순으로 비웁니다."""
+        while self.history and self.memory_bytes() > max_bytes:
+            self.history.popleft()
+        if self.memory_bytes() > max_bytes:
+            for gate in (self.emotion_gate, self.scene_gate):
+                if gate is not None:
+                    gate.reset()
+        if self.memory_bytes() > max_bytes:
+            if self.stt_stream is not None:
+                self.stt_stream.reset()
+            if self.admission is not None:
+                self.admission.clear()
+
+
+class SessionStore:
+    def __init__(self, factory, max_sessions=256, idle_timeout=600.0, max_session_bytes=8 * 1024 * 1024):
+        """
+        factory: 세션 id를 받아 새 Session을 만드는 함수
+        max_sessions: 동시에 보관할 최대 세션 수 (넘으면 가장 오래 사용하지 않은 세션 제거)
+        idle_timeout: 이 시간(초) 동안 요청이 없던 세션은 제거
+        max_session_bytes: 세션 하나가 보관할 수 있는 최대 메모리
+        """
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_session_bytes = max_session_bytes
+        self._sessions = OrderedDict() # 오래 사용하지 않은 순서
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        """세션을 찾거나 새로 만들고, 최근 사용 세션으로 표시합니다."""
+        now = time.monotonic()
+        evicted = []
+        with self._lock:
+            self._evict_idle(now, evicted)
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self.factory(session_id)
+                self._sessions[session_id] = session
+                while len(self._sessions) > self.max_sessions:
+                    evicted.append(self._evict(next(iter(self._sessions)), "lru"))
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_seen = now
+        self._close(evicted)
+        return session
+
+    def _evict_idle(self, now, evicted):
+        # OrderedDict가 마지막 사용 순서이므로 앞에서부터 유휴 세션만 확인
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_seen <= self.idle_timeout:
+                break
+            evicted.append(self._evict(oldest.session_id, "idle"))
+
+    def _evict(self, session_id, reason):
+        session = self._sessions.pop(session_id, None)
+        REGISTRY.inc("face2chat_session_evictions_total", help_text="제거된 세션 수", reason=reason)
+        log(f"[세션] {session_id} 제거 ({reason})")
+        return session
+
+    @staticmethod
+    def _close(sessions):
+        # 세션 잠금을 기다릴 수 있으므로 보관소 잠금을 놓은 뒤에 정리
+        for session in sessions:
+            if session is not None:
+                session.close()
+
+    def drop(self, session_id):
+        """브라우저 연결이 끊겼을 때(unload) 세션을 바로 제거합니다."""
+        with self._lock:
+            evicted = [self._evict(session_id, "closed")] if session_id in self._sessions else []
+        self._close(evicted)
+
+    def enforce_limits(self, session):
+        """요청 처리 후 세션 메모리 상한을 적용합니다."""
+        if session.memory_bytes() > self.max_session_bytes:
+            session.trim(self.max_session_bytes)
+            REGISTRY.inc("face2chat_session_trims_total", help_text="메모리 상한으로 세션 상태를 비운 횟수")
+
+    def snapshot(self):
+        """현재 세션 목록 (지표 집계용 복사본)"""
+        with self._lock:
+            return list(self._sessions.values())
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def total_bytes(self):
+        return sum(s.memory_bytes() for s in self.snapshot())
+
+    def stats(self):
+        return {"sessions": len(self), "total_bytes": self.total_bytes()}
+
+    def register_gauges(self, registry=REGISTRY):
+        registry.gauge("face2chat_sessions", lambda: len(self), "현재 보관 중인 세션 수")
+        registry.gauge("face2chat_session_memory_bytes", self.total_bytes, "전체 세션 상태의 대략적인 메모리 사용량")
@@ -1,95 +1,190 @@
 # modules/speech_to_text.py
 
-import wave
 import json
 import os
-from vosk import Model, KaldiRecognizer
-import soundfile as sf
 import numpy as np
-import tempfile
-from resampy import resample # resampy 임포트
+
+from .audio_io import as_float_mono, load_audio, to_pcm16_bytes
+from .metrics import count_error, log
+from .resampler import Resampler
+from .vad import VoiceActivityDetector
+
+class SpeechStream:
+    """
+    세션 하나에 대응하는 증분 음성 인식 스트림.
+    KaldiRecognizer 하나를 계속 유지하면서 청크마다 새로 들어온 샘플만 인식기에 넣으므로,
+    청크당 비용은 그 청크의 길이에만 비례합니다.
+    vad를 지정하면 무음 청크는 인식기에 넣지 않고, 발화 끝도 VAD의 판정(hangover)을 따릅니다.
+    44.1/48kHz 입력은 스트림마다 유지하는 polyphase Resampler로 청크 경계 없이 이어서 변환합니다.
+    """
+    def __init__(self, model, sample_rate=16000, vad: VoiceActivityDetector = None, resample_quality="medium", recognizer=None):
+        """recognizer: KaldiRecognizer와 같은 메서드를 가진 인식기 (None이면 model로 KaldiRecognizer를 만듦)"""
+        if recognizer is None:
+            from vosk import KaldiRecognizer
+
+            recognizer = KaldiRecognizer(model, sample_rate)
+        self.sample_rate = sample_rate
+        self.recognizer = recognizer
+        self.vad = vad
+        self.resample_quality = resample_quality
+        self._resampler = None # 입력 샘플 레이트가 바뀌면 새로 만듦
+        self.segments = [] # 인식기가 끊어서 확정한 구간 텍스트
+        self._partial = ""
+        self.samples_fed = 0
+
+    def feed(self, chunk, sample_rate=None):
+        """
+        numpy 오디오 청크를 인식기에 넣습니다.
+        Vosk가 발화 구간의 끝(endpoint)을 감지하면 True를 반환합니다. (vad가 있으면 VAD가 발화 끝을 판정했을 때)
+        """
+        if chunk is None or chunk.size == 0:
+            return False
+
+        if self.vad is not None:
+            # 무음 청크는 리샘플링 / 인식 없이 건너뛰고, 발화 중 Vosk의 구간 끝은 segments에만 반영
+            speech, ended = self.vad.process(chunk, sample_rate or self.sample_rate)
+            if speech is not None:
+                self._accept(speech, sample_rate)
+            return ended
+        return self._accept(chunk, sample_rate)
+
+    @property
+    def in_speech(self):
+        """VAD가 발화 중으로 보고 있는지 여부 (VAD가 없으면 항상 True)"""
+        return self.vad is None or self.vad.in_speech
+
+    def _resample(self, chunk, sample_rate):
+        # 다운믹스 / 스케일링 / 리샘플링 / 클리핑 / int16 변환을 Resampler 안에서 한 번에 처리
+        if self._resampler is None or self._resampler.src_rate != sample_rate:
+            self._resampler = Resampler(sample_rate, self.sample_rate, self.resample_quality, output="int16")
+        return self._resampler.process(chunk)
+
+    def _accept(self, chunk, sample_rate):
+        # 16kHz 모노 int16 청크는 그대로 PCM 바이트로 넘어감
+        if sample_rate and sample_rate != self.sample_rate:
+            chunk = self._resample(chunk, sample_rate)
+        elif chunk.ndim > 1:
+            chunk = as_float_mono(chunk)
+        return self._accept_pcm(chunk)
+
+    def _accept_pcm(self, chunk):
+        self.samples_fed += len(chunk)
+        if self.recognizer.AcceptWaveform(to_pcm16_bytes(chunk)):
+            text = json.loads(self.recognizer.Result()).get("text", "")
+            if text:
+                self.segments.append(text)
+            self._partial = ""
+            return True
+
+        self._partial = json.loads(self.recognizer.PartialResult()).get("partial", "")
+        return False
+
+    def buffered_bytes(self):
+        """VAD / 리샘플러가 보관 중인 오디오와 확정된 구간 텍스트의 크기 (세션 메모리 집계용)"""
+        total = sum(len(t.encode("utf-8")) for t in self.segments)
+        if self.vad is not None:
+            total += self.vad.buffered_bytes()
+        if self._resampler is not None:
+            total += self._resampler.buffered_bytes()
+        return total
+
+    def reset(self):
+        """진행 중인 발화를 버리고 인식기 / VAD / 리샘플러 상태를 비웁니다."""
+        self.recognizer.Reset()
+        self.segments = []
+        self._partial = ""
+        self.samples_fed = 0
+        if self.vad is not None:
+            self.vad.reset()
+        if self._resampler is not None:
+            self._resampler.reset()
+
+    def close(self):
+        """세션이 정리될 때 호출합니다. 상태를 비우고, 인식기에 close()가 있으면(원격 인식기 등) 바로 해제합니다."""
+        self.reset()
+        close = getattr(self.recognizer, "close", None)
+        if close is not None:
+            close()
+
+    def partial(self):
+        """지금까지 확정된 구간과 진행 중인 부분 인식 결과를 합친 텍스트를 반환합니다."""
+        return " ".join(t for t in self.segments + [self._partial] if t).strip()
+
+    def finalize(self):
+        """
+        남은 오디오를 마저 인식하여 최종 텍스트를 반환하고 스트림 상태를 초기화합니다.
+        초기화 후에도 같은 인식기로 다음 발화를 계속 받을 수 있습니다.
+        """
+        if self._resampler is not None:
+            # 리샘플러가 필터 길이만큼 보관 중인 마지막 샘플까지 인식기에 넣음
+            tail = self._resampler.flush()
+            if len(tail):
+                self._accept_pcm(tail)
+        text = json.loads(self.recognizer.FinalResult()).get("text", "")
+        if text:
+            self.segments.append(text)
+        result = " ".join(self.segments).strip()
+        self.segments = []
+        self._partial = ""
+        self.samples_fed = 0
+        if self.vad is not None:
+            self.vad.reset()
+        return result
+
 
 class SpeechToText:
-    def __init__(self, model_path="models/vosk-model-small-en-us-0.15"):
+    def __init__(self, model_path="models/vosk-model-small-en-us-0.15", resample_quality="medium"):
+        """resample_quality: 44.1/48kHz 입력을 16kHz로 바꿀 때의 리샘플링 품질 (low / medium / high)"""
         print("[Vosk STT] 초기화 중...")
+        self.resample_quality = resample_quality
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"Vosk 모델을 찾을 수 없습니다: {model_path}")
+        from vosk import Model
+
         self.model = Model(model_path)
         print("[Vosk STT] 초기화 완료.")
 
-    def transcribe(self, audio_path):
-        print("[STT 디버그] 오디오 경로:", audio_path)
-        if not audio_path or not os.path.exists(audio_path): # audio_path가 None이거나 존재하지 않는 경우 처리
-            print("[STT 오류] 오디오 파일 경로가 유효하지 않습니다.")
-            return "" # 빈 문자열 반환
+    def new_recognizer(self, sample_rate=16000):
+        """공유 모델로 KaldiRecognizer를 하나 만듭니다. (모델 서버에서도 스트림마다 호출)"""
+        from vosk import KaldiRecognizer
 
-        temp_wav_file = None
-        wf = None # wave 파일 객체 초기화
-        try:
-            # soundfile을 사용하여 오디오 파일 읽기
-            # dtype='float32'로 지정하여 데이터를 float32로 읽어옵니다.
-            audio_data, samplerate = sf.read(audio_path, dtype='float32')
-
-            # Vosk는 16kHz, 1채널, 16비트 PCM 형식을 선호합니다.
-
-            # 모노 채널로 변환 (스테레오인 경우)
-            if audio_data.ndim > 1:
-                print("[STT 경고] 스테레오 오디오: 모노로 변환")
-                audio_data = audio_data.mean(axis=1) # 평균으로 모노 변환
-
-            # 샘플 레이트 변환 (필요시)
-            if samplerate != 16000:
-                print(f"[STT 경고] 샘플 레이트 불일치: {samplerate} -> 16000으로 변환 시도")
-                # resampy.resample 사용
-                audio_data = resample(audio_data, samplerate, 16000)
-                samplerate = 16000
-                print(f"[STT 경고] 리샘플링 완료. 새 샘플 레이트: {samplerate}")
-
-
-            # 16비트 정수형으로 변환
-            # float32 (-1.0 to 1.0) -> int16 (-32768 to 32767) 스케일링
-            # audio_data는 이미 float32이므로 단순히 스케일링 후 astype(np.int16)
-            audio_data_int16 = (audio_data * 32767).astype(np.int16)
-
-            # 변환된 오디오를 임시 WAV 파일로 저장
-            # delete=False를 사용하여 파일을 바로 삭제하지 않음
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as fp_wav:
-                # soundfile로 16비트 모노 WAV 저장
-                sf.write(fp_wav.name, audio_data_int16, samplerate, subtype='PCM_16')
-                temp_wav_file = fp_wav.name
-            
-            # wave 모듈로 변환된 임시 WAV 파일 열기
-            wf = wave.open(temp_wav_file, "rb")
+        return KaldiRecognizer(self.model, sample_rate)
+
+    def open_stream(self, sample_rate=16000, vad: VoiceActivityDetector = None):
+        """세션별 증분 인식을 위한 SpeechStream을 엽니다. (모델은 공유, 인식기는 세션마다 1개)"""
+        return SpeechStream(self.model, sample_rate, vad, self.resample_quality, recognizer=self.new_recognizer(sample_rate))
 
+    def warmup(self):
+        """1초 분량의 무음을 인식시켜 인식기 생성과 디코딩 그래프 로드를 미리 끝내 둡니다."""
+        self.transcribe((16000, np.zeros(16000, dtype=np.int16)))
+
+    def transcribe(self, audio):
+        """
+        오디오 전체를 한 번에 인식합니다.
+        audio: (sample_rate, numpy_array) 튜플 또는 파일 경로
+        임시 WAV 파일 없이 PCM 버퍼를 바로 KaldiRecognizer에 넣습니다.
+        """
+        log("[STT 디버그] 오디오 입력:", audio if isinstance(audio, str) else type(audio))
+        try:
+            audio_data, samplerate = load_audio(audio)
         except Exception as e:
-            print(f"[STT 오류] 오디오 변환 또는 wave 파일 열기 실패: {e}")
+            count_error("stt")
+            print(f"[STT 오류] 오디오 읽기 실패: {e}")
             return "" # 빈 문자열 반환
-        finally:
-            # 임시 파일 정리. 파일을 모두 사용한 후 삭제.
-            if temp_wav_file and os.path.exists(temp_wav_file):
-                os.remove(temp_wav_file)
-
-
-        # Vosk 모델이 요구하는 최종 WAV 형식 확인 (선택 사항, 이미 변환했으므로 통과되어야 함)
-        if wf.getnchannels() != 1 or wf.getsampwidth() != 2 or wf.getcomptype() != "NONE":
-            print(f"[STT 오류] 최종 wav 형식 문제: 채널={wf.getnchannels()}, 비트={wf.getsampwidth()*8}, 압축={wf.getcomptype()}")
-            # wf 객체가 유효하면 닫아줍니다.
-            if wf:
-                wf.close()
+
+        if audio_data is None or audio_data.size == 0: # 입력이 None이거나 존재하지 않는 경우 처리
+            log("[STT 오류] 오디오 입력이 유효하지 않습니다.")
             return "" # 빈 문자열 반환
 
-        rec = KaldiRecognizer(self.model, wf.getframerate())
-        result = ""
-        while True:
-            data = wf.readframes(4000)
-            if len(data) == 0:
-                break
-            if rec.AcceptWaveform(data):
-                partial = json.loads(rec.Result())
-                result += partial.get("text", "") + " "
-        partial = json.loads(rec.FinalResult())
-        result += partial.get("text", "")
-
-        wf.close() # wave 파일 닫기
-        print(f"[STT 결과] {result.strip()}")
-        return result.strip()
\ No newline at end of file
+        # Vosk는 16kHz, 1채널, 16비트 PCM 형식을 선호합니다. (변환은 SpeechStream.feed에서 처리)
+        stream = self.open_stream()
+        try:
+            stream.feed(audio_data, samplerate)
+            result = stream.finalize()
+        except Exception as e:
+            count_error("stt")
+            print(f"[STT 오류] 음성 인식 실패: {e}")
+            return ""
+
+        log(f"[STT 결과] {result}")
+        return result
@@ -0,0 +1,112 @@
+# modules/startup.py
+# 서버 시작 단계 관리
+# - 무거운 모델(DeepFace, YOLO, Vosk 등)을 백그라운드 스레드에서 동시에 로드
+# - 각 구성요소의 import / 초기화 / 워밍업 시간을 따로 측정
+# - 모든 워밍업이 끝난 뒤에만 ready 상태가 되도록 하여, 첫 실제 요청이 콜드 스타트 비용을 치르지 않게 함
+#
+# 사용 예:
+#   startup = Startup()
+#   startup.add("vision_analyzer", VisionAnalyzer, imports=("ultralytics",))
+#   startup.start()                       # 백그라운드에서 로드 시작
+#   vision = startup.get("vision_analyzer")  # 필요할 때 완료를 기다림
+#   startup.warmup({"vision_analyzer": vision.warmup})
+#   startup.report()
+
+import importlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Startup:
+    def __init__(self, max_workers=4):
+        self.timings = {} # 구성요소 이름 -> {"import_s", "init_s", "warmup_s"}
+        self.errors = {}
+        self.ready = threading.Event()
+        self._components = {} # 이름 -> (factory, imports)
+        self._futures = {}
+        self._started_at = time.perf_counter()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="startup")
+
+    def add(self, name, factory, imports=()):
+        """
+        로드할 구성요소를 등록합니다.
+        factory: 인자 없이 구성요소 객체를 만드는 함수
+        imports: factory 실행 전에 미리 import해 둘 무거운 모듈 이름 (import 시간을 따로 측정)
+        """
+        self._components[name] = (factory, imports)
+
+    def _load(self, name):
+        factory, imports = self._components[name]
+        timing = self.timings.setdefault(name, {})
+        t0 = time.perf_counter()
+        for module_name in imports:
+            importlib.import_module(module_name)
+        t1 = time.perf_counter()
+        component = factory()
+        t2 = time.perf_counter()
+        timing["import_s"] = t1 - t0
+        timing["init_s"] = t2 - t1
+        print(f"[시작] {name} 로드 완료 (import {t1 - t0:.2f}s, 초기화 {t2 - t1:.2f}s)")
+        return component
+
+    def start(self):
+        """등록된 모든 구성요소를 백그라운드 스레드에서 동시에 로드하기 시작합니다."""
+        for name in self._components:
+            if name not in self._futures:
+                self._futures[name] = self._executor.submit(self._load, name)
+        return self
+
+    def get(self, name):
+        """구성요소 로드가 끝날 때까지 기다렸다가 반환합니다. 로드 중 예외는 그대로 다시 발생합니다."""
+        if name not in self._futures:
+            self._futures[name] = self._executor.submit(self._load, name)
+        try:
+            return self._futures[name].result()
+        except Exception as e:
+            self.errors[name] = repr(e)
+            raise
+
+    def warmup(self, steps):
+        """
+        {이름: 인자 없는 함수} 형태의 워밍업 단계를 동시에 실행하고, 모두 끝나면 ready 상태로 바꿉니다.
+        워밍업 실패는 서버 시작을 막지 않고 기록만 남깁니다. (첫 요청이 조금 느려질 뿐)
+        """
+        def run(name, fn):
+            t0 = time.perf_counter()
+            try:
+                fn()
+            except Exception as e:
+                self.errors[f"{name}.warmup"] = repr(e)
+                print(f"[시작] {name} 워밍업 실패: {e}")
+            self.timings.setdefault(name, {})["warmup_s"] = time.perf_counter() - t0
+
+        futures = [self._executor.submit(run, name, fn) for name, fn in steps.items()]
+        for future in futures:
+            future.result()
+        self.ready.set()
+        return self
+
+    def summary(self):
+        return {
+            "total_s": time.perf_counter() - self._started_at,
+            "ready": self.ready.is_set(),
+            "components": self.timings,
+            "errors": self.errors,
+        }
+
+    def report(self, export_path=None):
+        """구성요소별 시작 시간표를 출력하고, export_path가 있으면 JSON으로도 저장합니다."""
+        summary = self.summary()
+        print("[시작] 구성요소별 시작 시간 (초)")
+        print(f"  {'구성요소':<20}{'import':>10}{'초기화':>10}{'워밍업':>10}")
+        for name, timing in summary["components"].items():
+            print(f"  {name:<20}{timing.get('import_s', 0):>10.2f}{timing.get('init_s', 0):>10.2f}{timing.get('warmup_s', 0):>10.2f}")
+        print(f"  전체 경과: {summary['total_s']:.2f}s, ready={summary['ready']}")
+        for name, error in summary["errors"].items():
+            print(f"  ❗ {name}: {error}")
+        if export_path:
+            with open(export_path, "w", encoding="utf-8") as fp:
+                json.dump(summary, fp, indent=2, ensure_ascii=False)
+        return summary
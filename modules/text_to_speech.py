@@ -1,52 +1,155 @@
-from gtts import gTTS
 import numpy as np
-import soundfile as sf
-import tempfile
-import os
+import re
+
+from .tts_backends import GTTSBackend, TTSBackend
+from .tts_cache import AudioCache
+from .metrics import count_fallback, log
+
+# 문장 끝(. ! ? … 。)과 줄바꿈에서 자르고, 너무 긴 문장은 쉼표 등 절 경계에서 한 번 더 자름
+_SENTENCE_END = re.compile(r'(?<=[.!?…。])\s+|\n+')
+_CLAUSE_END = re.compile(r'(?<=[,;:])\s+')
+
+
+def split_sentences(text, max_chars=100):
+    """
+    응답 텍스트를 문장(또는 절) 단위 조각으로 나눕니다.
+    첫 조각을 빨리 합성해서 재생을 먼저 시작할 수 있도록, 각 조각은 max_chars를 넘지 않게 합니다.
+    """
+    chunks = []
+    for sentence in _SENTENCE_END.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if len(sentence) <= max_chars:
+            chunks.append(sentence)
+            continue
+        current = ""
+        for clause in _CLAUSE_END.split(sentence):
+            # 절 하나가 max_chars보다 길면 단어 경계에서 자름
+            while len(clause) > max_chars:
+                cut = clause.rfind(" ", 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                if current:
+                    chunks.append(current)
+                    current = ""
+                chunks.append(clause[:cut].strip())
+                clause = clause[cut:].strip()
+            if current and len(current) + 1 + len(clause) > max_chars:
+                chunks.append(current)
+                current = clause
+            else:
+                current = f"{current} {clause}".strip()
+        if current:
+            chunks.append(current)
+    return chunks
+
+
+def pop_complete_sentences(buffer):
+    """
+    스트리밍으로 받고 있는 텍스트를 (끝난 문장들, 아직 끝나지 않은 나머지)로 나눕니다.
+    LLM 응답을 받는 도중에 끝난 문장부터 합성할 때 사용합니다.
+    """
+    end = 0
+    for match in _SENTENCE_END.finditer(buffer):
+        end = match.end()
+    return buffer[:end], buffer[end:]
+
 
 class TextToSpeech:
+    def __init__(self, lang='ko', cache: AudioCache = None, backend: TTSBackend = None):
+        """
+        lang: gTTS 언어 코드
+        cache: 지정하면 (text, lang, backend) 단위로 합성 결과를 재사용
+        backend: 합성 백엔드 (기본값은 gTTS 라이브러리, tts_backends.create_backend로 교체 가능)
+        """
+        self.lang = lang
+        self.backend = backend or GTTSBackend()
+        self.backend_name = self.backend.name
+        self.cache = cache
+
+    @staticmethod
+    def _silence(duration_sec):
+        sample_rate = 44100
+        return np.zeros(int(sample_rate * duration_sec), dtype=np.float32), sample_rate
+
     def synthesize(self, text): # speak -> synthesize로 변경
         """
         텍스트를 음성으로 변환하여 Gradio가 요구하는 형식 (numpy.ndarray, sample_rate) 으로 반환합니다.
-        gTTS는 MP3를 생성하므로 임시 파일을 사용하여 변환 후 numpy 배열로 읽어옵니다.
+        백엔드가 생성한 MP3는 임시 파일 없이 메모리 버퍼에서 바로 numpy 배열로 디코딩합니다.
         """
         if not text:
-            sample_rate = 44100
-            duration_sec = 0.5
-            silence = np.zeros(int(sample_rate * duration_sec), dtype=np.float32)
-            print("No text for TTS. Returning silence.")
-            return silence, sample_rate
+            log("No text for TTS. Returning silence.")
+            return self._silence(0.5)
 
-        temp_audio_file = None
+        if self.cache is not None:
+            cached = self.cache.get(text, self.lang, self.backend_name)
+            if cached is not None:
+                return cached
 
         try:
             # 언어 설정: 'KO' -> 'ko'로 수정
-            tts = gTTS(text=text, lang='ko') # ⭐️ 'KO' -> 'ko'로 수정 ⭐️
+            audio_data, sample_rate = self.backend.synthesize(text, self.lang)
+            return self._finish(text, audio_data, sample_rate)
+        except Exception as e:
+            count_fallback("tts", "error")
+            print(f"Error in TextToSpeech synthesis: {e}")
+            log("TTS failed. Returning silence.")
+            return self._silence(1.0)
 
-            # 임시 파일에 저장
-            with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as fp_mp3:
-                tts.save(fp_mp3.name)
-                temp_audio_file = fp_mp3.name
+    def _finish(self, text, audio_data, sample_rate):
+        log(f"Synthesized audio with sample rate: {sample_rate}, shape: {audio_data.shape}")
+        if self.cache is not None:
+            # 실패 시의 무음은 캐시하지 않고, 성공한 합성 결과만 저장
+            return self.cache.put(text, self.lang, self.backend_name, audio_data, sample_rate)
+        return audio_data, sample_rate
+
+    def synthesize_stream(self, text, max_chars=100):
+        """
+        응답을 문장 단위로 나누어 합성하고, 조각이 준비되는 즉시 (numpy.ndarray, sample_rate)를 순서대로 yield합니다.
+        첫 오디오까지의 시간이 전체 응답이 아니라 첫 문장 합성 시간에 좌우됩니다.
+        캐시에 없는 조각은 처음에 한꺼번에 백엔드에 요청하므로, 동시 합성을 지원하는 백엔드에서는
+        첫 조각을 재생하는 동안 뒤 조각이 미리 준비됩니다. 감정 접두어처럼 자주 나오는 문장은 캐시에서 바로 나옵니다.
+        """
+        chunks = split_sentences(text, max_chars) if text else []
+        if not chunks:
+            yield self.synthesize("")
+            return
 
-            # 사운드 파일 로딩 (MP3를 numpy 배열로)
-            audio_data, sample_rate = sf.read(temp_audio_file)
-            audio_data = audio_data.astype(np.float32) # Gradio는 float32를 선호
+        pending = {}
+        for chunk in chunks:
+            if chunk in pending or (self.cache is not None and self.cache.contains(chunk, self.lang, self.backend_name)):
+                continue
+            pending[chunk] = self.backend.synthesize_async(chunk, self.lang)
 
-            # SF.read는 스테레오 오디오의 경우 (N, 2) 형태를 반환할 수 있으므로, 모노로 변환
-            if audio_data.ndim > 1:
-                audio_data = audio_data.mean(axis=1)
+        for chunk in chunks:
+            future = pending.pop(chunk, None)
+            if future is None:
+                yield self.synthesize(chunk) # 캐시 적중 (또는 앞에서 이미 합성한 같은 문장)
+                continue
+            try:
+                audio_data, sample_rate = future.result()
+                yield self._finish(chunk, audio_data, sample_rate)
+            except Exception as e:
+                count_fallback("tts", "error")
+                print(f"Error in TextToSpeech synthesis: {e}")
+                yield self._silence(0.3)
 
-            print(f"Synthesized audio with sample rate: {sample_rate}, shape: {audio_data.shape}")
-            return audio_data, sample_rate
+    def warmup(self, phrase):
+        """
+        캐시를 거치지 않고 백엔드로 phrase를 한 번 합성합니다. (결과는 캐시에 저장)
+        백엔드 라이브러리 import, DNS / TLS 연결, MP3 디코더 로드를 첫 실제 응답 전에 끝내 둡니다.
+        """
+        audio_data, sample_rate = self.backend.synthesize(phrase, self.lang)
+        self._finish(phrase, audio_data, sample_rate)
 
-        except Exception as e:
-            print(f"Error in TextToSpeech synthesis: {e}")
-            sample_rate = 44100
-            duration_sec = 1.0
-            silence = np.zeros(int(sample_rate * duration_sec), dtype=np.float32)
-            print("TTS failed. Returning silence.")
-            return silence, sample_rate
-
-        finally:
-            if temp_audio_file and os.path.exists(temp_audio_file):
-                os.remove(temp_audio_file) # 임시 MP3 파일 정리
\ No newline at end of file
+    def prewarm(self, phrases):
+        """고정 문구를 미리 합성하여 캐시에 채워 둡니다. 캐시가 없으면 아무 일도 하지 않습니다."""
+        if self.cache is None:
+            return 0
+        warmed = 0
+        for phrase in dict.fromkeys(p for p in phrases if p):
+            if not self.cache.contains(phrase, self.lang, self.backend_name):
+                self.synthesize(phrase)
+            warmed += 1
+        print(f"[TTS 캐시] 고정 문구 {warmed}개 준비 완료: {self.cache.stats()}")
+        return warmed
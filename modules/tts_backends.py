@@ -0,0 +1,177 @@
+# modules/tts_backends.py
+# TextToSpeech가 사용하는 합성 백엔드
+# - GTTSBackend: gTTS 라이브러리를 그대로 사용 (호출마다 새 HTTP 연결)
+# - GoogleTranslateHTTPBackend: gTTS와 같은 Google Translate TTS 프로토콜을 직접 호출.
+#   하나의 requests.Session을 재사용하여 keep-alive 연결 풀, 타임아웃, 재시도를 설정할 수 있고
+#   여러 조각을 동시에 합성할 수 있습니다. base_url을 mock_tts_server로 바꾸면 오프라인 벤치마크가 가능합니다.
+
+import base64
+import io
+import json
+import re
+import threading
+import urllib.parse
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .audio_io import copy_stats, decode_audio_bytes
+
+
+class TTSBackend:
+    """합성 백엔드 기본 클래스. 하위 클래스는 name과 synthesize_bytes()를 구현합니다."""
+    name = "base"
+
+    def synthesize_bytes(self, text, lang):
+        """text를 합성한 인코딩된 오디오(MP3/WAV 등) 바이트를 반환합니다."""
+        raise NotImplementedError
+
+    def synthesize(self, text, lang):
+        """text를 합성하여 (float32 모노 numpy 배열, sample_rate)를 반환합니다."""
+        return decode_audio_bytes(self.synthesize_bytes(text, lang))
+
+    def synthesize_async(self, text, lang):
+        """
+        합성을 시작하고 (audio, sample_rate)를 결과로 갖는 Future를 반환합니다.
+        기본 구현은 호출 즉시 동기적으로 합성합니다. (동시 합성을 지원하는 백엔드는 재정의)
+        """
+        future = Future()
+        try:
+            future.set_result(self.synthesize(text, lang))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def close(self):
+        pass
+
+
+class GTTSBackend(TTSBackend):
+    name = "gtts"
+
+    def synthesize_bytes(self, text, lang):
+        from gtts import gTTS
+
+        # 메모리 버퍼에 MP3 저장
+        mp3_buffer = io.BytesIO()
+        gTTS(text=text, lang=lang).write_to_fp(mp3_buffer)
+        copy_stats.add(mp3_buffer.tell(), "tts_mp3")
+        return mp3_buffer.getvalue()
+
+
+class GoogleTranslateHTTPBackend(TTSBackend):
+    """
+    gTTS 호환 HTTP 백엔드. gTTS와 같은 batchexecute(jQ1olc) 요청을 보내지만
+    연결 풀이 있는 세션 하나를 계속 재사용하므로 짧은 응답에서 TLS 핸드셰이크 비용이 사라집니다.
+    """
+    name = "gtts-http"
+    RPC_ID = "jQ1olc"
+    PATH = "/_/TranslateWebserverUi/data/batchexecute"
+    MAX_CHARS = 100 # Google TTS가 한 번에 받는 최대 글자 수 (gTTS와 동일)
+    _AUDIO_PATTERN = re.compile(r'jQ1olc","\[\\"(.*)\\"]')
+
+    def __init__(self, base_url="https://translate.google.com", timeout=(3.05, 10.0), retries=2,
+                 backoff_factor=0.2, pool_size=8, concurrency=4):
+        """
+        base_url: TTS 서버 주소 (오프라인 테스트 시 mock_tts_server 주소)
+        timeout: (연결, 읽기) 타임아웃 초
+        retries / backoff_factor: 연결 오류 및 429/5xx 응답에 대한 재시도 정책
+        pool_size: 호스트당 유지할 keep-alive 연결 수
+        concurrency: 동시에 보낼 수 있는 최대 요청 수
+        """
+        self.url = base_url.rstrip("/") + self.PATH
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=None) # batchexecute는 POST지만 같은 요청을 다시 보내도 안전함
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Referer": "http://translate.google.com/",
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+            "Content-Type": "application/x-www-form-urlencoded;charset=utf-8",
+        })
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="tts-http")
+
+    def _package_rpc(self, text, lang):
+        parameter = json.dumps([text, lang, None, "null"], separators=(",", ":"))
+        rpc = json.dumps([[[self.RPC_ID, parameter, None, "generic"]]], separators=(",", ":"))
+        return "f.req={}&".format(urllib.parse.quote(rpc))
+
+    def _request_part(self, text, lang):
+        response = self.session.post(self.url, data=self._package_rpc(text, lang), timeout=self.timeout)
+        response.raise_for_status()
+        for line in response.text.splitlines():
+            if self.RPC_ID in line:
+                match = self._AUDIO_PATTERN.search(line)
+                if match:
+                    return base64.b64decode(match.group(1))
+        raise RuntimeError("TTS 응답에서 오디오를 찾을 수 없습니다.")
+
+    def synthesize_bytes(self, text, lang):
+        # 한 조각(MAX_CHARS 이하)만 처리. 긴 텍스트는 synthesize()가 잘라서 합침
+        return self._request_part(text, lang)
+
+    def synthesize(self, text, lang):
+        return self.synthesize_async(text, lang).result()
+
+    def _synthesize_part(self, text, lang):
+        return decode_audio_bytes(self._request_part(text, lang))
+
+    def synthesize_async(self, text, lang):
+        """
+        연결 풀을 공유하는 작업 스레드에서 합성합니다. 여러 조각을 동시에 요청할 때 사용합니다.
+        MAX_CHARS보다 긴 텍스트는 조각들을 동시에 요청한 뒤 PCM으로 이어 붙입니다.
+        """
+        from .text_to_speech import split_sentences
+
+        parts = split_sentences(text, self.MAX_CHARS) or [text]
+        futures = [self._executor.submit(self._synthesize_part, part, lang) for part in parts]
+        if len(futures) == 1:
+            return futures[0]
+        return self._concat_when_done(futures)
+
+    @staticmethod
+    def _concat_when_done(futures):
+        # 작업 스레드를 막고 기다리지 않도록, 모든 조각이 끝나면 콜백에서 결과를 합침
+        combined = Future()
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def on_done(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0] > 0:
+                    return
+            try:
+                decoded = [f.result() for f in futures]
+                audio = np.concatenate([a for a, _ in decoded])
+                copy_stats.add(audio.nbytes, "tts_concat")
+                combined.set_result((audio, decoded[0][1]))
+            except Exception as e:
+                combined.set_exception(e)
+
+        for future in futures:
+            future.add_done_callback(on_done)
+        return combined
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+
+BACKENDS = {
+    GTTSBackend.name: GTTSBackend,
+    GoogleTranslateHTTPBackend.name: GoogleTranslateHTTPBackend,
+}
+
+
+def create_backend(name, **kwargs):
+    """이름으로 TTS 백엔드를 생성합니다. (예: FACE2CHAT_TTS_BACKEND=gtts-http)"""
+    if name not in BACKENDS:
+        raise ValueError(f"알 수 없는 TTS 백엔드: {name} (사용 가능: {', '.join(BACKENDS)})")
+    return BACKENDS[name](**kwargs)
@@ -0,0 +1,184 @@
+# modules/tts_cache.py
+# TTS 결과 오디오 캐시 (2단계)
+# 1) 메모리 LRU: 디코딩된 float32 PCM을 바이트 예산(max_bytes) 안에서 보관
+# 2) 디스크(선택): cache_dir에 .npz로 저장하여 프로세스 재시작 후에도 재사용
+#    disk_max_bytes를 넘으면 가장 오래 쓰이지 않은(mtime 기준) 파일부터 삭제. 읽을 때 mtime을 갱신
+# 키는 (text, lang, backend)이며, 고정 문구(대체 응답, 감정 접두어 등)는 시작 시 미리 채워 둘 수 있습니다.
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class AudioCache:
+    def __init__(self, max_bytes=32 * 1024 * 1024, cache_dir=None, disk_max_bytes=512 * 1024 * 1024):
+        """
+        max_bytes: 메모리 캐시가 보관할 최대 PCM 바이트 수
+        cache_dir: 디코딩된 PCM을 저장할 디렉토리 (None이면 디스크 캐시 사용 안 함)
+        disk_max_bytes: 디스크 캐시가 보관할 최대 파일 바이트 수
+        """
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.current_bytes = 0
+        self.disk_bytes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_evictions = 0
+        self._entries = OrderedDict() # key -> (audio, sample_rate)
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            with self._disk_lock:
+                self._evict_disk() # 이전 실행이 남긴 파일 크기를 세고, 상한이 줄었으면 정리
+
+    @staticmethod
+    def make_key(text, lang, backend):
+        return hashlib.sha1(f"{backend}\0{lang}\0{text}".encode("utf-8")).hexdigest()
+
+    def get(self, text, lang, backend):
+        """캐시된 (audio, sample_rate)를 반환합니다. 없으면 None."""
+        key = self.make_key(text, lang, backend)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return entry
+
+        entry = self._load_from_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, entry)
+        return entry
+
+    def contains(self, text, lang, backend):
+        """적중/미적중 통계에 영향을 주지 않고 캐시 존재 여부만 확인합니다."""
+        key = self.make_key(text, lang, backend)
+        with self._lock:
+            if key in self._entries:
+                return True
+        return bool(self.cache_dir) and os.path.exists(self._disk_path(key))
+
+    def put(self, text, lang, backend, audio, sample_rate):
+        """합성 결과를 캐시에 넣습니다. 캐시된 배열은 공유되므로 읽기 전용으로 표시합니다."""
+        key = self.make_key(text, lang, backend)
+        audio = np.ascontiguousarray(audio, dtype=np.float32)
+        audio.flags.writeable = False
+        entry = (audio, int(sample_rate))
+        with self._lock:
+            self._store(key, entry)
+        self._save_to_disk(key, entry)
+        return entry
+
+    def _store(self, key, entry):
+        # 호출자가 self._lock을 잡고 있어야 함
+        nbytes = entry[0].nbytes
+        if nbytes > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.current_bytes -= old[0].nbytes
+        self._entries[key] = entry
+        self.current_bytes += nbytes
+        while self.current_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.current_bytes -= evicted[0].nbytes
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def _load_from_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                audio = data["audio"]
+                audio.flags.writeable = False
+                entry = audio, int(data["sample_rate"])
+        except Exception as e:
+            print(f"[TTS 캐시] 디스크 캐시 읽기 실패 ({path}): {e}")
+            return None
+        try:
+            os.utime(path) # 최근에 쓰인 파일은 나중에 삭제되도록
+        except OSError:
+            pass # 다른 프로세스가 방금 삭제함
+        return entry
+
+    def _save_to_disk(self, key, entry):
+        if not self.cache_dir:
+            return
+        if entry[0].nbytes > self.disk_max_bytes:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as fp:
+                np.savez(fp, audio=entry[0], sample_rate=entry[1])
+            os.replace(tmp_path, path) # 다른 프로세스가 반쯤 쓴 파일을 읽지 않도록 원자적으로 교체
+            size = os.path.getsize(path)
+        except Exception as e:
+            print(f"[TTS 캐시] 디스크 캐시 저장 실패 ({path}): {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        with self._disk_lock:
+            self.disk_bytes += size
+            if self.disk_bytes > self.disk_max_bytes:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        """
+        디렉토리를 다시 세어(다른 프로세스와 공유될 수 있으므로) 상한을 넘은 만큼 오래된 파일부터 삭제합니다.
+        호출자가 self._disk_lock을 잡고 있어야 함
+        """
+        files = []
+        with os.scandir(self.cache_dir) as it:
+            for item in it:
+                if not item.name.endswith(".npz"):
+                    continue
+                try:
+                    st = item.stat()
+                except OSError:
+                    continue # 다른 프로세스가 방금 삭제함
+                files.append((st.st_mtime, st.st_size, item.path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+                self.disk_evictions += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"[TTS 캐시] 디스크 캐시 삭제 실패 ({path}): {e}")
+                continue
+            total -= size
+        self.disk_bytes = total
+
+    def stats(self):
+        hits = self.memory_hits + self.disk_hits
+        total = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / total if total else 0.0,
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "disk_bytes": self.disk_bytes,
+            "disk_evictions": self.disk_evictions,
+        }
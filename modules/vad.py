@@ -0,0 +1,136 @@
+# modules/vad.py
+# 에너지 / 영교차율(ZCR) 기반 음성 구간 검출 (VAD)과 발화 끝 판정
+# live=True 스트리밍에서는 무음 청크도 매번 STT로 들어가고, 문장 중간의 짧은 쉼에도 응답이 나가곤 했습니다.
+# VoiceActivityDetector를 SpeechStream 앞에 두면
+# - 무음 청크는 리샘플링 / 인식기에 전혀 넣지 않고 건너뛰며
+# - 음성이 min_speech_ms 이상 이어질 때만 발화 시작으로 보고 (짧은 잡음 무시)
+# - 발화 시작 직전 pre_roll_ms 분량은 링 버퍼에서 꺼내 함께 넘겨 첫 음절이 잘리지 않게 하고
+# - 음성이 끝난 뒤 hangover_ms 동안 무음이 이어져야 발화 끝으로 판정합니다.
+
+import math
+from collections import deque
+
+import numpy as np
+
+from .audio_io import as_float_mono
+from .metrics import REGISTRY
+
+
+class VoiceActivityDetector:
+    def __init__(self, frame_ms=30, energy_threshold_db=-45.0, noise_margin_db=10.0, zcr_max=0.35,
+                 min_speech_ms=150, hangover_ms=600, pre_roll_ms=300):
+        """
+        frame_ms: 판정 단위 프레임 길이
+        energy_threshold_db: 음성으로 볼 최소 프레임 에너지 (dBFS)
+        noise_margin_db: 무음 구간에서 추정한 배경 잡음보다 이만큼 커야 음성으로 판정 (적응형 임계값)
+        zcr_max: 이보다 영교차율이 높은 프레임은 잡음(바람, 치찰음 잡음 등)으로 봄
+        min_speech_ms: 발화 시작으로 인정할 최소 연속 음성 길이
+        hangover_ms: 발화 끝으로 판정하기까지 기다리는 무음 길이
+        pre_roll_ms: 발화 시작 시 함께 넘길 직전 오디오 길이
+        """
+        self.frame_ms = frame_ms
+        self.energy_threshold_db = energy_threshold_db
+        self.noise_margin_db = noise_margin_db
+        self.zcr_max = zcr_max
+        self.min_speech_frames = max(1, math.ceil(min_speech_ms / frame_ms))
+        self.hangover_frames = max(1, math.ceil(hangover_ms / frame_ms))
+        self.pre_roll_frames = math.ceil(pre_roll_ms / frame_ms)
+        self.noise_floor_db = energy_threshold_db - noise_margin_db
+        self.chunks = 0
+        self.skipped_chunks = 0
+        self.utterances = 0
+        self.reset()
+
+    def reset(self):
+        """발화 상태와 버퍼를 비웁니다. (배경 잡음 추정치와 통계는 유지)"""
+        self.in_speech = False
+        self._ring = deque(maxlen=self.pre_roll_frames + self.min_speech_frames) # 발화 확정 전 프레임
+        self._remainder = None # 프레임 길이에 못 미쳐 다음 청크로 넘기는 샘플
+        self._sample_rate = None
+        self._speech_run = 0
+        self._silence_run = 0
+
+    def buffered_bytes(self):
+        """링 버퍼와 다음 청크로 넘길 샘플의 크기"""
+        remainder = self._remainder.nbytes if self._remainder is not None else 0
+        return sum(frame.nbytes for frame in self._ring) + remainder
+
+    def threshold_db(self):
+        return max(self.energy_threshold_db, self.noise_floor_db + self.noise_margin_db)
+
+    def _frames(self, chunk, sample_rate):
+        """청크를 (프레임 view 목록, 프레임별 에너지 dB, 프레임별 ZCR)로 나눕니다."""
+        if chunk.ndim > 1:
+            chunk = as_float_mono(chunk)
+        if sample_rate != self._sample_rate:
+            self._remainder = None
+            self._sample_rate = sample_rate
+        if self._remainder is not None and self._remainder.dtype == chunk.dtype:
+            chunk = np.concatenate([self._remainder, chunk])
+        frame_len = max(1, int(sample_rate * self.frame_ms / 1000))
+        n = len(chunk) // frame_len
+        self._remainder = chunk[n * frame_len:] if len(chunk) % frame_len else None
+        if n == 0:
+            return [], None, None
+
+        frames = chunk[:n * frame_len].reshape(n, frame_len)
+        scale = 1.0 / np.iinfo(chunk.dtype).max if np.issubdtype(chunk.dtype, np.integer) else 1.0
+        x = frames.astype(np.float32) * np.float32(scale)
+        energy_db = 10.0 * np.log10(np.mean(x * x, axis=1) + 1e-10)
+        zcr = np.mean(np.signbit(x[:, 1:]) != np.signbit(x[:, :-1]), axis=1)
+        return list(frames), energy_db, zcr
+
+    def process(self, chunk, sample_rate):
+        """
+        오디오 청크를 처리하여 (STT로 넘길 오디오 또는 None, 발화 끝 여부)를 반환합니다.
+        넘길 오디오는 입력과 같은 샘플 레이트 / dtype(다채널 입력은 float32 모노)입니다.
+        """
+        self.chunks += 1
+        frames, energy_db, zcr = self._frames(np.asarray(chunk), sample_rate)
+        emitted = []
+        ended = False
+        for frame, db, z in zip(frames, energy_db if energy_db is not None else (), zcr if zcr is not None else ()):
+            is_speech = db > self.threshold_db() and z <= self.zcr_max
+            if not is_speech and not self.in_speech:
+                # 무음 구간의 에너지로 배경 잡음 추정 (천천히 따라감)
+                self.noise_floor_db = 0.95 * self.noise_floor_db + 0.05 * float(db)
+
+            if not self.in_speech:
+                self._ring.append(frame)
+                self._speech_run = self._speech_run + 1 if is_speech else 0
+                if self._speech_run >= self.min_speech_frames:
+                    # 발화 시작: 링 버퍼의 직전 오디오(pre-roll)와 확정된 음성 프레임을 함께 넘김
+                    self.in_speech = True
+                    self._silence_run = 0
+                    emitted.extend(self._ring)
+                    self._ring.clear()
+                continue
+
+            emitted.append(frame)
+            self._silence_run = 0 if is_speech else self._silence_run + 1
+            if self._silence_run >= self.hangover_frames:
+                self.in_speech = False
+                self._speech_run = 0
+                self.utterances += 1
+                ended = True
+                REGISTRY.inc("face2chat_vad_utterances_total", help_text="VAD가 발화 끝을 판정한 횟수")
+                break # 발화 끝 이후의 프레임은 다음 발화를 위해 버림 (다음 청크부터 다시 판정)
+
+        if ended:
+            self._ring.clear()
+            self._remainder = None
+        if not emitted:
+            self.skipped_chunks += 1
+            REGISTRY.inc("face2chat_vad_chunks_total", help_text="VAD가 처리한 오디오 청크 수", result="skipped")
+            return None, ended
+        REGISTRY.inc("face2chat_vad_chunks_total", help_text="VAD가 처리한 오디오 청크 수", result="speech")
+        return (emitted[0] if len(emitted) == 1 else np.concatenate(emitted)), ended
+
+    def stats(self):
+        return {
+            "chunks": self.chunks,
+            "skipped_chunks": self.skipped_chunks,
+            "skip_rate": self.skipped_chunks / self.chunks if self.chunks else 0.0,
+            "utterances": self.utterances,
+            "noise_floor_db": self.noise_floor_db,
+        }
@@ -1,18 +1,40 @@
 # modules/vision_analyzer.py
-from ultralytics import YOLO
 import cv2
 import numpy as np
 import os # 파일 경로 확인용
 
+from .frame_preprocess import Frame
+from .metrics import count_error, log
+
 class VisionAnalyzer:
-    def __init__(self, model_path="yolov8n.pt"):
-        print(f"(시각 분석기) {model_path} 모델 초기화 중...")
+    # 전처리된 Frame에서 꺼내 쓸 입력 해상도 (긴 변). YOLO가 어차피 640으로 letterbox하므로 그 이상은 불필요
+    input_size = 640
+
+    def __init__(self, model_path="yolov8n.pt", backend="torch", onnx_path=None, threads=None):
+        """
+        backend: "torch"(ultralytics 기본) 또는 "onnx"(ONNX Runtime, onnx_path의 fp32/int8 모델)
+        threads: ONNX Runtime 세션의 스레드 수 (torch 백엔드에서는 사용하지 않음)
+        """
         self.model = None
+        self.backend = backend
+        if backend == "onnx":
+            from .onnx_backend import OnnxYOLO, onnx_paths
+
+            onnx_path = onnx_path or onnx_paths()[0]
+            print(f"(시각 분석기) {onnx_path} ONNX 모델 초기화 중...")
+            # ONNX 모델이 없으면 예외를 그대로 올려서 잘못된 설정을 바로 알 수 있게 함
+            self.model = OnnxYOLO(onnx_path, threads=threads)
+            print("(시각 분석기) ONNX Runtime YOLO 모델 초기화 완료.")
+            return
+
+        print(f"(시각 분석기) {model_path} 모델 초기화 중...")
         try:
             # YOLOv8 모델 로드
             # 모델 파일이 없으면 자동으로 다운로드 시도 (인터넷 연결 필요)
             # models 디렉토리에 있는지 확인하고 없으면 다운로드.
             # ultralytics는 기본적으로 캐시 디렉토리에 다운로드합니다.
+            from ultralytics import YOLO # torch 포함 import가 무거우므로 실제로 모델을 만들 때 불러옴
+
             self.model = YOLO(model_path)
             print("(시각 분석기) YOLO 모델 초기화 완료.")
         except Exception as e:
@@ -23,55 +45,89 @@ class VisionAnalyzer:
             print("https://github.com/ultralytics/ultralytics/releases/download/v8.2.0/yolov8n.pt")
 
 
-    def analyze_scene(self, image):
-        if self.model is None:
-            return "시각 분석기 모델이 로드되지 않았습니다."
+    def warmup(self):
+        """빈 프레임으로 한 번 추론하여 첫 요청 전에 모델 융합(fuse)과 메모리 할당을 끝내 둡니다."""
+        if self.model is not None:
+            self.model.predict(np.zeros((480, 640, 3), dtype=np.uint8), conf=0.5, verbose=False)
 
+    def _load_image(self, image):
+        """입력 이미지를 numpy 배열로 변환합니다. 실패 시 (None, 오류 메시지)를 반환합니다."""
         img_to_process = None
+        if isinstance(image, Frame): # 파이프라인의 프레임 전처리 단계를 거친 입력 (검증 / BGR 변환 완료)
+            return image.view(self.input_size, "bgr"), None
         if isinstance(image, str): # Gradio Image(type="filepath")
             if os.path.exists(image):
                 img_to_process = cv2.imread(image)
             else:
-                print(f"[시각 분석기] 이미지 파일이 존재하지 않습니다: {image}")
-                return "이미지 분석 실패: 파일 없음"
+                log(f"[시각 분석기] 이미지 파일이 존재하지 않습니다: {image}")
+                return None, "이미지 분석 실패: 파일 없음"
         elif isinstance(image, np.ndarray): # Gradio Image(type="numpy")
             # Gradio에서 넘겨주는 이미지는 이미 numpy 배열이므로 직접 사용
             img_to_process = image
         elif image is None: # 웹캠 연결이 안 되어 이미지가 None으로 들어오는 경우
-            print("[시각 분석기] 이미지 입력이 없습니다 (초기 로드 또는 웹캠 비활성화).")
-            return "이미지 분석 실패: 입력 없음"
+            log("[시각 분석기] 이미지 입력이 없습니다 (초기 로드 또는 웹캠 비활성화).")
+            return None, "이미지 분석 실패: 입력 없음"
         else:
             print("[오류] 이미지 입력 형식이 잘못되었습니다.")
-            return "이미지 분석 실패: 잘못된 입력 형식"
+            return None, "이미지 분석 실패: 잘못된 입력 형식"
 
         # 이미지 로드 실패 또는 빈 이미지 처리
         if img_to_process is None or img_to_process.size == 0:
-            print("[시각 분석기] 처리할 이미지가 비어 있습니다.")
-            return "이미지 분석 실패: 빈 이미지"
+            log("[시각 분석기] 처리할 이미지가 비어 있습니다.")
+            return None, "이미지 분석 실패: 빈 이미지"
+        return img_to_process, None
+
+    def detect_objects(self, img):
+        """
+        YOLOv8로 객체를 감지하여 [{"name", "conf", "box": (x1, y1, x2, y2)}, ...] 목록을 반환합니다.
+        img는 이미 로드된 numpy 배열이어야 합니다.
+        """
+        return self.detect_objects_batch([img])[0]
+
+    def detect_objects_batch(self, imgs):
+        """
+        여러 이미지를 한 번의 predict 호출로 감지합니다. (BatchScheduler의 batch_fn)
+        반환값은 이미지별 객체 목록의 리스트입니다.
+        """
+        # predict 함수는 이미지마다 결과 하나씩 리스트로 반환합니다.
+        # conf=0.5는 신뢰도 임계값으로, 50% 미만 신뢰도 객체는 무시합니다.
+        # verbose=False로 설정하여 predict 함수의 자세한 콘솔 출력을 줄일 수 있습니다.
+        results = self.model.predict(list(imgs), conf=0.5, verbose=False)
+        return [self._parse_result(r) for r in results]
+
+    def _parse_result(self, r):
+        detected_objects = []
+        # r.boxes.cls / conf / xyxy는 각 박스의 클래스 인덱스, 신뢰도, 좌표입니다.
+        boxes = r.boxes
+        for c, conf, xyxy in zip(boxes.cls.tolist(), boxes.conf.tolist(), boxes.xyxy.tolist()):
+            detected_objects.append({
+                "name": self.model.names[int(c)], # 클래스 인덱스를 이름으로 매핑
+                "conf": float(conf),
+                "box": tuple(int(v) for v in xyxy),
+            })
+        return detected_objects
+
+    @staticmethod
+    def describe_scene(detected_objects):
+        """감지된 객체 목록을 챗봇에 전달할 장면 설명 문자열로 만듭니다."""
+        if detected_objects:
+            # 감지된 객체들의 중복을 제거하고 쉼표로 연결
+            unique_objects = list(dict.fromkeys(obj["name"] for obj in detected_objects))
+            return "주변에서 다음을 감지했습니다: " + ", ".join(unique_objects) + "."
+        return "주변에서 특별한 것을 감지하지 못했습니다."
+
+    def analyze_scene(self, image):
+        if self.model is None:
+            return "시각 분석기 모델이 로드되지 않았습니다."
+
+        img_to_process, error = self._load_image(image)
+        if error:
+            return error
 
         try:
             # YOLOv8 모델로 객체 감지
-            # predict 함수는 리스트를 반환할 수 있으므로 첫 번째 결과를 가져옵니다.
-            # conf=0.5는 신뢰도 임계값으로, 50% 미만 신뢰도 객체는 무시합니다.
-            # verbose=False로 설정하여 predict 함수의 자세한 콘솔 출력을 줄일 수 있습니다.
-            results = self.model.predict(img_to_process, conf=0.5, verbose=False)
-            
-            # 감지된 객체 정보 파싱
-            detected_objects = []
-            for r in results:
-                # r.boxes는 감지된 바운딩 박스 객체를 포함합니다.
-                # r.boxes.cls는 각 박스의 클래스 인덱스를 numpy 배열로 반환합니다.
-                for c in r.boxes.cls: 
-                    class_name = self.model.names[int(c)] # 클래스 인덱스를 이름으로 매핑
-                    detected_objects.append(class_name)
-            
-            if detected_objects:
-                # 감지된 객체들의 중복을 제거하고 쉼표로 연결
-                unique_objects = list(set(detected_objects))
-                scene_description = "주변에서 다음을 감지했습니다: " + ", ".join(unique_objects) + "."
-                return scene_description
-            else:
-                return "주변에서 특별한 것을 감지하지 못했습니다."
+            return self.describe_scene(self.detect_objects(img_to_process))
         except Exception as e:
+            count_error("scene")
             print(f"[시각 분석기 오류] 객체 감지 실패: {e}")
-            return "이미지 분석 실패: 처리 오류"
\ No newline at end of file
+            return "이미지 분석 실패: 처리 오류"